@@ -2,15 +2,52 @@
 # /* ---- 💫 https://github.com/JaKooLit 💫 ---- */  #
 # Rewritten to use Open-Meteo APIs (worldwide, no API key) for robust weather data.
 # Outputs Waybar-compatible JSON and a simple text cache.
+#
+# Usage:
+#   Weather.py            print the Waybar JSON (from the daemon when it runs, fetched otherwise)
+#   Weather.py --simple   print the simple text instead
+#   Weather.py --daemon   keep the data in memory, refresh it ahead of the TTL and serve it on a socket
+#   Weather.py --watch    print a JSON line on every update (Waybar `exec` without `interval`)
+#
+# Data older than WEATHER_CACHE_TTL is still printed and refreshed in the background (or ahead
+# of time by the daemon), until it is older than WEATHER_CACHE_MAX_AGE.
 
 import json
 import os
 import sys
 import time
 import html
+import socket
+import threading
 from typing import Any, Dict, List, Optional, Tuple
 
-import requests
+# Optional faster JSON codecs (orjson, then msgspec), falls back to the stdlib json module
+try:
+    import orjson
+
+    def json_loads(data: Any) -> Any:
+        return orjson.loads(data)
+
+    def json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:
+    try:
+        import msgspec
+
+        _decoder = msgspec.json.Decoder()
+        _encoder = msgspec.json.Encoder()
+
+        def json_loads(data: Any) -> Any:
+            return _decoder.decode(data)
+
+        def json_dumps(obj: Any) -> str:
+            return _encoder.encode(obj).decode("utf-8")
+    except ImportError:
+        def json_loads(data: Any) -> Any:
+            return json.loads(data)
+
+        def json_dumps(obj: Any) -> str:
+            return json.dumps(obj, ensure_ascii=False)
 
 # =============== Configuration ===============
 # You can configure behavior via environment variables OR the constants below.
@@ -31,6 +68,8 @@ CACHE_DIR = os.path.expanduser("~/.cache")
 API_CACHE_PATH = os.path.join(CACHE_DIR, "open_meteo_cache.json")
 SIMPLE_TEXT_CACHE_PATH = os.path.join(CACHE_DIR, ".weather_cache")
 CACHE_TTL_SECONDS = int(os.getenv("WEATHER_CACHE_TTL", "600"))  # default 10 minutes
+# Expired data is still shown (and refreshed in the background) until it is this old
+CACHE_MAX_AGE_SECONDS = max(CACHE_TTL_SECONDS, int(os.getenv("WEATHER_CACHE_MAX_AGE", "21600")))  # default 6 hours
 
 # Units: metric or imperial (default metric)
 UNITS = os.getenv("WEATHER_UNITS", "metric").strip().lower()  # metric|imperial
@@ -58,8 +97,27 @@ UA = (
 )
 TIMEOUT = 8
 
-SESSION = requests.Session()
-SESSION.headers.update({"User-Agent": UA})
+# Daemon socket, clients that find nobody listening fetch the data themselves
+SOCKET_PATH = os.getenv("WEATHER_SOCKET") or (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "weather.sock") if os.getenv("XDG_RUNTIME_DIR") else f"/tmp/weather-{os.getuid()}.sock"
+)
+# The daemon refreshes this long before the data expires, so nobody waits on a fetch
+REFRESH_AHEAD_SECONDS = min(60, CACHE_TTL_SECONDS // 5)
+# Delay before retrying a refresh that failed
+RETRY_SECONDS = 60
+
+_session = None
+
+
+def session():
+    """The shared HTTP session. requests is imported on first use, answering from the daemon never pays for it."""
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+        _session.headers.update({"User-Agent": UA})
+    return _session
 
 # =============== Icon and status mapping ===============
 # Reuse prior icon set for continuity
@@ -143,13 +201,14 @@ def ensure_cache_dir() -> None:
         print(f"Error creating cache dir: {e}", file=sys.stderr)
 
 
-def read_api_cache() -> Optional[Dict[str, Any]]:
+def read_api_cache(ttl: Optional[float] = CACHE_TTL_SECONDS) -> Optional[Dict[str, Any]]:
+    """The cached API payload if it is at most `ttl` seconds old (any age with None)."""
     try:
         if not os.path.exists(API_CACHE_PATH):
             return None
-        with open(API_CACHE_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if (time.time() - data.get("timestamp", 0)) <= CACHE_TTL_SECONDS:
+        with open(API_CACHE_PATH, "rb") as f:
+            data = json_loads(f.read())
+        if ttl is None or (time.time() - data.get("timestamp", 0)) <= ttl:
             return data
         return None
     except Exception as e:
@@ -157,12 +216,28 @@ def read_api_cache() -> Optional[Dict[str, Any]]:
         return None
 
 
+def cache_age(payload: Dict[str, Any]) -> float:
+    return time.time() - payload.get("timestamp", 0)
+
+
+def write_atomic(path: str, text: str) -> None:
+    """Readers (other invocations, hyprlock) see the old file or the new one, never a partial write."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
 def write_api_cache(payload: Dict[str, Any]) -> None:
     try:
         ensure_cache_dir()
         payload["timestamp"] = time.time()
-        with open(API_CACHE_PATH, "w", encoding="utf-8") as f:
-            json.dump(payload, f)
+        write_atomic(API_CACHE_PATH, json_dumps(payload))
     except Exception as e:
         print(f"Error writing API cache: {e}", file=sys.stderr)
 
@@ -170,8 +245,7 @@ def write_api_cache(payload: Dict[str, Any]) -> None:
 def write_simple_text_cache(text: str) -> None:
     try:
         ensure_cache_dir()
-        with open(SIMPLE_TEXT_CACHE_PATH, "w", encoding="utf-8") as f:
-            f.write(text)
+        write_atomic(SIMPLE_TEXT_CACHE_PATH, text)
     except Exception as e:
         print(f"Error writing simple cache: {e}", file=sys.stderr)
 
@@ -184,9 +258,9 @@ def get_coords() -> Tuple[float, float]:
         except ValueError:
             print("Invalid WEATHER_LAT/WEATHER_LON; falling back to IP geolocation", file=sys.stderr)
 
-    # 2) Try cached coordinates from last successful forecast
+    # 2) Try cached coordinates from last successful forecast (they do not expire)
     try:
-        cached = read_api_cache()
+        cached = read_api_cache(ttl=None)
         if cached and isinstance(cached, dict):
             fc = cached.get("forecast") or {}
             lat = fc.get("latitude")
@@ -199,9 +273,9 @@ def get_coords() -> Tuple[float, float]:
     # 3) IP-based geolocation with multiple providers (prefer ipwho.is, ipapi.co; ipinfo.io as fallback)
     # ipwho.is
     try:
-        resp = SESSION.get("https://ipwho.is/", timeout=TIMEOUT)
+        resp = session().get("https://ipwho.is/", timeout=TIMEOUT)
         resp.raise_for_status()
-        data = resp.json()
+        data = json_loads(resp.content)
         if data.get("success"):
             lat = data.get("latitude")
             lon = data.get("longitude")
@@ -212,9 +286,9 @@ def get_coords() -> Tuple[float, float]:
 
     # ipapi.co
     try:
-        resp = SESSION.get("https://ipapi.co/json", timeout=TIMEOUT)
+        resp = session().get("https://ipapi.co/json", timeout=TIMEOUT)
         resp.raise_for_status()
-        data = resp.json()
+        data = json_loads(resp.content)
         lat = data.get("latitude")
         lon = data.get("longitude")
         if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
@@ -224,9 +298,9 @@ def get_coords() -> Tuple[float, float]:
 
     # ipinfo.io (fallback)
     try:
-        resp = SESSION.get("https://ipinfo.io/json", timeout=TIMEOUT)
+        resp = session().get("https://ipinfo.io/json", timeout=TIMEOUT)
         resp.raise_for_status()
-        data = resp.json()
+        data = json_loads(resp.content)
         loc = data.get("loc")
         if loc and "," in loc:
             lat_s, lon_s = loc.split(",", 1)
@@ -281,9 +355,9 @@ def fetch_open_meteo(lat: float, lon: float) -> Dict[str, Any]:
         "timezone": "auto",
     }
     params.update(units_params(UNITS))
-    resp = SESSION.get(base, params=params, timeout=TIMEOUT)
+    resp = session().get(base, params=params, timeout=TIMEOUT)
     resp.raise_for_status()
-    return resp.json()
+    return json_loads(resp.content)
 
 
 def fetch_aqi(lat: float, lon: float) -> Optional[Dict[str, Any]]:
@@ -295,9 +369,9 @@ def fetch_aqi(lat: float, lon: float) -> Optional[Dict[str, Any]]:
             "current": "european_aqi",
             "timezone": "auto",
         }
-        resp = SESSION.get(base, params=params, timeout=TIMEOUT)
+        resp = session().get(base, params=params, timeout=TIMEOUT)
         resp.raise_for_status()
-        return resp.json()
+        return json_loads(resp.content)
     except Exception as e:
         print(f"AQI fetch failed: {e}", file=sys.stderr)
         return None
@@ -317,9 +391,9 @@ def fetch_place(lat: float, lon: float) -> Optional[str]:
             "accept-language": lang,
         }
         headers = {"User-Agent": UA + " Weather.py/1.0"}
-        resp = SESSION.get(base, params=params, headers=headers, timeout=TIMEOUT)
+        resp = session().get(base, params=params, headers=headers, timeout=TIMEOUT)
         resp.raise_for_status()
-        data = resp.json()
+        data = json_loads(resp.content)
         address = data.get("address", {})
         name = data.get("name") or address.get("city") or address.get("town") or address.get("village") or address.get("hamlet")
         admin1 = address.get("state")
@@ -339,9 +413,9 @@ def fetch_place(lat: float, lon: float) -> Optional[str]:
             "language": lang,
             "format": "json",
         }
-        resp = SESSION.get(base, params=params, timeout=TIMEOUT)
+        resp = session().get(base, params=params, timeout=TIMEOUT)
         resp.raise_for_status()
-        data = resp.json()
+        data = json_loads(resp.content)
         results = data.get("results") or []
         if results:
             p = results[0]
@@ -489,56 +563,272 @@ def build_output(lat: float, lon: float, forecast: Dict[str, Any], aqi: Optional
     return out_data, simple_weather
 
 
-def main() -> None:
-    lat, lon = get_coords()
+def fetch_payload(lat: float, lon: float) -> Dict[str, Any]:
+    """Fetches forecast, AQI and place concurrently, and writes them to the API cache."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Created before the workers share it
+    session()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        forecast = pool.submit(fetch_open_meteo, lat, lon)
+        aqi = pool.submit(fetch_aqi, lat, lon)
+        # Use manual/env place if provided; otherwise reverse geocode
+        place = None if MANUAL_PLACE or ENV_PLACE else pool.submit(fetch_place, lat, lon)
+        payload = {
+            "forecast": forecast.result(),
+            "aqi": aqi.result(),
+            "place": MANUAL_PLACE or ENV_PLACE or place.result(),
+        }
+    write_api_cache(payload)
+    return payload
+
+
+def render_payload(lat: float, lon: float, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    cached_place = payload.get("place") if isinstance(payload.get("place"), str) else None
+    return build_output(lat, lon, payload.get("forecast") or {}, payload.get("aqi"), MANUAL_PLACE or ENV_PLACE or cached_place)
+
+
+def fallback_output() -> Tuple[Dict[str, Any], str]:
+    out = {
+        "text": f"{WEATHER_ICONS['default']}  N/A",
+        "alt": "Unavailable",
+        "tooltip": "Weather unavailable",
+        "class": "unavailable",
+    }
+    return out, "Weather unavailable\n"
+
+
+def refresh_in_background(lat: float, lon: float) -> None:
+    """
+    Fetches and caches fresh data in a detached child, the caller prints the expired data
+    and exits right away. Concurrent invocations leave the refresh to whoever holds the lock.
+    """
+    import fcntl
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.fork() != 0:
+        return
+    try:
+        os.setsid()
+        # Consumers read until EOF, the child must not keep their pipes open
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        ensure_cache_dir()
+        with open(f"{API_CACHE_PATH}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            cached = read_api_cache()
+            if not cached:
+                _, simple = render_payload(lat, lon, fetch_payload(lat, lon))
+                write_simple_text_cache(simple)
+    except Exception:
+        pass
+    finally:
+        os._exit(0)
 
-    # Try cache first
-    cached = read_api_cache()
+
+def current_output(lat: float, lon: float) -> Tuple[Dict[str, Any], str, bool]:
+    """
+    Output from the cache while it is younger than the hard limit (stale while revalidate),
+    from a fetch otherwise. The flag says whether the data expired and should be refreshed.
+    """
+    cached = read_api_cache(ttl=CACHE_MAX_AGE_SECONDS)
     if cached and isinstance(cached, dict):
-        forecast = cached.get("forecast")
-        aqi = cached.get("aqi")
-        cached_place = cached.get("place") if isinstance(cached.get("place"), str) else None
-        place_effective = MANUAL_PLACE or ENV_PLACE or cached_place
         try:
-            out, simple = build_output(lat, lon, forecast, aqi, place_effective)
-            print(json.dumps(out, ensure_ascii=False))
-            write_simple_text_cache(simple)
-            return
+            out, simple = render_payload(lat, lon, cached)
+            return out, simple, cache_age(cached) > CACHE_TTL_SECONDS
         except Exception as e:
             print(f"Cached data build failed, refetching: {e}", file=sys.stderr)
 
-    # Fetch fresh
     try:
-        forecast = fetch_open_meteo(lat, lon)
-        aqi = fetch_aqi(lat, lon)
-        # Use manual/env place if provided; otherwise reverse geocode
-        place_effective = MANUAL_PLACE or ENV_PLACE or fetch_place(lat, lon)
-        write_api_cache({"forecast": forecast, "aqi": aqi, "place": place_effective})
-        out, simple = build_output(lat, lon, forecast, aqi, place_effective)
-        print(json.dumps(out, ensure_ascii=False))
-        write_simple_text_cache(simple)
+        out, simple = render_payload(lat, lon, fetch_payload(lat, lon))
+        return out, simple, False
     except Exception as e:
         print(f"Open-Meteo fetch failed: {e}", file=sys.stderr)
-        # Last resort: try stale cache without TTL
+        out, simple = fallback_output()
+        return out, simple, False
+
+
+def main(simple: bool = False) -> None:
+    lat, lon = get_coords()
+    out, simple_text, expired = current_output(lat, lon)
+    if out.get("class") != "unavailable":
+        write_simple_text_cache(simple_text)
+    print(simple_text if simple else json_dumps(out), end="" if simple else "\n")
+    if expired:
+        refresh_in_background(lat, lon)
+
+
+# =============== Daemon ===============
+
+class WeatherState:
+    """
+    Latest rendered output, kept in memory and refreshed by a background thread ahead of
+    the TTL. Readers wait on `changed` for the next version.
+    """
+
+    def __init__(self) -> None:
+        self.changed = threading.Condition()
+        self.version = 0
+        self.line: Optional[str] = None
+        self.simple = ""
+        self.refresh_now = threading.Event()
+        self.coords: Optional[Tuple[float, float]] = None
+        self.payload: Optional[Dict[str, Any]] = None
+
+    def publish(self, out: Dict[str, Any], simple: str) -> None:
+        line = json_dumps(out)
+        with self.changed:
+            if line == self.line:
+                return
+            self.line, self.simple = line, simple
+            self.version += 1
+            self.changed.notify_all()
+
+    def wait(self, version: int, timeout: Optional[float] = None) -> Tuple[int, Optional[str], str]:
+        """Blocks until there is output newer than `version` (or `timeout`), returns (version, line, simple)."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > version, timeout)
+            return self.version, self.line, self.simple
+
+    def refresh(self) -> float:
+        """Publishes fresh output, returns when the data it came from expires."""
+        if self.coords is None:
+            self.coords = get_coords()
+        lat, lon = self.coords
+        # The cache file is only read on startup, later refreshes go straight to the APIs
+        if self.payload is None:
+            self.payload = read_api_cache(ttl=CACHE_MAX_AGE_SECONDS)
+            if self.payload:
+                # Served while the fetch below runs, even when expired
+                self.publish(*render_payload(lat, lon, self.payload))
+        if not self.payload or cache_age(self.payload) > CACHE_TTL_SECONDS - REFRESH_AHEAD_SECONDS:
+            self.payload = fetch_payload(lat, lon)
+            out, simple = render_payload(lat, lon, self.payload)
+            write_simple_text_cache(simple)
+            self.publish(out, simple)
+        return self.payload["timestamp"] + CACHE_TTL_SECONDS
+
+    def refresh_loop(self) -> None:
+        while True:
+            try:
+                expires = self.refresh()
+                delay = max(1.0, expires - REFRESH_AHEAD_SECONDS - time.time())
+            except Exception as e:
+                print(f"Weather refresh failed: {e}", file=sys.stderr)
+                if self.payload is None or cache_age(self.payload) > CACHE_MAX_AGE_SECONDS:
+                    # Nothing recent enough to keep showing
+                    self.payload = None
+                    self.publish(*fallback_output())
+                delay = RETRY_SECONDS
+            self.refresh_now.wait(delay)
+            self.refresh_now.clear()
+
+    def start(self) -> None:
+        threading.Thread(target=self.refresh_loop, name="weather-refresh", daemon=True).start()
+
+
+def serve_client(state: WeatherState, conn: socket.socket) -> None:
+    """One request line: `json` (default), `simple`, `watch` (a JSON line per update) or `refresh`."""
+    with conn:
+        conn.settimeout(5)
         try:
-            if os.path.exists(API_CACHE_PATH):
-                with open(API_CACHE_PATH, "r", encoding="utf-8") as f:
-                    stale = json.load(f)
-                out, simple = build_output(lat, lon, stale.get("forecast", {}), stale.get("aqi"), stale.get("place") if isinstance(stale.get("place"), str) else None)
-                print(json.dumps(out, ensure_ascii=False))
-                write_simple_text_cache(simple)
+            request = conn.makefile("r", encoding="utf-8").readline().strip() or "json"
+            conn.settimeout(None)
+            if request == "refresh":
+                state.refresh_now.set()
+                conn.sendall(b"ok\n")
                 return
-        except Exception as e2:
-            print(f"Failed to use stale cache: {e2}", file=sys.stderr)
-        # Fallback minimal output
-        fallback = {
-            "text": f"{WEATHER_ICONS['default']}  N/A",
-            "alt": "Unavailable",
-            "tooltip": "Weather unavailable",
-            "class": "unavailable",
-        }
-        print(json.dumps(fallback, ensure_ascii=False))
+            version, line, simple = state.wait(0, TIMEOUT * 3)
+            if request == "simple":
+                conn.sendall(simple.encode("utf-8"))
+                return
+            if line is None:
+                line = json_dumps(fallback_output()[0])
+            conn.sendall(f"{line}\n".encode("utf-8"))
+            while request == "watch":
+                version, line, _ = state.wait(version)
+                conn.sendall(f"{line}\n".encode("utf-8"))
+        except (OSError, ValueError):
+            pass
+
+
+def run_daemon() -> None:
+    if query_daemon("json") is not None:
+        print(f"A weather daemon already listens on {SOCKET_PATH}", file=sys.stderr)
+        sys.exit(1)
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+    state = WeatherState()
+    state.start()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    server.listen(16)
+    import signal
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=serve_client, args=(state, conn), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+
+
+def query_daemon(request: str) -> Optional[str]:
+    """The daemon's answer to `request`, None when no daemon is listening."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(TIMEOUT * 3)
+            conn.connect(SOCKET_PATH)
+            conn.sendall(f"{request}\n".encode("utf-8"))
+            chunks = []
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return b"".join(chunks).decode("utf-8")
+    except OSError:
+        return None
+
+
+def watch() -> None:
+    """Prints a JSON line per update, from the daemon or, without one, from an in-process refresher."""
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(SOCKET_PATH)
+    except OSError:
+        state = WeatherState()
+        state.start()
+        version = 0
+        while True:
+            version, line, _ = state.wait(version)
+            print(line, flush=True)
+    with conn:
+        conn.sendall(b"watch\n")
+        for line in conn.makefile("r", encoding="utf-8"):
+            print(line, end="", flush=True)
 
 
 if __name__ == "__main__":
-    main()
+    args = sys.argv[1:]
+    try:
+        if "--daemon" in args:
+            run_daemon()
+        elif "--watch" in args:
+            watch()
+        else:
+            simple = "--simple" in args
+            answer = query_daemon("simple" if simple else "json")
+            if answer:
+                print(answer, end="")
+            else:
+                main(simple)
+    except KeyboardInterrupt:
+        pass
@@ -1,32 +1,37 @@
 #!/bin/bash
 
-get_active_player() {
-  playerctl -l 2>&1 | head -n 1
-}
+# Reads the mpris-drpc status file (mmap, no playerctl or socket round trip),
+# status_reader.py prints the active player's name whenever the status changes
+STATUS_READER="python3 /home/talent/services/mpris-drpc/status_reader.py"
 
-main() {
-  while true; do
-    player=$(get_active_player)
-    if [[ "$player" == "No players found" ]]; then
-      windows_open=$(eww active-windows | grep player_status)
-      if [[ $? -ne 0 ]]; then
-        :
-      else
-        eww close player_status
-      fi
+update_window() {
+  player=$1
+  if [[ -z "$player" ]]; then
+    windows_open=$(eww active-windows | grep player_status)
+    if [[ $? -ne 0 ]]; then
+      :
+    else
+      eww close player_status
+    fi
+  else
+    windows_open=$(eww active-windows | grep player_status)
+    if [[ $? -eq 0 ]]; then
+      :
     else
-      windows_open=$(eww active-windows | grep player_status)
-      if [[ $? -eq 0 ]]; then
-        :
-      else
-        eww open player_status
-      fi
+      eww open player_status
     fi
-    sleep 1
+  fi
+}
+
+main() {
+  $STATUS_READER --watch 0.5 --format '{player}' | while IFS= read -r player; do
+    update_window "$player"
   done
 }
 
+# The reader exits while the server (and so the status file) is unavailable, keep retrying
 while true; do
   main
+  update_window ""
   sleep 1
-done
\ No newline at end of file
+done
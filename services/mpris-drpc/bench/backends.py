@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import struct
+import asyncio
+import argparse
+import tempfile
+
+SERVICE_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pardir))
+sys.path.insert(0, SERVICE_ROOT)
+from core.model.snapshot import Metadata
+from core.model.socket_server import SocketServer
+from core.utils import backend_kit
+from core.utils.backend_kit import JSON_BACKENDS, EVENT_LOOPS, available, use_json_backend, event_loop_factory
+
+HEADER_FORMAT = '!I'
+PLAYER = 'bench'
+
+
+class _Listener:
+    active_player_name = PLAYER
+
+
+def metadata(seq: int) -> Metadata:
+    return Metadata({
+        'mpris:trackid': f'/bench/{seq}',
+        'mpris:length': 240.0,
+        'mpris:artUrl': f'file:///tmp/art/{seq}.jpg',
+        'xesam:title': f'Track #{seq}',
+        'xesam:artist': ['Neuro-Sama', 'Evil Neuro'],
+        'xesam:album': 'bench',
+        'xesam:url': f'https://example.com/watch/{seq}',
+        'tracking:startTime': time.time(),
+        'tracking:existingTime': 0.0,
+        'tracking:status': 'Playing',
+        'enhancements:seq': seq,
+    })
+
+
+async def read_frames(reader: asyncio.StreamReader, last: int):
+    """Decodes every frame like a panel client would, until the frame of event `last`."""
+    header = struct.calcsize(HEADER_FORMAT)
+    while True:
+        size, = struct.unpack(HEADER_FORMAT, await reader.readexactly(header))
+        frame = backend_kit.loads(await reader.readexactly(size))
+        if frame.get('enhancements|seq') == last:
+            return
+
+
+async def fan_out(events: int, client_count: int) -> float:
+    """Publishes `events` updates to `client_count` connected clients, returns the seconds until all were decoded."""
+    socket_path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    server = SocketServer(socket_path)
+    await server.start_server(_Listener())
+    connections = []
+    for i in range(client_count):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        params = backend_kit.dumpb({'name': f'bench-{i}', 'interval': 'ON_EVENT', 'format_type': 'json', 'format': 'all'})
+        writer.write(struct.pack(HEADER_FORMAT, len(params)) + params)
+        size, = struct.unpack(HEADER_FORMAT, await reader.readexactly(struct.calcsize(HEADER_FORMAT)))
+        await reader.readexactly(size)
+        connections.append((reader, writer))
+
+    # Built up front, only the per client render / encode / write / decode path is measured
+    snapshots = [metadata(seq) for seq in range(1, events + 1)]
+    readers = [asyncio.create_task(read_frames(reader, events)) for reader, _ in connections]
+    start = time.perf_counter()
+    for snapshot in snapshots:
+        await server.send_metadata('ON_EVENT', snapshot, PLAYER)
+    await asyncio.gather(*readers)
+    elapsed = time.perf_counter() - start
+
+    for _, writer in connections:
+        writer.close()
+    server.server.close()
+    await server.server.wait_closed()
+    os.unlink(socket_path)
+    return elapsed
+
+
+def run(loop: str, codec: str, events: int, clients: int) -> dict[str, float | str]:
+    use_json_backend(codec)
+    _, loop_factory = event_loop_factory(loop)
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        elapsed = runner.run(fan_out(events, clients))
+    frames = events * clients
+    return {'loop': loop, 'json': codec, 'seconds': elapsed, 'frames_per_second': frames / elapsed, 'us_per_frame': elapsed / frames * 1_000_000}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare fan-out throughput (server render + encode + socket write, client decode) for every installed event loop and JSON backend')
+    parser.add_argument('--events', type=int, default=2000, help='updates published per combination')
+    parser.add_argument('--clients', type=int, default=8, help='clients subscribed to every update')
+    parser.add_argument('--loops', nargs='+', default=[loop for loop in EVENT_LOOPS if available(loop)], choices=EVENT_LOOPS)
+    parser.add_argument('--codecs', nargs='+', default=[codec for codec in JSON_BACKENDS if available(codec)], choices=JSON_BACKENDS)
+    args = parser.parse_args()
+
+    rows = [run(loop, codec, args.events, args.clients) for loop in args.loops for codec in args.codecs]
+    baseline = next((row for row in rows if row['loop'] == 'asyncio' and row['json'] == 'json'), rows[-1])
+    print(f"{args.events} events x {args.clients} clients")
+    print(f"{'loop':<9} {'json':<9} {'frames/s':>10} {'us/frame':>9} {'speedup':>8}")
+    for row in sorted(rows, key=lambda row: row['frames_per_second'], reverse=True):
+        print(f"{row['loop']:<9} {row['json']:<9} {row['frames_per_second']:>10.0f} {row['us_per_frame']:>9.1f} {row['frames_per_second'] / baseline['frames_per_second']:>7.2f}x")
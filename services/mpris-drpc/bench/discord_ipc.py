@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import dataclasses
+
+SERVICE_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pardir))
+sys.path.insert(0, SERVICE_ROOT)
+from core.model import discord
+from core.model.config import Config, ImmutableDict
+from core.model.snapshot import Metadata
+from core.model.discord import DiscordPresence, HEADER, OP_HANDSHAKE, OP_FRAME
+
+PLAYER = 'bench'
+
+
+def track(i: int, status: str = 'Playing') -> Metadata:
+    return Metadata({
+        'xesam:title': f'Track {i}',
+        'xesam:artist': ['Neuro-Sama'],
+        'xesam:album': 'Bench',
+        'mpris:length': 180.0,
+        'tracking:status': status,
+        'tracking:startTime': time.time(),
+        'tracking:existingTime': 0.0,
+    })
+
+
+class DiscordStandIn:
+    """Answers the handshake and SET_ACTIVITY like the Discord client, recording every frame."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames: list[tuple[float, int, dict]] = []
+        self.writers: set[asyncio.StreamWriter] = set()
+        self.server: asyncio.Server | None = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def close(self):
+        """Discord quitting: the socket goes away and every connection is closed."""
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _send(self, writer: asyncio.StreamWriter, payload: dict):
+        data = json.dumps(payload).encode('utf-8')
+        writer.write(HEADER.pack(OP_FRAME, len(data)) + data)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.writers.add(writer)
+        try:
+            while True:
+                op, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                payload = json.loads(await reader.readexactly(length))
+                self.frames.append((time.monotonic(), op, payload))
+                if op == OP_HANDSHAKE:
+                    self._send(writer, {'cmd': 'DISPATCH', 'evt': 'READY', 'data': {'v': 1, 'user': {'username': 'bench'}}})
+                elif op == OP_FRAME:
+                    self._send(writer, {'cmd': payload['cmd'], 'data': payload['args'].get('activity'), 'evt': None, 'nonce': payload['nonce']})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    @property
+    def handshakes(self) -> list[dict]:
+        return [payload for _, op, payload in self.frames if op == OP_HANDSHAKE]
+
+    @property
+    def activities(self) -> list[tuple[float, dict | None]]:
+        return [(at, payload['args'].get('activity')) for at, op, payload in self.frames if op == OP_FRAME]
+
+
+class _Listener:
+    """The active player view `DiscordPresence` reads from a `DbusListener`."""
+
+    def __init__(self):
+        self.active_player_name = PLAYER
+        self.player_metadata = Metadata()
+
+
+async def wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+async def run(directory: str, burst: int, spacing: float, window: float) -> list[str]:
+    failures = []
+    first = DiscordStandIn(os.path.join(directory, 'discord-ipc-0'))
+    second = DiscordStandIn(os.path.join(directory, 'discord-ipc-1'))
+    await first.start()
+    await second.start()
+
+    listener = _Listener()
+    config = Config(ImmutableDict({}), discord_rpc=True, client_id='1', ipc_path=first.path)
+    presence = DiscordPresence(listener, config)
+
+    def publish(metadata: Metadata):
+        listener.player_metadata = metadata
+        presence(PLAYER, metadata)
+
+    def details(stand_in: DiscordStandIn) -> str | None:
+        activity = stand_in.activities[-1][1] if stand_in.activities else None
+        return activity.get('details') if activity else None
+
+    presence.start()
+    if not await wait_for(lambda: first.handshakes, 5.0):
+        return ['no handshake on the IPC socket']
+    if first.handshakes[0].get('client_id') != '1':
+        failures.append(f'handshake sent client_id {first.handshakes[0].get("client_id")!r}, expected "1"')
+
+    # Skipping through a playlist: at most RATE_LIMIT_UPDATES per window, the last track always shown
+    for i in range(burst):
+        publish(track(i))
+        await asyncio.sleep(spacing)
+    if not await wait_for(lambda: details(first) == f'Track {burst - 1}', window + 2.0):
+        failures.append(f'last track of the burst not shown, Discord shows {details(first)!r}')
+    sends = [at for at, _ in first.activities]
+    for i in range(len(sends) - discord.RATE_LIMIT_UPDATES):
+        if sends[i + discord.RATE_LIMIT_UPDATES] - sends[i] < window - 0.05:
+            failures.append(f'{discord.RATE_LIMIT_UPDATES + 1} updates within {sends[i + discord.RATE_LIMIT_UPDATES] - sends[i]:.2f}s, the window is {window}s')
+            break
+    print(f'burst of {burst} track changes sent as {len(sends)} update(s)')
+
+    # A reloaded [drpc] section applies to the current activity without a new track
+    config = dataclasses.replace(config, details='{xesam|artist} - {xesam|title}')
+    presence.update_config(config)
+    expected = f'Neuro-Sama - Track {burst - 1}'
+    if not await wait_for(lambda: details(first) == expected, window + 2.0):
+        failures.append(f'reloaded details template not applied, Discord shows {details(first)!r}')
+
+    # Discord restarts: reconnect and send the current activity again
+    handshakes = len(first.handshakes)
+    await first.close()
+    await first.start()
+    if not await wait_for(lambda: len(first.handshakes) > handshakes and details(first) == expected, 10.0):
+        failures.append('no reconnect (or activity sent again) after Discord restarted')
+    else:
+        print('reconnected after Discord restarted')
+
+    # A reloaded ipc_path moves the presence to the other socket
+    config = dataclasses.replace(config, ipc_path=second.path)
+    presence.update_config(config)
+    if not await wait_for(lambda: second.handshakes and details(second) == expected, window + 5.0):
+        failures.append('no reconnect to the reloaded ipc_path')
+    else:
+        print('moved to the reloaded ipc_path')
+
+    # Pausing with clear_on_pause clears the activity
+    config = dataclasses.replace(config, clear_on_pause=True)
+    presence.update_config(config)
+    publish(track(burst - 1, 'Paused'))
+    if not await wait_for(lambda: second.activities and second.activities[-1][1] is None, window + 2.0):
+        failures.append('activity not cleared when paused with clear_on_pause')
+
+    publish(track(burst))
+    await wait_for(lambda: details(second) == f'Neuro-Sama - Track {burst}', window + 2.0)
+    await presence.stop()
+    if not await wait_for(lambda: second.activities[-1][1] is None, 2.0):
+        failures.append('activity not cleared on shutdown')
+
+    await first.close()
+    await second.close()
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the Discord rich presence against a stand-in Discord IPC socket')
+    parser.add_argument('--burst', type=int, default=12, help='track changes sent in a row')
+    parser.add_argument('--spacing', type=float, default=0.3, help='seconds between two track changes of the burst')
+    parser.add_argument('--window', type=float, default=2.0, help='rate limit window in seconds, shortened from Discord\'s 20s to keep the run short')
+    args = parser.parse_args()
+
+    discord.RATE_LIMIT_WINDOW = args.window
+    discord.RECONNECT_MIN = 0.2
+    with tempfile.TemporaryDirectory(prefix='mpris-discord-') as directory:
+        failures = asyncio.run(run(directory, args.burst, args.spacing, args.window))
+    if failures:
+        print('\n'.join(failures), file=sys.stderr)
+        sys.exit(1)
+    print('ok')
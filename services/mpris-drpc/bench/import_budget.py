@@ -0,0 +1,56 @@
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+SERVICE_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pardir))
+DEFAULT_BUDGET_MS = float(os.getenv('MPRIS_IMPORT_BUDGET_MS', '150'))
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def measure(module: str) -> tuple[float, list[tuple[int, int, str]]]:
+    """
+    Imports `module` in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        The cumulative import time of `module` in milliseconds and every top level
+        import as (self_us, cumulative_us, name), slowest first.
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SERVICE_ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{proc.stderr}')
+
+    top_level = []
+    total_us = None
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        if len(indent) == 1:
+            top_level.append((self_us, cumulative_us, name))
+        if name == module:
+            total_us = cumulative_us
+    if total_us is None:
+        raise RuntimeError(f'No import time recorded for {module}')
+    return total_us / 1000, sorted(top_level, key=lambda item: item[1], reverse=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fail if importing the core server exceeds an import time budget')
+    parser.add_argument('--module', default='main', help='module to import, relative to the service root')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='allowed cumulative import time (env: MPRIS_IMPORT_BUDGET_MS)')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest imports to print')
+    args = parser.parse_args()
+
+    total_ms, imports = measure(args.module)
+    for self_us, cumulative_us, name in imports[:args.top]:
+        print(f'{cumulative_us / 1000:>9.2f} ms  {name}')
+    print(f'{args.module}: {total_ms:.2f} ms (budget {args.budget_ms:.2f} ms)')
+    if total_ms > args.budget_ms:
+        print(f'Import budget exceeded by {total_ms - args.budget_ms:.2f} ms', file=sys.stderr)
+        sys.exit(1)
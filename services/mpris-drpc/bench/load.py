@@ -0,0 +1,345 @@
+import os
+import re
+import sys
+import json
+import time
+import struct
+import signal
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import defaultdict
+
+from dbus_next import Variant, PropertyAccess
+from dbus_next.aio import MessageBus
+from dbus_next.service import ServiceInterface, method, dbus_property, signal as dbus_signal
+
+SERVICE_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pardir))
+HEADER_FORMAT = '!I'
+MODES = ('metadata', 'seek', 'status')
+TITLE_SEQ = re.compile(r'#(\d+)$')
+# Evaluated for every event but never matches a bench title, so the matcher path is exercised
+# without calling into plugins that hit the network
+DEFAULT_RULESET = {
+    "|| xesam:url <-> __contains__('nicovideo.jp') ||": 'nnd.nnd_handler()',
+    "|| xesam:title <-> regexpr('Swarm', flags=['IGNORECASE']) ||": 'swarm_fm.stop_screwing_with_my_setup_2()',
+}
+
+
+class FakeRoot(ServiceInterface):
+    def __init__(self, name: str):
+        super().__init__('org.mpris.MediaPlayer2')
+        self.identity = name
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Identity(self) -> 's':
+        return self.identity
+
+
+class FakePlayer(ServiceInterface):
+    """
+    MPRIS player whose state encodes a sequence number per event kind, so a client can tell
+    which emitted event a frame belongs to:
+        metadata -> the title ends with `#<seq>`
+        seek     -> the position is `<seq>` seconds (`tracking:existingTime`)
+        status   -> the n-th status change the client observes is the n-th toggle
+    """
+
+    def __init__(self, name: str):
+        super().__init__('org.mpris.MediaPlayer2.Player')
+        # `name` is the interface name on a ServiceInterface
+        self.player_name = name
+        self.seq = {mode: 0 for mode in MODES}
+        self.status = 'Playing'
+        self.position = 0
+        self.metadata = self._metadata(0)
+
+    def _metadata(self, seq: int) -> dict[str, Variant]:
+        return {
+            'mpris:trackid': Variant('o', f'/bench/{self.player_name}/{seq}'),
+            'mpris:length': Variant('x', 240_000_000),
+            'xesam:title': Variant('s', f'{self.player_name} #{seq}'),
+            'xesam:artist': Variant('as', [f'{self.player_name} artist']),
+            'xesam:album': Variant('s', 'bench'),
+            'xesam:url': Variant('s', f'https://example.com/{self.player_name}/{seq}'),
+        }
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Metadata(self) -> 'a{sv}':
+        return self.metadata
+
+    @dbus_property(access=PropertyAccess.READ)
+    def PlaybackStatus(self) -> 's':
+        return self.status
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Position(self) -> 'x':
+        return self.position
+
+    @method()
+    def PlayPause(self):
+        pass
+
+    @dbus_signal()
+    def Seeked(self, position) -> 'x':
+        return position
+
+    def emit(self, mode: str) -> int:
+        self.seq[mode] += 1
+        seq = self.seq[mode]
+        match mode:
+            case 'metadata':
+                self.metadata = self._metadata(seq)
+                self.emit_properties_changed({'Metadata': self.metadata})
+            case 'seek':
+                self.position = seq * 1_000_000
+                self.Seeked(self.position)
+            case 'status':
+                self.status = 'Paused' if seq % 2 else 'Playing'
+                self.emit_properties_changed({'PlaybackStatus': self.status})
+        return seq
+
+
+class LoadClient:
+    """Socket client that timestamps the first frame carrying each emitted event."""
+
+    def __init__(self, index: int, socket_path: str, player_names: list[str]):
+        self.index = index
+        self.socket_path = socket_path
+        self.seen: dict[tuple[str, str, int], float] = {}
+        self.status = {name: 'Playing' for name in player_names}
+        self.status_seq = defaultdict(int)
+        self.frames = 0
+        self.bytes = 0
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def connect(self):
+        reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+        params = json.dumps({'name': f'bench-{self.index}', 'interval': 'ON_EVENT', 'format_type': 'json', 'format': 'all'}).encode()
+        self.writer.write(struct.pack(HEADER_FORMAT, len(params)) + params)
+        await self.writer.drain()
+        return reader
+
+    async def run(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                size, = struct.unpack(HEADER_FORMAT, await reader.readexactly(4))
+                data = await reader.readexactly(size)
+                now = time.monotonic()
+                self.frames += 1
+                self.bytes += size + 4
+                self._observe(json.loads(data), now)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+
+    def _observe(self, frame: dict, now: float):
+        title = frame.get('xesam|title')
+        if not isinstance(title, str) or ' #' not in title:
+            return
+        player = title.rsplit(' #', 1)[0]
+        match = TITLE_SEQ.search(title)
+        if match:
+            self.seen.setdefault(('metadata', player, int(match[1])), now)
+        position = frame.get('tracking|existingTime')
+        if isinstance(position, (int, float)) and position >= 1 and position == int(position):
+            self.seen.setdefault(('seek', player, int(position)), now)
+        status = frame.get('tracking|status')
+        if player in self.status and status in ('Playing', 'Paused') and status != self.status[player]:
+            self.status[player] = status
+            self.status_seq[player] += 1
+            self.seen.setdefault(('status', player, self.status_seq[player]), now)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+def cpu_seconds(pid: int) -> float:
+    """User + system CPU time of `pid` from /proc/<pid>/stat."""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    # fields[0] is the state (field 3), utime and stime are fields 14 and 15
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def write_config(directory: str, socket_path: str, source: str | None) -> str:
+    config_dir = os.path.join(directory, 'mpris-drpc')
+    os.makedirs(config_dir, exist_ok=True)
+    if source:
+        with open(source) as f:
+            text = f.read()
+        # Point the copied config at the private socket, the rest is benchmarked as is
+        text = re.sub(r'(?m)^\s*(socket_path|hot_reload|journal_path|metrics_socket_path)\s*=.*$', '', text)
+        text = text.replace('[global]', f"[global]\nsocket_path = '{socket_path}'\nhot_reload = false", 1)
+    else:
+        rules = '\n'.join(f'{json.dumps(rule)} = {json.dumps(func)}' for rule, func in DEFAULT_RULESET.items())
+        text = f"[global]\nsocket_path = '{socket_path}'\nplugin_paths = []\nhot_reload = false\n\n[ruleset]\n{rules}\n\n[drpc]\n"
+    with open(os.path.join(config_dir, 'config.toml'), 'w') as f:
+        f.write(text)
+    return config_dir
+
+
+def start_bus() -> tuple[subprocess.Popen, str]:
+    bus = subprocess.Popen(['dbus-daemon', '--session', '--nofork', '--print-address=1'], stdout=subprocess.PIPE, text=True)
+    address = bus.stdout.readline().strip()
+    if not address:
+        bus.kill()
+        raise RuntimeError('dbus-daemon did not report a bus address')
+    return bus, address
+
+
+async def wait_for(predicate, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'Timed out waiting for {what}')
+        await asyncio.sleep(0.05)
+
+
+async def storm(players: list[FakePlayer], modes: list[str], rate: float, duration: float, emitted: dict):
+    """Emits `rate` events per second per player, cycling through `modes`, for `duration` seconds."""
+    loop = asyncio.get_running_loop()
+    interval = 1 / rate
+    start = loop.time()
+    tick = 0
+    while loop.time() - start < duration:
+        mode = modes[tick % len(modes)]
+        for player in players:
+            seq = player.emit(mode)
+            emitted[(mode, player.player_name, seq)] = time.monotonic()
+        tick += 1
+        delay = start + tick * interval - loop.time()
+        await asyncio.sleep(max(0.0, delay))
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(args) -> dict:
+    modes = list(MODES) if args.mode == 'mixed' else [args.mode]
+    with tempfile.TemporaryDirectory(prefix='mpris-load-') as directory:
+        socket_path = os.path.join(directory, 'mpris.sock')
+        write_config(directory, socket_path, args.config)
+        bus_process, address = start_bus()
+        env = {**os.environ, 'DBUS_SESSION_BUS_ADDRESS': address, 'XDG_CONFIG_HOME': directory, 'LOG_LEVEL': args.log_level}
+        buses: list[MessageBus] = []
+        clients: list[LoadClient] = []
+        server = None
+        try:
+            os.environ['DBUS_SESSION_BUS_ADDRESS'] = address
+            players = []
+            for i in range(args.players):
+                player_bus = await MessageBus(bus_address=address).connect()
+                player = FakePlayer(f'bench{i}')
+                player_bus.export('/org/mpris/MediaPlayer2', FakeRoot(player.player_name))
+                player_bus.export('/org/mpris/MediaPlayer2', player)
+                await player_bus.request_name(f'org.mpris.MediaPlayer2.{player.player_name}')
+                buses.append(player_bus)
+                players.append(player)
+
+            with open(os.path.join(directory, 'server.log'), 'w') as server_log:
+                server = subprocess.Popen([sys.executable, 'main.py'], cwd=SERVICE_ROOT, env=env, stdout=server_log, stderr=subprocess.STDOUT)
+            await wait_for(lambda: os.path.exists(socket_path) or server.poll() is not None, 30, 'the server socket')
+            if server.poll() is not None:
+                with open(os.path.join(directory, 'server.log')) as f:
+                    raise RuntimeError(f'Server exited early:\n{f.read()}')
+
+            names = [player.player_name for player in players]
+            clients = [LoadClient(i, socket_path, names) for i in range(args.clients)]
+            readers = [await client.connect() for client in clients]
+            tasks = [asyncio.create_task(client.run(reader)) for client, reader in zip(clients, readers)]
+            # Let the server attach the players and settle the initial force_update
+            await asyncio.sleep(args.warmup)
+
+            emitted: dict[tuple[str, str, int], float] = {}
+            cpu_start = cpu_seconds(server.pid)
+            wall_start = time.monotonic()
+            await storm(players, modes, args.rate, args.duration, emitted)
+            wall_storm = time.monotonic() - wall_start
+            await asyncio.sleep(args.drain)
+            cpu = cpu_seconds(server.pid) - cpu_start
+
+            latencies = defaultdict(list)
+            delivered = 0
+            for client in clients:
+                for key, sent in emitted.items():
+                    received = client.seen.get(key)
+                    if received is not None:
+                        latencies[key[0]].append(received - sent)
+                        delivered += 1
+            everything = [value for values in latencies.values() for value in values]
+            for task in tasks:
+                task.cancel()
+
+            return {
+                'players': args.players,
+                'clients': args.clients,
+                'modes': modes,
+                'events_emitted': len(emitted),
+                'events_per_second': len(emitted) / wall_storm,
+                'deliveries_expected': len(emitted) * len(clients),
+                'deliveries_observed': delivered,
+                'frames_received': sum(client.frames for client in clients),
+                'bytes_received': sum(client.bytes for client in clients),
+                'server_cpu_seconds': cpu,
+                'server_cpu_us_per_event': cpu / len(emitted) * 1e6 if emitted else 0.0,
+                'latency_ms': {
+                    mode: {
+                        'count': len(values),
+                        'p50': percentile(values, 0.5) * 1000,
+                        'p99': percentile(values, 0.99) * 1000,
+                        'mean': statistics.fmean(values) * 1000,
+                        'max': max(values) * 1000,
+                    }
+                    for mode, values in [*latencies.items(), ('all', everything)] if values
+                },
+            }
+        finally:
+            for client in clients:
+                client.close()
+            if server and server.poll() is None:
+                server.send_signal(signal.SIGTERM)
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            for player_bus in buses:
+                player_bus.disconnect()
+            bus_process.terminate()
+            bus_process.wait()
+
+
+def print_report(report: dict):
+    print(f"{report['players']} player(s) x {report['clients']} client(s), modes: {', '.join(report['modes'])}")
+    print(f"  emitted      {report['events_emitted']} events ({report['events_per_second']:.0f}/s)")
+    print(f"  delivered    {report['deliveries_observed']}/{report['deliveries_expected']} (frames: {report['frames_received']}, {report['bytes_received'] / 1024:.0f} KiB)")
+    print(f"  server CPU   {report['server_cpu_seconds']:.3f}s, {report['server_cpu_us_per_event']:.0f}us per event")
+    for mode, stats in report['latency_ms'].items():
+        print(f"  {mode:<12} p50 {stats['p50']:7.2f}ms  p99 {stats['p99']:7.2f}ms  max {stats['max']:7.2f}ms  (n={stats['count']})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Drive the server with synthetic MPRIS players on a private bus and measure signal -> client latency')
+    parser.add_argument('--players', type=int, default=4, help='number of fake MPRIS players')
+    parser.add_argument('--clients', type=int, default=4, help='number of socket clients (ON_EVENT)')
+    parser.add_argument('--mode', choices=[*MODES, 'mixed'], default='mixed', help='kind of events to emit')
+    parser.add_argument('--rate', type=float, default=20, help='events per second per player')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to emit events for')
+    parser.add_argument('--warmup', type=float, default=2, help='seconds to wait after clients connect')
+    parser.add_argument('--drain', type=float, default=2, help='seconds to wait for in flight events after the storm')
+    parser.add_argument('--config', help='config.toml whose ruleset to benchmark (socket settings are overridden)')
+    parser.add_argument('--log-level', default='WARNING', help='server LOG_LEVEL')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SERVICE_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pardir))
+sys.path.insert(0, SERVICE_ROOT)
+from core.model.snapshot import Metadata
+from core.model.lyrics import LyricsResolver, LyricSync
+
+ARTIST = 'Neuro-Sama'
+TITLE = 'Lyric Sync'
+LENGTH = 30.0
+# (seconds into the run, position to seek to), the first one starts playback at 0
+SEEKS = ((0.0, 0.0), (1.3, 6.1), (2.6, 1.05), (3.9, 12.0))
+
+
+def fixed_lrc(lines: int, spacing: float) -> str:
+    return '\n'.join(f'[{int(i * spacing // 60):02}:{i * spacing % 60:05.2f}]line {i}' for i in range(1, lines + 1))
+
+
+class LrclibStandIn:
+    """Answers `GET /api/get` like lrclib for one track with a fixed LRC, 404 for anything else."""
+
+    def __init__(self, lrc: str):
+        self.requests = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                stand_in.requests += 1
+                if urlparse(self.path).path == '/api/get' and query.get('artist_name') == [ARTIST] and query.get('track_name') == [TITLE]:
+                    body, status = json.dumps({'trackName': TITLE, 'artistName': ARTIST, 'syncedLyrics': lrc}).encode(), 200
+                else:
+                    body, status = b'{"code":404,"name":"TrackNotFound"}', 404
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.endpoint = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Config:
+    lyrics = True
+
+
+class _Player:
+    """The position anchor and metadata `LyricSync` reads from a `Player`."""
+
+    def __init__(self):
+        self.name = 'bench'
+        self.config = _Config()
+        self.metadata = Metadata({'xesam:title': TITLE, 'xesam:artist': [ARTIST], 'mpris:length': LENGTH})
+        self.status = 'Stopped'
+        self.existing_time = 0.0
+        self.media_start = time.time()
+        self.lyric = ''
+
+    @property
+    def extra_properties(self):
+        return {'tracking:startTime': self.media_start, 'tracking:existingTime': self.existing_time, 'tracking:status': self.status}
+
+
+async def run(endpoint: str, cache_dir: str, duration: float) -> list[dict]:
+    """Plays the track with the seeks of `SEEKS`, returns every ON_LYRIC frame with the position it was emitted at."""
+    player = _Player()
+    frames = []
+    seek_count = 0
+
+    async def on_lyric(metadata):
+        frames.append({
+            'at': time.time(),
+            'position': player.existing_time + time.time() - player.media_start,
+            'index': metadata['lyrics:index'],
+            'start': metadata['lyrics:start'],
+            'next': metadata['lyrics:next'],
+            'seek': seek_count,
+        })
+
+    sync = LyricSync(player, LyricsResolver([], endpoint, cache_dir), on_lyric)
+    # Resolved before playback, the timing checks are about the timers rather than the lookup
+    sync.track_changed()
+    await sync.lookup
+    start = time.time()
+    for at, position in SEEKS:
+        await asyncio.sleep(max(0.0, start + at - time.time()))
+        seek_count += 1
+        # What Player.on_seek / _play do with the anchor
+        player.status = 'Playing'
+        player.existing_time = position
+        player.media_start = time.time()
+        sync.reschedule()
+    await asyncio.sleep(max(0.0, start + duration - time.time()))
+    sync.cancel()
+    return frames
+
+
+def check(frames: list[dict], spacing: float, tolerance: float) -> list[str]:
+    """
+    Every frame must show the line at its position. A seek onto another line must emit that
+    line right away (within `tolerance`), lines reached by playing must be at most
+    `tolerance` late.
+    """
+    failures = []
+    shown = -1
+    for seek, (_, target) in enumerate(SEEKS, 1):
+        after = [frame for frame in frames if frame['seek'] == seek]
+        # Line i (from 0) starts at (i + 1) * spacing
+        expected = int(target // spacing) - 1
+        if expected != shown:
+            if not after or after[0]['index'] != expected:
+                failures.append(f"seeking to {target}s emitted line {after[0]['index'] if after else 'nothing'}, expected line {expected}")
+            elif after[0]['position'] - target > tolerance:
+                failures.append(f"line {expected} emitted {(after[0]['position'] - target) * 1000:.1f}ms after seeking to {target}s")
+            after = after[1:]
+        if after:
+            shown = after[-1]['index']
+        for frame in after:
+            if frame['position'] - frame['start'] > tolerance:
+                failures.append(f"line {frame['index']} emitted {(frame['position'] - frame['start']) * 1000:.1f}ms after its start")
+    for frame in frames:
+        if not (frame['start'] <= frame['position'] and (frame['next'] is None or frame['position'] < frame['next'])):
+            failures.append(f"line {frame['index']} emitted at position {frame['position']:.3f}, outside [{frame['start']}, {frame['next']})")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that ON_LYRIC lines follow the position through seeks, against a local lrclib stand-in')
+    parser.add_argument('--lines', type=int, default=40, help='lines of the fixed LRC')
+    parser.add_argument('--spacing', type=float, default=0.5, help='seconds between two lines')
+    parser.add_argument('--duration', type=float, default=5.5, help='seconds to play the track for')
+    parser.add_argument('--tolerance-ms', type=float, default=20.0, help='allowed delay of a line after its start')
+    args = parser.parse_args()
+
+    stand_in = LrclibStandIn(fixed_lrc(args.lines, args.spacing))
+    try:
+        with tempfile.TemporaryDirectory(prefix='mpris-lyrics-') as cache_dir:
+            frames = asyncio.run(run(stand_in.endpoint, cache_dir, args.duration))
+            # A second resolver over the same cache must not ask the endpoint again
+            cached = LyricsResolver([], stand_in.endpoint, cache_dir).lookup(_Player().metadata)
+    finally:
+        stand_in.close()
+
+    for frame in frames:
+        late = (frame['position'] - frame['start']) * 1000
+        print(f"seek {frame['seek']}  line {frame['index']:>3}  start {frame['start']:>6.2f}s  position {frame['position']:>7.3f}s  late {late:>7.1f}ms")
+    failures = check(frames, args.spacing, args.tolerance_ms / 1000)
+    if cached is None or len(cached) != args.lines:
+        failures.append('lyrics were not served from the cache')
+    if stand_in.requests != 1:
+        failures.append(f'{stand_in.requests} requests to the endpoint, expected 1')
+    print(f'{len(frames)} lines emitted, {stand_in.requests} request(s) to the stand-in')
+    if failures:
+        print('\n'.join(failures), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+from dbus_next import Variant
+
+SERVICE_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pardir))
+sys.path.insert(0, SERVICE_ROOT)
+os.chdir(SERVICE_ROOT)
+from core import metadata_parser
+from core.model.config import Config
+from core.model.player import Player
+from core.model.socket_server import Client, Subscription
+
+KINDS = ('metadata', 'seek', 'status')
+# Two plugins that touch a couple of keys each, no network
+RULESET = {
+    'always': 'yt_music.fix_artists()',
+    "|| xesam:title <-> regexpr('karaoke', flags=['IGNORECASE']) ||": 'swarm_fm.neuro_karaoke_archive()',
+}
+
+
+class _Interface:
+    def __init__(self):
+        self.position = 0
+
+    async def get_position(self):
+        return self.position
+
+
+class _Proxy:
+    def __init__(self):
+        self.interface = _Interface()
+
+    def get_interface(self, name):
+        return self.interface
+
+
+def raw_metadata(seq: int) -> dict[str, Variant]:
+    return {
+        'mpris:trackid': Variant('o', f'/bench/{seq}'),
+        'mpris:length': Variant('x', 240_000_000),
+        'mpris:artUrl': Variant('s', f'https://example.com/art/{seq}.jpg'),
+        'xesam:title': Variant('s', f'Karaoke track #{seq} (Duet)'),
+        'xesam:artist': Variant('as', ['Neuro-Sama & Evil Neuro', 'Vedal987']),
+        'xesam:album': Variant('s', 'bench'),
+        'xesam:albumArtist': Variant('as', ['bench']),
+        'xesam:url': Variant('s', f'https://example.com/watch/{seq}'),
+        'xesam:trackNumber': Variant('i', seq),
+    }
+
+
+def make_clients(count: int) -> list[Client]:
+    clients = []
+    for i in range(count):
+        subscription = Subscription('ON_EVENT', 'json', 'all') if i % 2 == 0 else Subscription('ON_EVENT', 'str', '{xesam|title} - {xesam|artist}')
+        clients.append(Client(f'bench-{i}', [subscription], None, None))
+    return clients
+
+
+async def run(events: int, client_count: int) -> dict[str, dict[str, float]]:
+    config = Config(RULESET, art_sizes=())
+    metadata_parser.initialize_matchers(config)
+    clients = make_clients(client_count)
+    sent = [0]
+
+    async def publish(metadata):
+        # What the server does per client for every published update
+        for client in clients:
+            sent[0] += len(client.fill_frame(metadata, 'bench', 'ON_EVENT'))
+
+    proxy = _Proxy()
+    player = Player(config, 'bench', proxy, publish, publish, publish, publish)
+    await player.update_status('Playing')
+
+    seq = 0
+
+    async def metadata_event():
+        nonlocal seq
+        seq += 1
+        await player.set_metadata(raw_metadata(seq))
+
+    async def seek_event():
+        proxy.interface.position += 1_000_000
+        await player.on_seek(proxy.interface.position)
+
+    async def status_event():
+        await player.update_status('Paused' if player.status == 'Playing' else 'Playing')
+
+    actions = {'metadata': metadata_event, 'seek': seek_event, 'status': status_event}
+    for action in actions.values():
+        await action()
+
+    report = {}
+    for kind, action in actions.items():
+        start = time.perf_counter()
+        for _ in range(events):
+            await action()
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        peak_total = 0
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(events):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await action()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - current
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report[kind] = {
+            'us_per_event': elapsed / events * 1_000_000,
+            'peak_bytes_per_event': peak_total / events,
+            'retained_bytes_per_event': (after - before) / events,
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure time and memory allocated per published event, from the raw signal to every client payload')
+    parser.add_argument('--events', type=int, default=2000, help='events per kind')
+    parser.add_argument('--clients', type=int, default=4, help='clients rendering every event')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.events, args.clients))
+    print(f"{'event':<10} {'us/event':>10} {'peak B/event':>14} {'retained B/event':>18}")
+    for kind in KINDS:
+        row = report[kind]
+        print(f"{kind:<10} {row['us_per_event']:>10.1f} {row['peak_bytes_per_event']:>14.0f} {row['retained_bytes_per_event']:>18.1f}")
+    metadata_parser.plugin_executor.shutdown()
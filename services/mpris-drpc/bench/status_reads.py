@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+SERVICE_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pardir))
+sys.path.insert(0, SERVICE_ROOT)
+from core.model.status_file import StatusFile, StatusReader
+
+
+class _Listener:
+    active_player_name = 'bench'
+
+
+def writer(path: str, rate: float, stop):
+    """Rewrites the status `rate` times per second (0: as fast as possible) until `stop` is set."""
+    status = StatusFile(_Listener(), path)
+    status.open()
+    interval = 1 / rate if rate else 0
+    i = 0
+    while not stop.is_set():
+        i += 1
+        status.write('bench', {'xesam:title': f'track {i}', 'xesam:artist': ['artist'], 'tracking:status': 'Playing', 'mpris:length': 240.0})
+        if interval:
+            time.sleep(interval)
+    status.mm.close()
+
+
+def measure(path: str, duration: float, decode: bool) -> tuple[int, float]:
+    reader = StatusReader(path)
+    read = reader.read if decode else reader.read_raw
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        for _ in range(1000):
+            read()
+        count += 1000
+        if time.perf_counter() >= deadline:
+            break
+    elapsed = time.perf_counter() - start
+    reader.close()
+    return count, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure status file reads per second, idle and under a concurrent writer')
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds per measurement')
+    parser.add_argument('--write-rate', type=float, default=1000, help='writes per second of the concurrent writer (0: as fast as possible)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='mpris-status-') as directory:
+        path = os.path.join(directory, 'status')
+        stop = multiprocessing.Event()
+        status = StatusFile(_Listener(), path)
+        status.open()
+        status.write('bench', {'xesam:title': 'idle', 'tracking:status': 'Paused'})
+
+        for label, decode in (('raw snapshot', False), ('decoded dict', True)):
+            count, elapsed = measure(path, args.duration, decode)
+            print(f'idle    {label:<13} {count / elapsed:>12,.0f} reads/s  ({elapsed / count * 1e9:,.0f}ns each)')
+
+        process = multiprocessing.Process(target=writer, args=(path, args.write_rate, stop))
+        process.start()
+        try:
+            time.sleep(0.2)
+            before = StatusReader(path).generation()
+            for label, decode in (('raw snapshot', False), ('decoded dict', True)):
+                count, elapsed = measure(path, args.duration, decode)
+                print(f'writing {label:<13} {count / elapsed:>12,.0f} reads/s  ({elapsed / count * 1e9:,.0f}ns each)')
+            writes = (StatusReader(path).generation() - before) // 2
+        finally:
+            stop.set()
+            process.join()
+        print(f'concurrent writer: {writes / (2 * args.duration):,.0f} writes/s')
+        status.mm.close()
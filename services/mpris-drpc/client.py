@@ -1,6 +1,5 @@
 import os
 import sys
-import json
 import time
 import html
 import struct
@@ -8,6 +7,8 @@ import logging
 import asyncio
 import argparse
 
+from core.utils.backend_kit import dumpb, dumps, loads, use_json_backend, event_loop_factory
+
 # --- Configuration ---
 # This should match the socket path in your server script.
 SOCKET_PATH = '/tmp/mpris.sock'
@@ -122,20 +123,20 @@ async def metadata_loop(reader: asyncio.StreamReader, for_panel: bool):
         if response is None:
             # Server closed the connection
             break
-        metadata = json.loads(response)
+        metadata = loads(response)
         # p_metadata = metadata.copy()
         # del p_metadata['sesam|artUrl']
-        # print(json.dumps(metadata), file=sys.stderr)
+        # print(dumps(metadata), file=sys.stderr)
         if metadata:
             metadata['tracking|readableLength'] = seconds_to_hms(int(round(float(metadata.get('mpris|length', 1.0)), 0)))
             metadata['xesam|title'] = html.escape(metadata.get('xesam|title', 'None')) if for_panel else metadata.get('xesam|title', 'None') 
             metadata['xesam|artist'] = [f"{remove_bidi_characters(html.escape(i) if for_panel else i)}\u200E" for i in metadata.get('xesam|artist', ['None'])]
             print(metadata['xesam|artist'])
 
-def fill_format(for_panel: bool):
+def fill_format(for_panel: bool, art_size: int | None = None):
     global metadata
     if not metadata or metadata.get('xesam|title') == "None":
-        return "No Player Found. " if not for_panel else json.dumps({
+        return "No Player Found. " if not for_panel else dumps({
             'status': STOP_ICON_PATH,
             'title': 'No Players Found',
             'artist': "None",
@@ -163,13 +164,16 @@ def fill_format(for_panel: bool):
                 icon = STOP_ICON_PATH
             case _:
                 icon = STOP_ICON_PATH
-        if "enhancements|localArtUrl" in _metadata:
+        if art_size and f"enhancements|localArtUrl@{art_size}" in _metadata:
+            # Pre-scaled by the server, the panel does not need to rescale the full image every render
+            arturl = _metadata[f"enhancements|localArtUrl@{art_size}"]
+        elif "enhancements|localArtUrl" in _metadata:
             arturl = _metadata["enhancements|localArtUrl"]
         elif 'mpris|artUrl' in _metadata:
             arturl = _metadata['mpris|artUrl']
         else:
             arturl = DEF_ALBUM_ART_PATH
-        ret = json.dumps({
+        ret = dumps({
             'status': icon,
             'title': _metadata.get('xesam|title', "Unknown Title"),
             'artist': artist_str,
@@ -191,9 +195,9 @@ def fill_format(for_panel: bool):
         ret = f"{icon} {_metadata.get('xesam|title', 'Unknown Title')} - {artist_str} - {readable_position} : {_metadata.get('tracking|readableLength', '00:00')}"
     return ret
 
-async def print_metadata(interval: float, for_panel: bool):
+async def print_metadata(interval: float, for_panel: bool, art_size: int | None = None):
     while True:
-        print(fill_format(for_panel), flush=True)
+        print(fill_format(for_panel, art_size), flush=True)
         await asyncio.sleep(interval)
 
 async def main_client(args):
@@ -223,7 +227,7 @@ async def main_client(args):
     # log.info(f"Sending configuration: {client_params}")
     
     try:
-        await send_msg(writer, json.dumps(client_params).encode('utf-8'))
+        await send_msg(writer, dumpb(client_params))
     except Exception:
         log.error("Could not send initial configuration. Exiting.")
         writer.close()
@@ -244,7 +248,7 @@ async def main_client(args):
         #     # Print the received message from the server
         #     print(f"\n--- Server Message ---\n{response}\n----------------------")
         asyncio.create_task(metadata_loop(reader, args.for_panel))
-        asyncio.create_task(print_metadata(args.interval, args.for_panel))
+        asyncio.create_task(print_metadata(args.interval, args.for_panel, args.art_size))
 
         await asyncio.Future()
 
@@ -257,6 +261,31 @@ async def main_client(args):
     except Exception as e:
         log.error(f"An unexpected error occurred: {e}")
 
+async def run_command(command: list[str]):
+    """
+    Sends one command (e.g. `play-pause`, `seek +5`, `set-position 42%`) and prints the
+    server's reply, for panels and key bindings that would otherwise spawn playerctl.
+    """
+    try:
+        reader, writer = await asyncio.open_unix_connection(SOCKET_PATH)
+    except Exception as e:
+        log.error(f"Failed to connect to the socket: {e}")
+        sys.exit(1)
+
+    # No subscriptions: the server sends no metadata frames, the only frame is the reply
+    client_params = {
+        'name': f'command-{os.getpid()}',
+        'subscriptions': [],
+    }
+    await send_msg(writer, dumpb(client_params))
+    await send_msg(writer, ' '.join(command).encode('utf-8'))
+    response = await recv_msg(reader)
+    print(response)
+    await send_msg(writer, b'disconnect')
+    writer.close()
+    if response is None or 'Error' in loads(response):
+        sys.exit(1)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="A simple command-line client for the MPRIS socket server.",
@@ -265,13 +294,11 @@ if __name__ == "__main__":
     parser.add_argument(
         '--name',
         type=str,
-        required=True,
         help="A unique name for this client instance."
     )
     parser.add_argument(
         '--interval',
         type=float,
-        required=True,
         help="The freqnecy to try to print metadata in"
     )
     parser.add_argument(
@@ -279,10 +306,34 @@ if __name__ == "__main__":
         type=bool,
         help="Setting this flag will cause the program to evaluate format as json instead of a string",
     )
+    parser.add_argument(
+        '--art-size',
+        type=int,
+        help="Use the server's album art variant of this size (one of art_sizes, e.g. 128) when available",
+    )
+    parser.add_argument(
+        '--command',
+        nargs='+',
+        metavar='ARG',
+        help="Send a playback command and exit instead of printing metadata, e.g.\n"
+             "  --command play-pause [player]\n"
+             "  --command seek +5 [player]\n"
+             "  --command set-position 42% [player]",
+    )
 
     args = parser.parse_args()
+    # Whatever the server would use: orjson / msgspec and uvloop when installed
+    use_json_backend('auto')
+    _, loop_factory = event_loop_factory('auto')
+    if args.command:
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(run_command(args.command))
+        sys.exit(0)
+    if args.name is None or args.interval is None:
+        parser.error("--name and --interval are required unless --command is given")
     
     try:
-        asyncio.run(main_client(args))
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(main_client(args))
     except Exception as e:
         log.error(f"Client stopped due to an error: {e}")
@@ -11,4 +11,6 @@ LOG_LEVELS = {
 }
 
 env_log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
-log_level = LOG_LEVELS.get(env_log_level, logging.INFO)
\ No newline at end of file
+log_level = LOG_LEVELS.get(env_log_level, logging.INFO)
+# `json` writes the log as JSON lines, one object per record
+log_format = os.getenv('LOG_FORMAT', 'text').lower()
@@ -1,38 +1,222 @@
+import os
+import sys
 import json
+import time
+import pickle
+import hashlib
+import asyncio
 import logging
-from typing import Literal, Callable, Any
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, Callable, Any, NamedTuple
 
-from core.constants import log_level
 from core.model.config import Config
-from core.utils.module_kit import get_callable_by_id
+from core.model.metrics import metrics
+from core.model.tracing import tracer
+from core.model.snapshot import Metadata
+from core.utils.module_kit import get_callable_by_id, get_registry
+from core.utils.art_kit import add_art_variants, strip_inline_art, pin_local_art
+from core.utils.path_kit import get_cache_path
 from core.model.matcher import Matcher, AlwaysTrue, parse_function_call
 
 log = logging.getLogger(__name__)
-log.setLevel(log_level)
 
-matchers: list[tuple[Matcher, Callable[..., dict[str, Any]], tuple[Any], dict[str, Any]]] = []
 
-def initialize_matchers(config: Config):
-    global matchers
+# Bumped whenever the parsed form changes shape, older cache files are then ignored
+COMPILE_CACHE_VERSION = 1
+
+
+class ParsedRule(NamedTuple):
+    """What compiling a rule produces before plugins are resolved, plain data that is cached on disk."""
+    matcher: tuple[list[dict], list[str]] | None
+    func: str
+    args: tuple[Any]
+    kwargs: dict[str, Any]
+
+
+class CompiledRule(NamedTuple):
+    rule: str
+    func: str
+    plugin: str
+    matcher: Matcher | AlwaysTrue
+    handler: Callable[..., dict[str, Any]]
+    args: tuple[Any]
+    kwargs: dict[str, Any]
+    modules: frozenset[str]
+
+
+# Swapped as a whole by `swap_matchers`, readers take one reference and iterate it, so a
+# reload never exposes a half built ruleset to an in flight event
+matchers: tuple[CompiledRule, ...] = ()
+# Compiled rules keyed by (rule, handler call, plugin paths), reused across reloads. Replaced
+# as a whole once a compilation succeeded, only ever compiled on the plugin thread after startup
+_compiled: dict[tuple[str, str, tuple[str, ...]], CompiledRule] = {}
+# (ruleset, config, digest) of the last `pipeline_digest` call
+_pipeline_digest: tuple[tuple[CompiledRule, ...], Config, str] | None = None
+# Plugins block (network, yt-dlp, image decoding) and keep module level state, they run one
+# at a time on this thread instead of on the event loop. Reloads (re-executing plugin modules,
+# recompiling rules) run here as well, so a handler never sees a half reloaded module
+plugin_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plugins')
+
+
+def parse_rule(rule: str, func: str) -> ParsedRule:
+    fn_name, args, kwargs = parse_function_call(func)
+    return ParsedRule(Matcher.parse(rule) if rule != 'always' else None, fn_name, args, kwargs)
+
+
+def compile_rule(config: Config, rule: str, func: str, parsed: ParsedRule | None = None) -> CompiledRule:
+    if parsed is None:
+        parsed = parse_rule(rule, func)
+    elif parsed.matcher is not None:
+        Matcher.report_invalid(parsed.matcher)
+    matcher = Matcher(config, rule, parsed.matcher) if parsed.matcher is not None else AlwaysTrue()
+    fn_name, args, kwargs = parsed.func, parsed.args, parsed.kwargs
+    handler = get_callable_by_id(fn_name, config.plugin_paths)
+    modules = {fn_name.split('.')[0]}
+    for clause in getattr(matcher, 'clauses', []):
+        if clause['custom_func_callable']:
+            modules.add(clause['method'].split('.')[0])
+    return CompiledRule(rule, func, fn_name, matcher, handler, args, kwargs, frozenset(modules))
+
+
+def compile_ruleset(config: Config, changed_modules: frozenset[str] = frozenset(), parsed: dict[tuple[str, str], ParsedRule] | None = None) -> tuple[tuple[CompiledRule, ...], list[CompiledRule]]:
+    """
+    Compiles the ruleset in `config`, reusing previously compiled rules that did not change
+    and do not reference any of `changed_modules`. Rules found in `parsed` skip parsing.
+
+    Returns:
+        The new ruleset, and every rule that was added, recompiled or dropped compared to
+        the previous compilation (both old and new versions), used to invalidate caches.
+        A rule failing to compile raises and leaves the previous compilation in place.
+    """
+    global _compiled
+    plugin_paths = tuple(config.plugin_paths or ())
+    previous = _compiled
+    compiled_rules = {}
+    ruleset = []
+    changed = []
     for rule, func in config.metadata_ruleset.items():
-        matcher = Matcher(config, rule) if rule != 'always' else AlwaysTrue()
-        fn_name, args, kwargs = parse_function_call(func)
-        handler = get_callable_by_id(fn_name, config.plugin_paths)
-        matchers.append((matcher, handler, args, kwargs))
+        key = (rule, func, plugin_paths)
+        compiled = previous.get(key)
+        if compiled is None or compiled.modules & changed_modules:
+            if compiled is not None:
+                changed.append(compiled)
+            compiled = compile_rule(config, rule, func, parsed.get((rule, func)) if parsed else None)
+            changed.append(compiled)
+        compiled_rules[key] = compiled
+        ruleset.append(compiled)
 
+    changed.extend(compiled for key, compiled in previous.items() if key not in compiled_rules)
+    _compiled = compiled_rules
+    return tuple(ruleset), changed
 
-def metadata_process(config: Config, metadata: dict[str, Any]) -> dict[str, Any]:
-    log.debug('Starting Module Execution')
-    metadata = metadata.copy()
+
+def swap_matchers(ruleset: tuple[CompiledRule, ...]):
     global matchers
+    matchers = ruleset
+
+
+def ruleset_digest(config: Config) -> str:
+    """Identifies what the parsed ruleset depends on: the rules, the parse format and the interpreter."""
+    key = json.dumps([COMPILE_CACHE_VERSION, sys.version, list(config.metadata_ruleset.items())], ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def pipeline_digest(config: Config) -> str:
+    """
+    Identifies what processed metadata depends on: the ruleset, the source of every plugin
+    the compiled ruleset uses and the config fields changing the output (`art_sizes`).
+    Metadata processed under another digest is stale. Changes when a reload swaps the ruleset.
+    """
+    global _pipeline_digest
+    ruleset = matchers
+    if _pipeline_digest is not None and _pipeline_digest[0] is ruleset and _pipeline_digest[1] is config:
+        return _pipeline_digest[2]
+    registry = get_registry(config.plugin_paths)
+    plugins = sorted({module for compiled in ruleset for module in compiled.modules})
+    key = json.dumps([
+        ruleset_digest(config),
+        [(plugin, registry.source_digest(plugin)) for plugin in plugins],
+        list(config.art_sizes or ()),
+    ], ensure_ascii=False)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    _pipeline_digest = (ruleset, config, digest)
+    return digest
+
+
+def compile_cache_path(config: Config) -> str:
+    return get_cache_path('rules', f'{ruleset_digest(config)}.pickle')
+
+
+def load_parsed_rules(path: str) -> dict[tuple[str, str], ParsedRule] | None:
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Only ever written by us, anything unreadable is just recompiled
+        log.warning('Ignoring unreadable ruleset compile cache %s: %s', path, e)
+        return None
+
+
+def save_parsed_rules(path: str, ruleset: tuple[CompiledRule, ...]):
+    parsed = {(compiled.rule, compiled.func): ParsedRule(
+        (compiled.matcher.parsed if isinstance(compiled.matcher, Matcher) else None),
+        compiled.plugin, compiled.args, compiled.kwargs,
+    ) for compiled in ruleset}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'wb') as f:
+            pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp', path)
+    except OSError as e:
+        log.warning('Could not write ruleset compile cache %s: %s', path, e)
+
+
+def initialize_matchers(config: Config):
+    """
+    Compiles the ruleset ahead of the first event. The parsed rules (clauses, compiled
+    regexes, plugin references) are cached on disk keyed by the ruleset, so an unchanged
+    config only resolves its plugins on startup.
+    """
+    start = time.perf_counter()
+    path = compile_cache_path(config)
+    parsed = load_parsed_rules(path)
+    ruleset, _ = compile_ruleset(config, parsed=parsed)
+    if parsed is None:
+        save_parsed_rules(path, ruleset)
+    swap_matchers(ruleset)
+    log.debug("Compiled %s rules in %.1fms (%s)", len(ruleset), (time.perf_counter() - start) * 1000, 'cached' if parsed is not None else 'parsed')
+
+
+def metadata_process(config: Config, metadata: dict[str, Any]) -> Metadata:
+    log.debug('Starting Module Execution')
+    # Inline art is decoded to a file here, on the plugin thread, the blob never reaches a plugin
+    metadata = strip_inline_art(dict(metadata))
     if not matchers:
         initialize_matchers(config)
 
-    for matcher, handler, args, kwargs in matchers:
-        if matcher.evaluate(metadata):
-            metadata = handler(metadata, log, *args, **kwargs)
+    for compiled in matchers:
+        if compiled.matcher.evaluate(metadata):
+            start = time.perf_counter()
+            with tracer.span(compiled.plugin, rule=compiled.rule):
+                metadata = compiled.handler(metadata, log, *compiled.args, **compiled.kwargs)
+            metrics.observe('plugin_handler_seconds', time.perf_counter() - start, plugin=compiled.plugin)
+
+    # The fixed path a plugin wrote the art to is overwritten by the next track
+    metadata = pin_local_art(metadata)
+    if config.art_sizes:
+        with tracer.span('art_variants'):
+            metadata = add_art_variants(metadata, tuple(config.art_sizes))
 
     log.debug('Finished Module Execution')
 
-    return metadata
+    # Plugins work on plain dicts, what they produced is frozen once for publishing
+    return Metadata.of(metadata)
+
 
+async def metadata_process_async(config: Config, metadata: dict[str, Any]) -> Metadata:
+    """`metadata_process` on the plugin thread, in a copy of the caller's context (so spans join its trace)."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(plugin_executor, context.run, metadata_process, config, metadata)
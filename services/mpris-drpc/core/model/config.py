@@ -30,20 +30,23 @@ def parse_toml_config(filepath):
         return {}
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, init=False)
 class ImmutableDict:
     """
     A custom frozen dataclass that behaves like an immutable dictionary.
 
     It takes a standard dictionary during initialization and stores its items
-    as an immutable tuple of (key, value) tuples. Attempts to modify the
-    ImmutableDict after creation will result in an error.
+    as an immutable tuple of (key, value) tuples, plus a private dict index of
+    them for constant time lookups. Attempts to modify the ImmutableDict after
+    creation will result in an error.
     """
 
     # _data is the internal, immutable representation of the dictionary.
     # init=False means it's not part of the dataclass's generated __init__ signature.
     # repr=False means it won't be included in the default __repr__ output.
     _data: tuple = dataclasses.field(init=False, repr=False)
+    # Never exposed or modified, only used to look keys up by hash
+    _index: dict = dataclasses.field(init=False, repr=False, compare=False, hash=False)
 
     def __new__(cls, initial_dict: dict):
         """
@@ -52,6 +55,8 @@ class ImmutableDict:
         used to set up the core immutable state before __init__ or
         dataclass processing.
         """
+        if isinstance(initial_dict, ImmutableDict):
+            return initial_dict
         if not isinstance(initial_dict, dict):
             raise TypeError("initial_dict must be a dictionary")
 
@@ -60,22 +65,22 @@ class ImmutableDict:
         # new instance. This bypasses the frozen dataclass's __setattr__
         # enforcement during initialization.
         object.__setattr__(instance, '_data', tuple(initial_dict.items()))
+        object.__setattr__(instance, '_index', dict(initial_dict))
         return instance
 
     # Note: We do not define __init__ or __post_init__ here, as __new__
-    # handles the initialization of _data. The dataclass's generated __init__
-    # would still be called, but since _data is init=False and there are no
-    # other fields, it essentially does nothing.
+    # handles the initialization of _data and _index (init=False above keeps
+    # the dataclass from generating an __init__ rejecting the argument).
 
     def __getitem__(self, key):
         """
         Overrides the item access (e.g., immutable_dict[key]).
-        Iterates through the internal tuple of tuples to find the value.
+        Looks the key up in the internal index.
         """
-        for k, v in self._data:
-            if k == key:
-                return v
-        raise KeyError(f"Key '{key}' not found in ImmutableDict")
+        try:
+            return self._index[key]
+        except KeyError:
+            raise KeyError(f"Key '{key}' not found in ImmutableDict") from None
 
     def __getattr__(self, name):
         """
@@ -85,15 +90,19 @@ class ImmutableDict:
         is a string and a valid Python identifier.
         """
         # Check if the name is a string, as only string keys can be accessed as attributes.
-        if isinstance(name, str):
-            for k, v in self._data:
-                if k == name:
-                    return v
+        # Goes through __dict__, `self._index` would recurse into this method if it were missing
+        if isinstance(name, str) and not name.startswith('_'):
+            index = self.__dict__.get('_index', {})
+            if name in index:
+                return index[name]
         # If the key is not found or is not a valid attribute name, raise AttributeError.
         raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}' or key '{name}'")
     
     def __setitem__(self, *args):
         raise TypeError('ImmutableDict is immutable')
+
+    def __reduce__(self):
+        return ImmutableDict, (dict(self._data),)
     
     # def __setattr__(self, *args):
     #     raise TypeError('ImmutableDict is immutable')
@@ -134,20 +143,14 @@ class ImmutableDict:
         """
         Checks if a key exists in the ImmutableDict (e.g., 'key' in immutable_dict).
         """
-        for k, _ in self._data:
-            if k == key:
-                return True
-        return False
+        return key in self._index
 
     def get(self, key, default=None):
         """
         Behaves like the standard dictionary's get() method, returning the
         value for a key if found, otherwise returning the default value.
         """
-        try:
-            return self[key]
-        except KeyError:
-            return default
+        return self._index.get(key, default)
         
     def __iter__(self):
         for k, v in self._data:
@@ -165,14 +168,52 @@ class ImmutableDict:
 @dataclasses.dataclass(frozen=True)
 class Config:
     metadata_ruleset: ImmutableDict
-    socket_path: str | None = '/tnp/mpris.sock'
+    socket_path: str | None = '/tmp/mpris.sock'
     plugin_paths: list[str] | None = None
     discord_rpc: bool = False
+    hot_reload: bool = True
+    metrics_socket_path: str | None = None
+    control_socket_path: str | None = '/tmp/mpris-control.sock'
+    tracing: bool = False
+    trace_buffer: int = 200
+    journal_path: str | None = None
+    journal_max_bytes: int = 8 * 1024 * 1024
+    journal_backups: int = 3
+    warm_restart: bool = True
+    state_path: str | None = None
+    state_interval: float = 10.0
+    status_file: bool = True
+    status_path: str | None = None
+    lyrics: bool = False
+    lyrics_paths: list[str] | None = None
+    lyrics_endpoint: str | None = 'https://lrclib.net'
+    art_sizes: tuple[int, ...] = (128, 256, 512)
+    history: bool = False
+    history_path: str | None = None
+    history_flush_interval: float = 5.0
+    event_loop: str = 'auto'
+    json_backend: str = 'auto'
+    # [drpc] section, only used with discord_rpc
+    client_id: str | None = None
+    details: str = '{xesam|title}'
+    state: str = '{xesam|artist}'
+    large_text: str = '{xesam|album}'
+    show_timestamps: bool = True
+    clear_on_pause: bool = False
+    ipc_path: str | None = None
+
+    @staticmethod
+    def config_home() -> str:
+        return os.path.join(os.environ.get('XDG_CONFIG_HOME', os.path.join(os.path.expanduser('~'), '.config')), 'mpris-drpc')
+
+    @classmethod
+    def config_file(cls) -> str:
+        return os.path.join(cls.config_home(), 'config.toml')
 
     @classmethod
     def from_config(cls):
-        config_home = os.path.join(os.environ.get('XDG_CONFIG_HOME', os.path.join(os.path.expanduser('~'), '.config')), 'mpris-drpc')
-        config_file = os.path.join(config_home, 'config.toml')
+        config_home = cls.config_home()
+        config_file = cls.config_file()
         if not os.path.exists(config_file):
             os.mkdir(config_home)
             os.mkdir(os.path.join(config_home, 'plugins'))
@@ -181,6 +222,6 @@ class Config:
         config = parse_toml_config(config_file)
         config['global']['plugin_paths'] = [os.path.expanduser(p) for p in config['global']['plugin_paths']]
         if config:
-            return cls(config['ruleset'], **config['global'], **config['drpc'])
+            return cls(ImmutableDict(config['ruleset']), **config['global'], **config['drpc'])
         else:
-            return cls(metadata_ruleset=ImmutableDict({}), socket_path='/tnp/mpris.sock')
\ No newline at end of file
+            return cls(metadata_ruleset=ImmutableDict({}), socket_path='/tmp/mpris.sock')
\ No newline at end of file
@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any
+from dbus_next import DBusError
+
+from core.model.metrics import metrics
+from core.model.player import Player
+from core.utils.backend_kit import dumpb
+
+log = logging.getLogger(__name__)
+
+# A slider drag produces at most one SetPosition per window, plus one trailing call
+SEEK_DEBOUNCE_SECONDS = 0.1
+# Socket command -> MPRIS Player method
+TRANSPORT_COMMANDS = {
+    'play': 'call_play',
+    'pause': 'call_pause',
+    'play-pause': 'call_play_pause',
+    'stop': 'call_stop',
+    'next': 'call_next',
+    'previous': 'call_previous',
+}
+
+
+class SeekDebouncer:
+    """
+    Coalesces seek requests for one player into absolute targets.
+
+    The first request in a quiet period is sent right away, requests arriving within
+    `window` seconds of the last call only move the pending target, and a single trailing
+    call sends the latest target once the window is over.
+    """
+
+    def __init__(self, player: Player, window: float = SEEK_DEBOUNCE_SECONDS):
+        self.player = player
+        self.window = window
+        self.target: float | None = None
+        self.last_call = 0.0
+        # Last target sent and when, used until the player reports the seek back
+        self.sent: tuple[float, float] | None = None
+        self.flush_handle: asyncio.TimerHandle | None = None
+
+    @property
+    def position(self) -> float:
+        """The pending target if there is one, otherwise the player's extrapolated position."""
+        if self.target is not None:
+            return self.target
+        player = self.player
+        if self.sent is not None and player.media_start < self.sent[1]:
+            base, since = self.sent
+        else:
+            base, since = player.existing_time, player.media_start
+        if player.status == 'Playing':
+            return base + time.time() - since
+        return base
+
+    async def seek_to(self, seconds: float) -> float:
+        length = self.player.last_raw_metadata.get('mpris:length')
+        seconds = max(0.0, min(seconds, length) if length else seconds)
+        if self.target is not None:
+            metrics.inc('seeks_coalesced_total', player=self.player.name)
+        self.target = seconds
+        loop = asyncio.get_running_loop()
+        wait = self.last_call + self.window - loop.time()
+        if wait <= 0 and self.flush_handle is None:
+            await self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(wait, lambda: asyncio.create_task(self.flush()))
+        return seconds
+
+    async def flush(self):
+        self.flush_handle = None
+        if self.target is None:
+            return
+        target, self.target = self.target, None
+        self.last_call = asyncio.get_running_loop().time()
+        interface = self.player.player_interface
+        trackid = self.player.last_raw_metadata.get('mpris:trackid')
+        try:
+            if trackid:
+                await interface.call_set_position(trackid, int(target * 1_000_000))
+            else:
+                # SetPosition needs the track ID, fall back to a relative Seek
+                await interface.call_seek(int((target - self.position) * 1_000_000))
+            self.sent = (target, time.time())
+        except DBusError as e:
+            log.warning('[%s] Seeking to %.2fs failed: %s', self.player.name, target, e)
+
+    def cancel(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+
+class PlaybackControl:
+    """
+    Socket commands forwarding playback control to the active player, or the one named in
+    the `player` key of a JSON command (or as the last word of a text command):
+
+        play | pause | play-pause | stop | next | previous [player]
+        seek <+/-seconds> [player]
+        set-position <seconds | percent%> [player]
+    """
+
+    def __init__(self, listener):
+        self.listener = listener
+        self.debouncers: dict[str, SeekDebouncer] = {}
+
+    def register(self, server):
+        for name in TRANSPORT_COMMANDS:
+            server.register_command(name, self._transport_command)
+        server.register_command('seek', self._seek_command)
+        server.register_command('set-position', self._set_position_command)
+
+    def forget(self, player_name: str):
+        debouncer = self.debouncers.pop(player_name, None)
+        if debouncer:
+            debouncer.cancel()
+
+    def _resolve_player(self, request: dict[str, Any], args: list[str]) -> Player:
+        name = request.get('player') or (args[0] if args else None)
+        players = self.listener.players_connected
+        if name is None:
+            _, player = self.listener.active_player
+            if player is None:
+                raise KeyError('no player connected')
+            return player
+        if name in players:
+            return players[name]
+        # Allow `firefox` for `firefox.instance_1234`
+        matches = [player for player_name, player in players.items() if player_name.split('.')[0] == name]
+        if len(matches) != 1:
+            raise KeyError(f'no single player matches {name}')
+        return matches[0]
+
+    def _debouncer(self, player: Player) -> SeekDebouncer:
+        debouncer = self.debouncers.get(player.name)
+        if debouncer is None or debouncer.player is not player:
+            debouncer = self.debouncers[player.name] = SeekDebouncer(player)
+        return debouncer
+
+    async def _transport_command(self, client, request: dict[str, Any]):
+        command = request['command']
+        player = self._resolve_player(request, request.get('args', []))
+        metrics.inc('control_commands_total', command=command, player=player.name)
+        try:
+            await getattr(player.player_interface, TRANSPORT_COMMANDS[command])()
+        except DBusError as e:
+            return {'Error': f'{command} failed on {player.name}: {e}'}
+        return {'control': command, 'player': player.name}
+
+    async def _seek_command(self, client, request: dict[str, Any]):
+        args = request.get('args', [])
+        offset = float(request['offset'] if 'offset' in request else args[0])
+        player = self._resolve_player(request, args[1:])
+        metrics.inc('control_commands_total', command='seek', player=player.name)
+        debouncer = self._debouncer(player)
+        target = await debouncer.seek_to(debouncer.position + offset)
+        return {'control': 'seek', 'player': player.name, 'position': target}
+
+    async def _set_position_command(self, client, request: dict[str, Any]):
+        args = request.get('args', [])
+        position = str(request['position'] if 'position' in request else args[0])
+        player = self._resolve_player(request, args[1:])
+        metrics.inc('control_commands_total', command='set-position', player=player.name)
+        if position.endswith('%'):
+            length = player.last_raw_metadata.get('mpris:length')
+            if not length:
+                raise ValueError(f'{player.name} did not report a track length')
+            seconds = float(position[:-1]) / 100 * length
+        else:
+            seconds = float(position)
+        target = await self._debouncer(player).seek_to(seconds)
+        return {'control': 'set-position', 'player': player.name, 'position': target}
+
+
+class ControlServer:
+    """
+    Line based command socket for panels and key bindings: every line is a socket command
+    (`play-pause`, `set-position 42%`, `stats`, ...) answered by one JSON line. No handshake
+    and no metadata frames, so `echo seek +5 | socat - UNIX-CONNECT:<path>` is all a slider
+    tick costs instead of starting a Python client.
+    """
+
+    def __init__(self, server, socket_path: str):
+        self.server = server
+        self.socket_path = socket_path
+        self.unix_server: asyncio.Server | None = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                command = line.decode('utf-8', errors='replace').strip()
+                if not command:
+                    continue
+                response = await self.server.execute_command(None, command)
+                writer.write(dumpb(response if response is not None else {}) + b'\n')
+                await writer.drain()
+        except (ValueError, ConnectionResetError, BrokenPipeError):
+            # Overlong line, or the sender left without waiting for the reply
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.unix_server = await asyncio.start_unix_server(self._handle, self.socket_path)
+        log.info('Control socket listening at %s', self.socket_path)
+
+    async def stop(self):
+        if self.unix_server:
+            self.unix_server.close()
+            await self.unix_server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
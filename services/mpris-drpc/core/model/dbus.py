@@ -3,14 +3,17 @@ import logging
 from dbus_next.aio import MessageBus
 
 from core.model.player import Player
-from core.constants import log_level
 from core.model.config import Config
+from core.model.control import PlaybackControl
+from core.model.lyrics import LyricsResolver, LyricSync
 from core.model.socket_server import SocketServer
+from core.model.journal import recorder, CONNECT, DISCONNECT
+from core.model.state import restored_metadata
+from core.model.snapshot import EMPTY
 
 SPECiAL_PLAYERS = ['playerctld']
 
 log = logging.getLogger(__name__)
-log.setLevel(log_level)
 
 class DbusListener():
     bus: MessageBus
@@ -22,16 +25,67 @@ class DbusListener():
         self.bus = bus
         self.server = server
         self.config = config
+        # Per player entries of the state snapshot, until the player attaches (or is pruned)
+        self.warm: dict[str, dict] = {}
+        self.warm_active: str | None = None
+        self.control = PlaybackControl(self)
+        self.control.register(server)
+        self.lyrics = LyricsResolver(config.lyrics_paths, config.lyrics_endpoint)
+        # Set by the application when the play history is enabled
+        self.history = None
+        # Set by the application when rich presence is enabled
+        self.presence = None
+
+    def update_config(self, config: Config):
+        self.config = config
+        self.lyrics.configure(config)
+        if self.history:
+            self.history.configure(config)
+        if self.presence:
+            self.presence.update_config(config)
+        for player in self.players_connected.values():
+            player.config = config
+
+    async def invalidate(self, changed_rules: list):
+        """
+        Reprocesses the metadata of every player whose raw metadata is matched by one of
+        the changed rules (either its old or its new version), other players keep their
+        processed metadata.
+        """
+        for player in list(self.players_connected.values()):
+            raw = player.last_raw_metadata
+            if raw and any(compiled.matcher.evaluate(raw) for compiled in changed_rules):
+                await player.reprocess()
+
+    def restore(self, state: dict):
+        """Serves a state snapshot from before a restart until the players attach again."""
+        self.warm = dict(state.get('players', {}))
+        self.warm_active = state.get('active')
+        for player_name, entry in self.warm.items():
+            self.server.update_snapshot(player_name, restored_metadata(entry))
+        if self.warm:
+            log.info('Restored state snapshot for %s', list(self.warm))
+
+    async def prune_restored(self):
+        """Drops the restored entries of players that did not come back."""
+        for player_name in list(self.warm):
+            if player_name not in self.players_connected:
+                await self.server.remove_player(player_name)
+        self.warm.clear()
+        self.warm_active = None
 
     def disconnect_player(self, player_name: str):
         if player_name in self.players_connected:
-            log.info(f'Player {player_name} disconnected, removing its entry')
+            log.info('Player %s disconnected, removing its entry', player_name)
             player = self.players_connected[player_name]
             obj = player.interface
             interface_properties = obj.get_interface('org.freedesktop.DBus.Properties')
-            interface_seek = obj.get_interface('org.mpris.MediaPlayer2.Player')
             interface_properties.off_properties_changed(player.on_update)
-            interface_seek.off_seeked(player.on_seek)
+            player.player_interface.off_seeked(player.on_seeked)
+            player.lyric_sync.cancel()
+            if self.history:
+                self.history.end(player_name)
+            self.control.forget(player_name)
             del self.players_connected[player_name]
     
     def disconnect_all(self):
@@ -43,9 +97,12 @@ class DbusListener():
             return
         player_name = name.replace('org.mpris.MediaPlayer2.', '')
         if new_owner:
-            log.info(f'Player {player_name} just connected, setting up listener')
+            log.info('Player %s just connected, setting up listener', player_name)
         else:
+            recorder.record(player_name, DISCONNECT)
             self.disconnect_player(player_name)
+            await self.server.remove_player(player_name)
+            # Subscribers of the active player now follow whichever player is active next
             metadata = self.player_metadata
             await self.server.send_metadata('ON_EVENT', metadata)
             await self.server.send_metadata('ON_SEEK', metadata)
@@ -56,21 +113,32 @@ class DbusListener():
         log.debug('Initializing Interface')
         introspection = await self.bus.introspect(name, '/org/mpris/MediaPlayer2')
         obj = self.bus.get_proxy_object(name, '/org/mpris/MediaPlayer2', introspection)
+        recorder.record(player_name, CONNECT)
+        player = self.attach_player(player_name, obj)
+        # Registered first so the initial update already counts towards the active player
+        self.players_connected[player_name] = player
+        if existing_conn:
+            await player.force_update()
+            await player.on_seek(1)
+
+    def attach_player(self, player_name: str, obj) -> Player:
+        """Creates the `Player` for a proxy object and subscribes it to the player's signals."""
         interface_properties = obj.get_interface('org.freedesktop.DBus.Properties')
-        interface_seek = obj.get_interface('org.mpris.MediaPlayer2.Player')
 
-        event_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_EVENT', metadata, **kwargs)
-        seek_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_SEEK', metadata, **kwargs)
-        metadata_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_METADATA', metadata, **kwargs)
-        status_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_STATUS', metadata, **kwargs)
+        event_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_EVENT', metadata, player_name, **kwargs)
+        seek_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_SEEK', metadata, player_name, **kwargs)
+        metadata_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_METADATA', metadata, player_name, **kwargs)
+        status_cb = lambda metadata, **kwargs: self.server.send_metadata('ON_STATUS', metadata, player_name, **kwargs)
+        # Lyric lines overlay the player's metadata, they are not a new snapshot of it
+        lyric_cb = lambda metadata, **kwargs: self.server.send_event('ON_LYRIC', metadata, player_name, **kwargs)
 
         player = Player(self.config, player_name, obj, event_cb, seek_cb, metadata_cb, status_cb)
+        player.lyric_sync = LyricSync(player, self.lyrics, lyric_cb)
+        player.warm_entry = self.warm.pop(player_name, None)
+        player.history = self.history
         interface_properties.on_properties_changed(player.on_update)
-        interface_seek.on_seeked(player.on_seek)
-        if existing_conn:
-            await player.force_update()
-            await player.on_seek(1)
-        self.players_connected[player_name] = player
+        player.player_interface.on_seeked(player.on_seeked)
+        return player
 
     async def connect_existing(self, service_name: str):
         await self.handle_connection(service_name, '', service_name, True)
@@ -83,15 +151,23 @@ class DbusListener():
     def active_player(self):
         if not self.players_connected:
             return None, None
-        # Sort by active status (True first) and then by most recent activity
-        return sorted(self.players_connected.items(), key=lambda item: (item[1].active, item[1].last_active), reverse=True)[0]
+        # Active (playing) players first, then the most recent activity
+        return max(self.players_connected.items(), key=lambda item: (item[1].active, item[1].last_active))
+
+    @property
+    def active_player_name(self) -> str | None:
+        name, _ = self.active_player
+        return name if name is not None else self.warm_active
     
+    def lyric_fields(self, player_name: str | None) -> dict:
+        """The `lyrics:` keys of the line `player_name` is at, empty without lyrics sync."""
+        player = self.players_connected.get(player_name)
+        return player.lyric_sync.fields if player and player.lyric_sync else {}
+
     @property
     def player_metadata(self):
         _, player = self.active_player
         if player:
-            metadata = player.metadata.copy()
-            metadata.update(player.extra_properties)
-            return metadata
+            return player.published_metadata
         else:
-            return {}
\ No newline at end of file
+            return EMPTY
\ No newline at end of file
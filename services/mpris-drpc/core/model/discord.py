@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import uuid
+import struct
+import asyncio
+import logging
+from typing import Any
+from collections import deque, defaultdict
+
+from core.model.config import Config
+from core.model.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Discord IPC frames: little endian opcode and payload length, then the JSON payload
+HEADER = struct.Struct('<II')
+OP_HANDSHAKE = 0
+OP_FRAME = 1
+OP_CLOSE = 2
+OP_PING = 3
+OP_PONG = 4
+# Discord accepts 5 presence updates per 20 seconds, anything faster is silently dropped
+RATE_LIMIT_UPDATES = 5
+RATE_LIMIT_WINDOW = 20.0
+# A track change arrives as a metadata update quickly followed by a position update, wait for both
+SETTLE_DELAY = 0.25
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 60.0
+ACTIVITY_LISTENING = 2
+# Where Discord (native, flatpak, snap, Vesktop) puts its sockets, relative to the runtime directory
+IPC_SUBDIRECTORIES = ('', 'app/com.discordapp.Discord', 'snap.discord', '.flatpak/dev.vencord.Vesktop/xdg-run')
+
+
+def ipc_candidates() -> list[str]:
+    bases = []
+    for variable in ('XDG_RUNTIME_DIR', 'TMPDIR', 'TMP', 'TEMP'):
+        if os.environ.get(variable) and os.environ[variable] not in bases:
+            bases.append(os.environ[variable])
+    bases.append('/tmp')
+    return [os.path.join(base, subdirectory, f'discord-ipc-{i}') for base in bases for subdirectory in IPC_SUBDIRECTORIES for i in range(10)]
+
+
+def _text_field(text: str) -> str | None:
+    """Discord wants 2 to 128 characters."""
+    text = text.strip()
+    if not text:
+        return None
+    if len(text) < 2:
+        text += '\u200b'
+    return text[:128]
+
+
+class DiscordPresence:
+    """
+    Publishes the active player as the Discord Rich Presence activity, a server sink.
+
+    Updates go through a coalescer: the latest activity always replaces the pending one, and
+    a flush is sent right away while the rate limit window has room, otherwise a trailing
+    flush is scheduled for when it frees up, so bursts of track changes end up as at most
+    `RATE_LIMIT_UPDATES` per window with the final state always delivered. While Discord
+    is not running the connection is retried with exponential backoff.
+    """
+
+    def __init__(self, listener, config: Config):
+        self.listener = listener
+        self.config = config
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.task: asyncio.Task | None = None
+        self.pending: dict[str, Any] | None = None
+        self.sent: dict[str, Any] | None = None
+        self.sends: deque[float] = deque(maxlen=RATE_LIMIT_UPDATES)
+        self.flush_handle: asyncio.TimerHandle | None = None
+
+    def __call__(self, player: str | None, metadata: dict[str, Any]):
+        active = self.listener.active_player_name
+        if player is not None and player != active:
+            return
+        self.update(self.build_activity(metadata) if active else None)
+
+    def build_activity(self, metadata: dict[str, Any]) -> dict[str, Any] | None:
+        status = metadata.get('tracking:status', 'Stopped')
+        if not metadata or status == 'Stopped' or (status == 'Paused' and self.config.clear_on_pause):
+            return None
+        values = defaultdict(str)
+        for key, value in metadata.items():
+            values[key.replace(':', '|')] = ', '.join(map(str, value)) if isinstance(value, (list, tuple)) else value
+
+        activity: dict[str, Any] = {'type': ACTIVITY_LISTENING}
+        for field, template in (('details', self.config.details), ('state', self.config.state)):
+            if template and (text := _text_field(template.format_map(values))):
+                activity[field] = text
+
+        assets = {}
+        art_url = metadata.get('mpris:artUrl') or ''
+        if art_url.startswith(('http://', 'https://')):
+            # Discord proxies external images, local files cannot be shown
+            assets['large_image'] = art_url[:256]
+            if self.config.large_text and (text := _text_field(self.config.large_text.format_map(values))):
+                assets['large_text'] = text
+        if status == 'Paused':
+            assets['small_text'] = 'Paused'
+        if assets:
+            activity['assets'] = assets
+
+        if status == 'Playing' and self.config.show_timestamps:
+            start = float(metadata.get('tracking:startTime') or 0) - float(metadata.get('tracking:existingTime') or 0)
+            # Whole seconds, so repeated position reports of the same playback do not count as changes
+            timestamps = {'start': int(start)}
+            if metadata.get('mpris:length'):
+                timestamps['end'] = int(start + float(metadata['mpris:length']))
+            activity['timestamps'] = timestamps
+        return activity
+
+    def update(self, activity: dict[str, Any] | None):
+        if activity == self.pending:
+            return
+        if self.flush_handle:
+            metrics.inc('presence_updates_coalesced_total')
+        self.pending = activity
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self.flush_handle or self.writer is None or self.pending == self.sent:
+            return
+        delay = SETTLE_DELAY
+        if len(self.sends) == RATE_LIMIT_UPDATES:
+            delay = max(self.sends[0] + RATE_LIMIT_WINDOW - time.monotonic(), delay)
+        self.flush_handle = asyncio.get_running_loop().call_later(delay, self._flush)
+
+    def _flush(self):
+        self.flush_handle = None
+        if self.writer is None or self.pending == self.sent:
+            return
+        args: dict[str, Any] = {'pid': os.getpid()}
+        if self.pending is not None:
+            args['activity'] = self.pending
+        self._send(OP_FRAME, {'cmd': 'SET_ACTIVITY', 'args': args, 'nonce': str(uuid.uuid4())})
+        self.sends.append(time.monotonic())
+        self.sent = self.pending
+        metrics.inc('presence_updates_sent_total')
+
+    def _send(self, op: int, payload: dict[str, Any]):
+        data = json.dumps(payload).encode('utf-8')
+        self.writer.write(HEADER.pack(op, len(data)) + data)
+
+    async def _recv(self) -> tuple[int, dict[str, Any]]:
+        op, length = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+        return op, json.loads(await self.reader.readexactly(length))
+
+    async def _connect(self):
+        paths = [os.path.expanduser(self.config.ipc_path)] if self.config.ipc_path else ipc_candidates()
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(path)
+                break
+            except OSError:
+                continue
+        else:
+            raise ConnectionError('Discord IPC socket not found')
+
+        self._send(OP_HANDSHAKE, {'v': 1, 'client_id': str(self.config.client_id)})
+        op, payload = await self._recv()
+        if op == OP_CLOSE:
+            raise ConnectionError(f"Discord refused the handshake: {payload.get('message', payload)}")
+        if op != OP_FRAME or payload.get('evt') != 'READY':
+            raise ConnectionError(f'Unexpected handshake response: {payload}')
+        user = payload.get('data', {}).get('user', {}).get('username')
+        log.info('Connected to Discord IPC at %s%s', path, f' as {user}' if user else '')
+
+    async def _read_loop(self):
+        while True:
+            op, payload = await self._recv()
+            if op == OP_FRAME and payload.get('evt') == 'ERROR':
+                log.warning("Discord rejected %s: %s", payload.get('cmd'), payload.get('data', {}).get('message'))
+            elif op == OP_CLOSE:
+                raise ConnectionError(f"Discord closed the connection: {payload.get('message', payload)}")
+            elif op == OP_PING:
+                self._send(OP_PONG, payload)
+
+    def _disconnect(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+        # A new Discord session starts without our activity
+        self.sent = None
+
+    async def _run(self):
+        backoff = RECONNECT_MIN
+        while True:
+            try:
+                await self._connect()
+                backoff = RECONNECT_MIN
+                self._schedule_flush()
+                await self._read_loop()
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                log.debug('Discord IPC unavailable (%s), retrying in %.0fs', e, backoff)
+            self._disconnect()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_MAX)
+
+    def update_config(self, config: Config):
+        """
+        Applies a reloaded `[drpc]` section: the templates and pause options are applied to the
+        current activity right away, a changed `client_id` or `ipc_path` reconnects.
+        """
+        previous, self.config = self.config, config
+        if (config.client_id, config.ipc_path) != (previous.client_id, previous.ipc_path):
+            log.info('Discord client_id or ipc_path changed, reconnecting')
+            if self.task:
+                self.task.cancel()
+                self.task = None
+            self._disconnect()
+            self.start()
+        self(None, self.listener.player_metadata)
+
+    def start(self):
+        if not self.config.client_id:
+            log.error('discord_rpc is enabled but no client_id is set under [drpc], rich presence disabled')
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.writer is not None:
+            try:
+                # Clear the activity rather than leaving a stale one behind
+                self.pending = None
+                if self.sent is not None:
+                    self._flush()
+                await self.writer.drain()
+            except (OSError, ConnectionError):
+                pass
+            self._disconnect()
@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import asyncio
+import logging
+import threading
+import dataclasses
+from typing import Any
+from collections import OrderedDict
+
+from core.model.config import Config
+from core.model.metrics import metrics
+from core.model.snapshot import Metadata
+from core.utils.art_kit import art_pinned
+from core.utils.path_kit import get_data_path
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+# Queued rows that trigger a flush before the interval is up
+BATCH_SIZE = 200
+# Shorter plays (skips, previews) are not recorded
+MIN_PLAYED = 5.0
+# Processed metadata kept in memory, by fingerprint
+MEMORY_TRACKS = 256
+# Older processed metadata is processed again rather than reused
+TRACK_TTL = 30 * 24 * 3600
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 500
+_STOP = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    player TEXT NOT NULL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    url TEXT,
+    started REAL NOT NULL,
+    played REAL NOT NULL,
+    length REAL
+);
+CREATE INDEX IF NOT EXISTS plays_started ON plays (started);
+CREATE INDEX IF NOT EXISTS plays_fingerprint ON plays (fingerprint, started);
+CREATE TABLE IF NOT EXISTS tracks (
+    fingerprint TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (fingerprint, digest)
+) WITHOUT ROWID;
+"""
+INSERT_PLAY = 'INSERT INTO plays (fingerprint, player, title, artist, album, url, started, played, length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+UPSERT_TRACK = 'INSERT INTO tracks (fingerprint, digest, metadata, updated) VALUES (?, ?, ?, ?) ON CONFLICT (fingerprint, digest) DO UPDATE SET metadata = excluded.metadata, updated = excluded.updated'
+SELECT_TRACK = 'SELECT metadata, updated FROM tracks WHERE fingerprint = ? AND digest = ?'
+SELECT_TOP = """
+SELECT fingerprint, title, artist, album, url, COUNT(*) AS plays, SUM(played) AS played, MAX(started) AS last_played
+FROM plays WHERE started >= ? GROUP BY fingerprint ORDER BY plays DESC, played DESC LIMIT ?
+"""
+SELECT_RECENT = 'SELECT fingerprint, player, title, artist, album, url, started, played, length FROM plays ORDER BY started DESC LIMIT ?'
+
+
+@dataclasses.dataclass(slots=True)
+class Play:
+    """A track being listened to, recorded once the player moves on."""
+    fingerprint: str
+    metadata: Metadata
+    started: float
+    status: str = 'Stopped'
+    existing_time: float = 0.0
+    start_time: float = 0.0
+
+    def position(self, now: float) -> float:
+        if self.status == 'Playing':
+            return self.existing_time + now - self.start_time
+        return self.existing_time
+
+
+def _artist(metadata: Metadata) -> str:
+    artist = metadata.get('xesam:artist', '')
+    return ', '.join(map(str, artist)) if isinstance(artist, (list, tuple)) else str(artist)
+
+
+def _art_exists(metadata: dict[str, Any]) -> bool:
+    """
+    Cached metadata pointing at art files that were cleaned up (runtime dir, reboot) is stale,
+    as is local art outside the art cache (a plugin's fixed path, since overwritten).
+    """
+    if not art_pinned(metadata):
+        return False
+    art_url = metadata.get('mpris:artUrl')
+    if isinstance(art_url, str) and art_url.startswith('file://') and not os.path.exists(art_url[len('file://'):]):
+        return False
+    return True
+
+
+class HistoryStore:
+    """
+    Listening history and processed metadata cache in SQLite, a server sink.
+
+    Nothing touches the database on the event loop: finished plays and processed metadata
+    are queued, and a writer thread inserts what accumulated in one transaction every
+    `flush_interval` seconds (or as soon as `BATCH_SIZE` rows are waiting). Queries and
+    cache misses run on a separate read connection in a worker thread, which WAL mode
+    lets proceed while the writer commits.
+
+    Processed metadata is keyed by the raw metadata fingerprint and the pipeline digest (the
+    ruleset, the plugin sources and the config fields changing the output), players reuse it
+    instead of running the plugins again for a track heard before.
+    """
+
+    def __init__(self, listener, path: str | None = None, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.listener = listener
+        self.path = os.path.expanduser(path) if path else get_data_path('history.sqlite3')
+        self.flush_interval = flush_interval
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread: threading.Thread | None = None
+        self.reader: sqlite3.Connection | None = None
+        self.reader_lock = threading.Lock()
+        self.plays: dict[str, Play] = {}
+        self.memory: OrderedDict[tuple[str, str], Metadata] = OrderedDict()
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, **kwargs)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        self.reader = self._connect(check_same_thread=False)
+        self.reader.row_factory = sqlite3.Row
+        self.thread = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Records the plays in progress and waits for everything queued to be written."""
+        now = time.time()
+        for player_name in list(self.plays):
+            self.end(player_name, now)
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+        if self.reader is not None:
+            with self.reader_lock:
+                self.reader.close()
+            self.reader = None
+
+    def configure(self, config: Config):
+        """Processed metadata of the previous pipeline is keyed by its digest and never read again, drops it from memory."""
+        self.memory.clear()
+
+    def register(self, server):
+        server.register_command('history', self._history_command)
+
+    # Writer thread
+
+    def _write_loop(self):
+        conn = self._connect()
+        plays: list[tuple] = []
+        # Latest processed metadata per key, a track reprocessed twice is written once
+        tracks: dict[tuple[str, str], tuple] = {}
+        deadline = 0.0
+        try:
+            while True:
+                pending = len(plays) + len(tracks)
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()) if pending else None)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    break
+                if item is not None:
+                    kind, row = item
+                    if kind == 'play':
+                        plays.append(row)
+                    else:
+                        tracks[row[:2]] = row
+                    if not pending:
+                        deadline = time.monotonic() + self.flush_interval
+                if item is None or len(plays) + len(tracks) >= BATCH_SIZE:
+                    self._flush(conn, plays, tracks)
+                    plays, tracks = [], {}
+            self._flush(conn, plays, tracks)
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection, plays: list[tuple], tracks: dict[tuple[str, str], tuple]):
+        if not plays and not tracks:
+            return
+        start = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(INSERT_PLAY, plays)
+                conn.executemany(UPSERT_TRACK, tracks.values())
+        except sqlite3.Error as e:
+            log.warning('Could not write %s plays and %s tracks to %s: %s', len(plays), len(tracks), self.path, e)
+            return
+        metrics.observe('history_flush_seconds', time.perf_counter() - start)
+        metrics.inc('history_rows_written_total', len(plays) + len(tracks))
+
+    # Sink
+
+    def __call__(self, player_name: str | None, metadata: dict[str, Any]):
+        if player_name is None:
+            return
+        player = self.listener.players_connected.get(player_name)
+        fingerprint = player.raw_fingerprint if player else None
+        status = metadata.get('tracking:status', 'Stopped')
+        now = time.time()
+        play = self.plays.get(player_name)
+        if play is not None and (play.fingerprint != fingerprint or status == 'Stopped'):
+            self.end(player_name, now)
+            play = None
+        if play is None:
+            if not fingerprint or status == 'Stopped' or not metadata.get('xesam:title'):
+                return
+            play = self.plays[player_name] = Play(fingerprint, Metadata.of(metadata), now)
+        play.metadata = Metadata.of(metadata)
+        play.status = status
+        play.existing_time = float(metadata.get('tracking:existingTime') or 0.0)
+        play.start_time = float(metadata.get('tracking:startTime') or now)
+
+    def end(self, player_name: str, now: float | None = None):
+        """Records the play in progress on `player_name`, if it lasted long enough."""
+        play = self.plays.pop(player_name, None)
+        if play is None:
+            return
+        metadata = play.metadata
+        length = metadata.get('mpris:length')
+        played = play.position(now or time.time())
+        if length:
+            played = min(played, float(length))
+        if played < MIN_PLAYED:
+            return
+        url = metadata.get('xesam:url')
+        self.queue.put(('play', (
+            play.fingerprint, player_name, str(metadata.get('xesam:title', '')), _artist(metadata),
+            str(metadata.get('xesam:album', '')), url if isinstance(url, str) else None,
+            play.started, played, float(length) if length else None,
+        )))
+
+    # Processed metadata cache
+
+    def remember(self, fingerprint: str, metadata: Metadata, pipeline: str):
+        """Caches `metadata` processed from the raw metadata `fingerprint` under the `pipeline_digest` `pipeline`."""
+        if not art_pinned(metadata):
+            # Its art could not be copied to the art cache, the path will show another track's
+            log.debug('Not caching metadata of %s: local art outside the art cache', fingerprint)
+            return
+        key = (fingerprint, pipeline)
+        self._memorize(key, metadata)
+        try:
+            data = json.dumps(metadata.to_dict(), ensure_ascii=False, default=str)
+        except (TypeError, ValueError) as e:
+            log.debug('Not caching metadata of %s: %s', fingerprint, e)
+            return
+        self.queue.put(('track', (fingerprint, pipeline, data, time.time())))
+
+    def _memorize(self, key: tuple[str, str], metadata: Metadata):
+        self.memory[key] = metadata
+        self.memory.move_to_end(key)
+        if len(self.memory) > MEMORY_TRACKS:
+            self.memory.popitem(last=False)
+
+    def _read_track(self, key: tuple[str, str]) -> dict[str, Any] | None:
+        with self.reader_lock:
+            if self.reader is None:
+                return None
+            row = self.reader.execute(SELECT_TRACK, key).fetchone()
+        if row is None or time.time() - row['updated'] > TRACK_TTL:
+            return None
+        return json.loads(row['metadata'])
+
+    async def cached_metadata(self, fingerprint: str | None, pipeline: str) -> Metadata | None:
+        """Processed metadata of the track from an earlier play under the same `pipeline_digest`, if still usable."""
+        if not fingerprint:
+            return None
+        key = (fingerprint, pipeline)
+        metadata = self.memory.get(key)
+        if metadata is None:
+            try:
+                data = await asyncio.to_thread(self._read_track, key)
+            except (sqlite3.Error, ValueError) as e:
+                log.warning('Could not read cached metadata of %s: %s', fingerprint, e)
+                return None
+            if data is None:
+                return None
+            metadata = Metadata(data)
+        if not _art_exists(metadata):
+            self.memory.pop(key, None)
+            return None
+        self._memorize(key, metadata)
+        return metadata
+
+    # Queries
+
+    def _query(self, sql: str, params: tuple) -> list[dict[str, Any]]:
+        with self.reader_lock:
+            if self.reader is None:
+                return []
+            return [dict(row) for row in self.reader.execute(sql, params)]
+
+    async def top(self, limit: int = DEFAULT_LIMIT, days: float | None = None) -> list[dict[str, Any]]:
+        """Most played tracks, over the last `days` when given."""
+        since = time.time() - days * 86400 if days else 0.0
+        return await asyncio.to_thread(self._query, SELECT_TOP, (since, min(limit, MAX_LIMIT)))
+
+    async def recent(self, limit: int = DEFAULT_LIMIT) -> list[dict[str, Any]]:
+        return await asyncio.to_thread(self._query, SELECT_RECENT, (min(limit, MAX_LIMIT),))
+
+    async def _history_command(self, client, request: dict[str, Any]):
+        """`history recent [N]` lists the last plays, `history top [N] [DAYS]` the most played tracks."""
+        args = request.get('args', [])
+        view = request.get('view') or (args[0] if args else 'recent')
+        limit = int(request.get('limit') or (args[1] if len(args) > 1 else DEFAULT_LIMIT))
+        try:
+            if view == 'top':
+                days = request.get('days') or (args[2] if len(args) > 2 else None)
+                return {'top': await self.top(limit, float(days) if days else None)}
+            if view == 'recent':
+                return {'recent': await self.recent(limit)}
+        except sqlite3.Error as e:
+            return {'Error': f'history failed: {e}'}
+        raise ValueError(f'unknown view {view}, expected recent or top')
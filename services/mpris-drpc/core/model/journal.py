@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Any, Iterator
+from dbus_next import Variant
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+# Record kinds
+CONNECT = 'connect'
+DISCONNECT = 'disconnect'
+PROPERTIES = 'props'
+SEEKED = 'seeked'
+POSITION = 'position'
+
+
+def encode(value: Any) -> Any:
+    """Turns D-Bus values into JSON, variants keep their signature so replay can rebuild them."""
+    if isinstance(value, Variant):
+        return {'$v': [value.signature, encode(value.value)]}
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    if isinstance(value, bytes):
+        return {'$b': base64.b64encode(value).decode('ascii')}
+    return value
+
+
+def decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and '$v' in value:
+            signature, inner = value['$v']
+            return Variant(signature, decode(inner))
+        if len(value) == 1 and '$b' in value:
+            return base64.b64decode(value['$b'])
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+class JournalWriter:
+    """
+    Appends one compact JSON array per signal, `[monotonic_time, player, kind, payload]`,
+    and rotates the file once it grows past `max_bytes` (journal -> journal.1 -> ...).
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, player: str, kind: str, payload: Any):
+        line = json.dumps([time.monotonic(), player, kind, encode(payload)], separators=(',', ':'), ensure_ascii=False)
+        self.file.write(line + '\n')
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.unlink(self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self.file.close()
+
+
+class JournalRecorder:
+    """Process wide hook the D-Bus side calls into, does nothing until a writer is attached."""
+
+    def __init__(self):
+        self.writer: JournalWriter | None = None
+
+    def start(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS):
+        self.writer = JournalWriter(path, max_bytes, backups)
+        log.info('Recording MPRIS signals to %s', path)
+
+    def record(self, player: str, kind: str, payload: Any = None):
+        if self.writer is not None:
+            self.writer.write(player, kind, payload)
+
+    def stop(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+recorder = JournalRecorder()
+
+
+def read_journal(path: str) -> Iterator[tuple[float, str, str, Any]]:
+    """Yields records from the rotated backups (oldest first) and then the live file."""
+    backups = []
+    i = 1
+    while os.path.exists(f'{path}.{i}'):
+        backups.append(f'{path}.{i}')
+        i += 1
+    for file_path in [*reversed(backups), path]:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    t, player, kind, payload = json.loads(line)
+                    yield t, player, kind, decode(payload)
+
+
+class ReplayInterface:
+    """Stands in for the dbus_next proxy interfaces a `Player` uses, without a bus."""
+
+    def __init__(self, positions: deque):
+        self.positions = positions
+        self.last_position = 0
+        self.consumed = 0
+
+    async def get_position(self):
+        if self.positions:
+            self.last_position = self.positions.popleft()
+            self.consumed += 1
+        return self.last_position
+
+    def __getattr__(self, name: str):
+        # on_properties_changed / off_seeked etc, signal (un)registration is a no-op on replay
+        if name.startswith(('on_', 'off_')):
+            return lambda *args, **kwargs: None
+        # Playback control (call_play_pause, call_set_position, ...) has no player to reach
+        if name.startswith('call_'):
+            async def call(*args, **kwargs):
+                return None
+            return call
+        raise AttributeError(name)
+
+
+class ReplayProxy:
+    def __init__(self, positions: deque):
+        self.interface = ReplayInterface(positions)
+
+    def get_interface(self, name: str):
+        return self.interface
+
+
+async def replay(path: str, listener, speed: float | None = 1.0) -> tuple[int, float]:
+    """
+    Feeds a journal back through `DbusListener` / `Player` / `metadata_process` / `SocketServer`.
+
+    `speed` scales the recorded gaps between signals (2.0 replays twice as fast), None
+    replays as fast as possible. Position queries are answered with the positions the
+    player returned when the journal was recorded.
+
+    Returns:
+        The number of records replayed and the wall time it took.
+    """
+    records = list(read_journal(path))
+    positions: dict[str, deque] = defaultdict(deque)
+    for _, player, kind, payload in records:
+        if kind == POSITION:
+            positions[player].append(payload)
+
+    proxies: dict[str, ReplayProxy] = {}
+    seen_positions: dict[str, int] = defaultdict(int)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first = records[0][0] if records else 0.0
+    for t, player_name, kind, payload in records:
+        if speed:
+            delay = (t - first) / speed - (loop.time() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)
+
+        if kind == CONNECT:
+            proxies[player_name] = ReplayProxy(positions[player_name])
+            seen_positions[player_name] = 0
+            player = listener.attach_player(player_name, proxies[player_name])
+            listener.players_connected[player_name] = player
+        elif kind == DISCONNECT:
+            await listener.handle_connection(f'org.mpris.MediaPlayer2.{player_name}', player_name, '', False)
+        elif player_name not in listener.players_connected:
+            log.warning('Journal record for unknown player %s, skipping', player_name)
+        elif kind == PROPERTIES:
+            await listener.players_connected[player_name].on_update('org.mpris.MediaPlayer2.Player', payload, [])
+        elif kind == SEEKED:
+            await listener.players_connected[player_name].on_seeked(payload)
+        elif kind == POSITION:
+            # Positions are normally consumed by the on_seek a signal triggers, one that is
+            # still pending came from a standalone position refresh (e.g. right after attach)
+            seen_positions[player_name] += 1
+            if proxies[player_name].interface.consumed < seen_positions[player_name]:
+                await listener.players_connected[player_name].on_seek(1)
+
+    return len(records), loop.time() - start
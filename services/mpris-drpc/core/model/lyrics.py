@@ -0,0 +1,313 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from bisect import bisect_right
+from typing import Any, Callable, Coroutine
+
+from core.model.metrics import metrics
+from core.utils.module_kit import lazy_import
+from core.utils.path_kit import get_cache_path
+
+requests = lazy_import('requests')
+
+log = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINT = 'https://lrclib.net'
+USER_AGENT = 'mpris-drpc'
+REQUEST_TIMEOUT = 5.0
+# Tracks without synced lyrics are looked up again after this long
+MISS_TTL = 7 * 24 * 3600
+# Timers fire this much after a line boundary so the position is already past it
+BOUNDARY_EPSILON = 0.005
+
+TIMESTAMP = re.compile(r'\[(\d+):(\d+(?:[.:]\d+)?)\]')
+OFFSET = re.compile(r'\[offset:\s*([+-]?\d+)\s*\]', re.IGNORECASE)
+WORD_TAG = re.compile(r'<\d+:\d+(?:[.:]\d+)?>')
+
+
+class Lyrics:
+    """Synced lyrics as parallel sorted arrays, `times[i]` is when `lines[i]` starts (in seconds)."""
+    __slots__ = ('times', 'lines')
+
+    def __init__(self, times: list[float], lines: list[str]):
+        self.times = times
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.times)
+
+    def index_at(self, position: float) -> int:
+        """Index of the line shown at `position`, -1 before the first line."""
+        return bisect_right(self.times, position) - 1
+
+    def line(self, index: int) -> str:
+        return self.lines[index] if index >= 0 else ''
+
+    def start(self, index: int) -> float:
+        return self.times[index] if index >= 0 else 0.0
+
+    def next_time(self, index: int) -> float | None:
+        return self.times[index + 1] if index + 1 < len(self.times) else None
+
+
+def parse_lrc(text: str) -> Lyrics | None:
+    """
+    Parses LRC, lines may carry several timestamps (`[00:12.00][01:30.50]chorus`), an
+    `[offset:ms]` tag shifts every line and enhanced LRC word timings are dropped.
+    Returns None when the text has no timed lines.
+    """
+    offset = 0.0
+    entries: list[tuple[float, str]] = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if match := OFFSET.match(line):
+            offset = int(match.group(1)) / 1000
+            continue
+        stamps = []
+        pos = 0
+        while match := TIMESTAMP.match(line, pos):
+            stamps.append(int(match.group(1)) * 60 + float(match.group(2).replace(':', '.')))
+            pos = match.end()
+        if not stamps:
+            continue
+        content = WORD_TAG.sub('', line[pos:]).strip()
+        entries.extend((stamp, content) for stamp in stamps)
+    if not entries:
+        return None
+    entries.sort(key=lambda entry: entry[0])
+    # A positive offset shows the lyrics sooner
+    return Lyrics([max(stamp - offset, 0.0) for stamp, _ in entries], [content for _, content in entries])
+
+
+def track_identity(metadata: dict[str, Any]) -> tuple[str, str, int] | None:
+    """(artist, title, duration) used to look lyrics up, None if the track has no title."""
+    title = str(metadata.get('xesam:title') or '').strip()
+    if not title:
+        return None
+    artist = metadata.get('xesam:artist') or ''
+    if isinstance(artist, (list, tuple)):
+        artist = ', '.join(map(str, artist))
+    return str(artist).strip(), title, round(float(metadata.get('mpris:length') or 0))
+
+
+class LyricsResolver:
+    """
+    Finds synced lyrics for a track: `.lrc` files in the configured directories or next to
+    a local media file first, then an lrclib compatible endpoint (`GET /api/get`).
+
+    Remote results, misses included, are cached on disk keyed by artist, title and duration,
+    so a track only ever costs one request. Lookups block and run in a worker thread.
+    """
+
+    def __init__(self, paths: list[str] | None = None, endpoint: str | None = DEFAULT_ENDPOINT, cache_dir: str | None = None):
+        self.paths = [os.path.expanduser(p) for p in paths or []]
+        self.endpoint = endpoint.rstrip('/') if endpoint else None
+        self.cache_dir = cache_dir or get_cache_path('lyrics')
+
+    def configure(self, config):
+        self.paths = [os.path.expanduser(p) for p in config.lyrics_paths or []]
+        self.endpoint = config.lyrics_endpoint.rstrip('/') if config.lyrics_endpoint else None
+
+    async def resolve(self, metadata: dict[str, Any]) -> Lyrics | None:
+        return await asyncio.to_thread(self.lookup, metadata)
+
+    def lookup(self, metadata: dict[str, Any]) -> Lyrics | None:
+        identity = track_identity(metadata)
+        if identity is None:
+            return None
+        artist, title, duration = identity
+
+        text = self._local(artist, title, metadata.get('xesam:url'))
+        if text is not None:
+            metrics.inc('lyrics_lookups_total', source='local')
+            return parse_lrc(text)
+
+        key = hashlib.sha1(f'{artist}\0{title}\0{duration}'.encode('utf-8')).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f'{key}.json')
+        cached = self._read_cache(cache_path)
+        if cached is not None and (cached['synced'] is not None or time.time() - cached['fetched'] < MISS_TTL):
+            metrics.inc('lyrics_lookups_total', source='cache')
+            return parse_lrc(cached['synced']) if cached['synced'] else None
+
+        if not self.endpoint or requests is None:
+            return None
+        metrics.inc('lyrics_lookups_total', source='remote')
+        try:
+            synced = self._fetch(artist, title, metadata.get('xesam:album'), duration)
+        except Exception as e:
+            # Not cached, the next play of the track tries again
+            log.warning('Lyrics lookup failed for %s - %s: %s', artist, title, e)
+            return None
+        self._write_cache(cache_path, {'artist': artist, 'title': title, 'duration': duration, 'synced': synced, 'fetched': time.time()})
+        return parse_lrc(synced) if synced else None
+
+    def _local(self, artist: str, title: str, url: Any) -> str | None:
+        candidates = []
+        if isinstance(url, str) and url.startswith('file://'):
+            from urllib.parse import unquote
+            candidates.append(os.path.splitext(unquote(url[len('file://'):]))[0] + '.lrc')
+        names = [f'{artist} - {title}.lrc', f'{title}.lrc'] if artist else [f'{title}.lrc']
+        for directory in self.paths:
+            candidates.extend(os.path.join(directory, name.replace('/', '_')) for name in names)
+        for path in candidates:
+            try:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    return f.read()
+            except OSError:
+                continue
+        return None
+
+    def _fetch(self, artist: str, title: str, album: Any, duration: int) -> str | None:
+        params = {'artist_name': artist, 'track_name': title}
+        if album:
+            params['album_name'] = str(album)
+        if duration:
+            params['duration'] = duration
+        response = requests.get(f'{self.endpoint}/api/get', params=params, headers={'User-Agent': USER_AGENT}, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json().get('syncedLyrics') or None
+
+    def _read_cache(self, path: str) -> dict[str, Any] | None:
+        try:
+            with open(path, 'rb') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning('Ignoring unreadable lyrics cache entry %s: %s', path, e)
+            return None
+
+    def _write_cache(self, path: str, entry: dict[str, Any]):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning('Could not write lyrics cache entry %s: %s', path, e)
+
+
+class LyricSync:
+    """
+    Follows one player's position through its lyrics. Instead of polling, a single timer is
+    armed for the next line boundary from the position anchor (existing time + start time)
+    and re-armed whenever the anchor moves (seek, play, pause) or the track changes.
+    """
+
+    def __init__(self, player, resolver: LyricsResolver, callback: Callable[[dict[str, Any]], Coroutine[Any, Any, None]]):
+        self.player = player
+        self.resolver = resolver
+        self.callback = callback
+        self.identity: tuple[str, str, int] | None = None
+        self.lyrics: Lyrics | None = None
+        self.index: int | None = None
+        self.timer: asyncio.TimerHandle | None = None
+        self.lookup: asyncio.Task | None = None
+        self.pending: set[asyncio.Task] = set()
+
+    def position(self) -> float:
+        player = self.player
+        if player.status == 'Playing':
+            return player.existing_time + time.time() - player.media_start
+        return player.existing_time
+
+    def track_changed(self):
+        if not self.player.config.lyrics:
+            return
+        identity = track_identity(self.player.metadata)
+        if identity == self.identity:
+            self.reschedule()
+            return
+        self._cancel_timer()
+        if self.lookup:
+            self.lookup.cancel()
+            self.lookup = None
+        self.identity = identity
+        self.lyrics = None
+        self.index = None
+        if identity is None:
+            self._emit(-1)
+            return
+        self.lookup = asyncio.create_task(self._resolve(identity, self.player.metadata))
+
+    async def _resolve(self, identity: tuple[str, str, int], metadata: dict[str, Any]):
+        try:
+            lyrics = await self.resolver.resolve(metadata)
+        except Exception:
+            log.exception('[%s] Lyrics lookup failed', self.player.name)
+            lyrics = None
+        if identity != self.identity:
+            return
+        self.lookup = None
+        self.lyrics = lyrics
+        self.index = None
+        if lyrics is None:
+            log.debug('[%s] No synced lyrics for %s - %s', self.player.name, identity[0], identity[1])
+            self._emit(-1)
+            return
+        log.debug('[%s] Loaded %s lyric lines for %s - %s', self.player.name, len(lyrics), identity[0], identity[1])
+        self.reschedule()
+
+    def reschedule(self):
+        """Emits the line at the current position if it changed and arms the timer for the next one."""
+        self._cancel_timer()
+        if self.lyrics is None:
+            return
+        if self.player.status == 'Stopped':
+            self._emit(-1)
+            return
+        position = self.position()
+        index = self.lyrics.index_at(position)
+        if index != self.index:
+            self._emit(index)
+        if self.player.status != 'Playing':
+            return
+        next_time = self.lyrics.next_time(index)
+        if next_time is not None:
+            self.timer = asyncio.get_running_loop().call_later(max(next_time - position, 0.0) + BOUNDARY_EPSILON, self._on_boundary)
+
+    def _on_boundary(self):
+        self.timer = None
+        self.reschedule()
+
+    @property
+    def fields(self) -> dict[str, Any]:
+        """The `lyrics:` keys ON_LYRIC frames add to the player's metadata, for the current line."""
+        lyrics = self.lyrics
+        index = self.index if self.index is not None else -1
+        return {
+            'lyrics:line': lyrics.line(index) if lyrics else '',
+            'lyrics:index': index,
+            'lyrics:start': lyrics.start(index) if lyrics else 0.0,
+            'lyrics:next': lyrics.next_time(index) if lyrics else None,
+        }
+
+    def _emit(self, index: int):
+        if index == self.index:
+            return
+        self.index = index
+        fields = self.fields
+        self.player.lyric = fields['lyrics:line']
+        metadata = self.player.metadata.evolve(self.player.extra_properties, **fields)
+        metrics.inc('lyric_lines_emitted_total', player=self.player.name)
+        task = asyncio.create_task(self.callback(metadata))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    def _cancel_timer(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+    def cancel(self):
+        self._cancel_timer()
+        if self.lookup:
+            self.lookup.cancel()
+            self.lookup = None
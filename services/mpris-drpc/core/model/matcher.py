@@ -1,14 +1,16 @@
 import re
 import ast
+import time
+import logging
 import operator
 
 from core.model.config import Config
-from core.utils.module_kit import get_callable_by_id
+from core.model.metrics import metrics
+from core.utils.module_kit import get_callable_by_id, lazy_import
 
-try:
-    import regex as pcre_regex_engine
-except ImportError:
-    pcre_regex_engine = None
+pcre_regex_engine = lazy_import('regex')
+
+log = logging.getLogger(__name__)
 
 class Matcher:
     """
@@ -23,18 +25,23 @@ class Matcher:
         'xor': operator.xor
     }
 
-    def __init__(self, config: Config, rule_string: str):
+    def __init__(self, config: Config, rule_string: str, parsed: tuple[list[dict], list[str]] | None = None):
         """
-        Initializes the parser by parsing the rule string.
+        Initializes the parser by parsing the rule string, or from the result of `Matcher.parse`
+        when it was already parsed (e.g. loaded from the compile cache).
         """
-        self.clauses = []
-        self.operators = []
-        self._parse_rule(rule_string)
         self.config = config
-
-    def _parse_rule(self, rule_string: str):
+        self.rule = rule_string
+        self.parsed = parsed if parsed is not None else self.parse(rule_string)
+        clauses, self.operators = self.parsed
+        # Plugin references are resolved here, the parsed form itself only holds plain data
+        self.clauses = [{**clause, "custom_func_callable": get_callable_by_id(clause['method'], config.plugin_paths) if '.' in clause['method'] else None} for clause in clauses]
+
+    @classmethod
+    def parse(cls, rule_string: str) -> tuple[list[dict], list[str]]:
         """
-        Parses the entire rule string into clauses and operators.
+        Parses the entire rule string into clauses and operators. Regex patterns are
+        validated and compiled here, once, rather than on every evaluation.
         """
         if not rule_string.startswith("||") or not rule_string.endswith("||"):
             raise ValueError("Rule string must start and end with '||'.")
@@ -47,12 +54,13 @@ class Matcher:
             
         clause_parts = parts[::2]
         operator_parts = parts[1::2]
-        self.operators = [op.lower() for op in operator_parts]
+        operators = [op.lower() for op in operator_parts]
 
-        for op in self.operators:
-            if op not in self.OPERATOR_MAP:
+        for op in operators:
+            if op not in cls.OPERATOR_MAP:
                 raise ValueError(f"Invalid logical operator: '{op}'. Must be 'and', 'or', or 'xor'.")
 
+        clauses = []
         for clause_str in clause_parts:
             dict_key, fn_call = clause_str.split('<->')
             fn_call = fn_call.strip()
@@ -60,13 +68,25 @@ class Matcher:
             dict_key = dict_key.replace('not', '').strip()
             method_name, *args = parse_function_call(fn_call)
 
-            self.clauses.append({
+            clauses.append({
                 "negated": bool(is_negated),
                 "key": dict_key,
                 "method": method_name,
                 "args": tuple(args),
-                "custom_func_callable": get_callable_by_id(method_name, self.config.plugin_paths) if '.' in method_name else None
+                "regex": _compile_regexpr(dict_key, *args) if method_name == 'regexpr' else None,
             })
+        return clauses, operators
+
+    @staticmethod
+    def report_invalid(parsed: tuple[list[dict], list[str]]):
+        """
+        Logs the invalid `regexpr` clauses of a rule parsed earlier (loaded from the compile
+        cache), which would otherwise never match without a word, as `parse` does.
+        """
+        clauses, _ = parsed
+        for clause in clauses:
+            if clause['method'] == 'regexpr' and clause['regex'] is None:
+                _compile_regexpr(clause['key'], *clause['args'])
 
     def _evaluate_clause(self, clause: dict, data_dict: dict) -> bool:
         key = clause['key']
@@ -78,40 +98,14 @@ class Matcher:
         result = False
         try:
             if method_name == 'regexpr':
-                pos_args, kwargs = clause['args']
-
-                # 1. Validate arguments
-                if len(pos_args) != 1 or not isinstance(pos_args[0], str):
-                    print(f"Warning: regexpr for key '{key}' requires one string argument for the pattern.")
-                    return False
-                if not set(kwargs.keys()).issubset({'flags'}):
-                    print(f"Warning: regexpr for key '{key}' only supports the 'flags' keyword argument.")
-                    return False
-
-                pattern = pos_args[0]
-                
-                # 2. Process flags from kwargs
-                re_flags = 0
-                if 'flags' in kwargs:
-                    flag_names = kwargs['flags']
-                    if isinstance(flag_names, list):
-                        for flag_name in flag_names:
-                            flag_value = getattr(re, flag_name, None)
-                            if isinstance(flag_value, re.Flag):
-                                re_flags |= flag_value
-                            else:
-                                print(f"Warning: Unknown regex flag '{flag_name}' for key '{key}'. Ignoring.")
-                    else:
-                        print(f"Warning: 'flags' argument for key '{key}' must be a list. Ignoring.")
-
-                # 3. Perform search with the combined flags
-                if re.search(pattern, str(value), re_flags):
+                # None when the arguments were invalid, reported when the rule was parsed
+                if clause['regex'] is not None and clause['regex'].search(str(value)):
                     result = True
 
             elif method_name == 'pcre':
                 pos_args, kwargs = clause['args']
                 if kwargs or len(pos_args) != 1 or not isinstance(pos_args[0], str):
-                    print(f"Warning: pcre for key '{key}' requires one string argument and no keyword arguments.")
+                    log.warning("pcre for key '%s' requires one string argument and no keyword arguments.", key)
                     return False
                 pattern = pos_args[0]
                 if pcre_regex_engine is None:
@@ -137,7 +131,7 @@ class Matcher:
         except (TypeError, ValueError) as e:
             if "pip install regex" in str(e):
                 raise e
-            print(f"Warning: Could not execute method '{method_name}' for key '{key}'. Reason: {e}")
+            log.warning("Could not execute method '%s' for key '%s'. Reason: %s", method_name, key, e)
             return False
 
         if clause['negated']:
@@ -146,7 +140,14 @@ class Matcher:
 
 
     def evaluate(self, data_dict: dict) -> bool:
-        # This method remains unchanged
+        start = time.perf_counter()
+        result = self._evaluate(data_dict)
+        metrics.observe('rule_evaluation_seconds', time.perf_counter() - start, rule=self.rule)
+        if result:
+            metrics.inc('rule_hits_total', rule=self.rule)
+        return result
+
+    def _evaluate(self, data_dict: dict) -> bool:
         if not self.clauses:
             return True
         final_result = self._evaluate_clause(self.clauses[0], data_dict)
@@ -157,10 +158,44 @@ class Matcher:
         return final_result
 
 
+def _compile_regexpr(key: str, pos_args: tuple, kwargs: dict) -> re.Pattern | None:
+    """Validates the arguments of a `regexpr` clause and compiles its pattern with the combined flags."""
+    # 1. Validate arguments
+    if len(pos_args) != 1 or not isinstance(pos_args[0], str):
+        log.warning("regexpr for key '%s' requires one string argument for the pattern.", key)
+        return None
+    if not set(kwargs.keys()).issubset({'flags'}):
+        log.warning("regexpr for key '%s' only supports the 'flags' keyword argument.", key)
+        return None
+
+    # 2. Process flags from kwargs
+    re_flags = 0
+    if 'flags' in kwargs:
+        flag_names = kwargs['flags']
+        if isinstance(flag_names, list):
+            for flag_name in flag_names:
+                flag_value = getattr(re, flag_name, None)
+                if isinstance(flag_value, re.RegexFlag):
+                    re_flags |= flag_value
+                else:
+                    log.warning("Unknown regex flag '%s' for key '%s'. Ignoring.", flag_name, key)
+        else:
+            log.warning("'flags' argument for key '%s' must be a list. Ignoring.", key)
+
+    try:
+        return re.compile(pos_args[0], re_flags)
+    except re.error as e:
+        log.warning("Invalid pattern for regexpr on key '%s': %s", key, e)
+        return None
+
+
 class AlwaysTrue:
+    rule = 'always'
+
     def __init__(self):
         pass
     def evaluate(self, something):
+        metrics.inc('rule_hits_total', rule=self.rule)
         return True
 
 
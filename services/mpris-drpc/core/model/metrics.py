@@ -0,0 +1,198 @@
+import os
+import time
+import bisect
+import asyncio
+import logging
+import threading
+from typing import Any, Callable
+
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in seconds, roughly x2.5 apart from 50us to 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_CHECK_INTERVAL = 0.5
+
+LABELS = tuple[tuple[str, str], ...]
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Fixed bucket latency histogram, cumulative buckets are only computed when exported."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def copy(self) -> 'Histogram':
+        histogram = Histogram(self.buckets)
+        histogram.counts = self.counts.copy()
+        histogram.count, histogram.sum, histogram.max = self.count, self.sum, self.max
+        return histogram
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the q-th quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def to_dict(self) -> dict[str, float]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class Metrics:
+    """
+    Process wide counters, gauges and histograms, exported as JSON (socket `stats` command)
+    or in the Prometheus text format.
+
+    Series are keyed by name and a tuple of label pairs, gauges are callbacks evaluated at
+    export time so sampling costs nothing on the hot path.
+
+    The plugin thread, the history writer and lyrics lookups record from outside the event
+    loop, so updates and the copy exports are rendered from are taken under `lock`.
+    """
+
+    def __init__(self):
+        self.counters: dict[str, dict[LABELS, float]] = {}
+        self.histograms: dict[str, dict[LABELS, Histogram]] = {}
+        self.gauges: dict[str, Callable[[], dict[LABELS, float]]] = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = tuple(labels.items())
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = tuple(labels.items())
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def _snapshot(self) -> tuple[dict[str, list[tuple[LABELS, float]]], dict[str, list[tuple[LABELS, Histogram]]]]:
+        """Copies of the counters and histograms to export, taken under the lock."""
+        with self.lock:
+            counters = {name: list(series.items()) for name, series in self.counters.items()}
+            histograms = {name: [(labels, histogram.copy()) for labels, histogram in series.items()] for name, series in self.histograms.items()}
+        return counters, histograms
+
+    def register_gauge(self, name: str, callback: Callable[[], dict[LABELS, float]]):
+        self.gauges[name] = callback
+
+    def to_dict(self) -> dict[str, Any]:
+        def series_list(series, render):
+            return [{**dict(labels), 'value': render(value)} for labels, value in series]
+
+        counters, histograms = self._snapshot()
+        return {
+            'uptime': time.time() - self.started,
+            'counters': {name: series_list(series, lambda v: v) for name, series in counters.items()},
+            'gauges': {name: series_list(callback().items(), lambda v: v) for name, callback in list(self.gauges.items())},
+            'histograms': {name: series_list(series, Histogram.to_dict) for name, series in histograms.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        def fmt_labels(labels: LABELS, extra: LABELS = ()) -> str:
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in pairs) + '}'
+
+        counters, histograms = self._snapshot()
+        lines = []
+        for name, series in counters.items():
+            lines.append(f'# TYPE mpris_{name} counter')
+            lines.extend(f'mpris_{name}{fmt_labels(labels)} {value}' for labels, value in series)
+        for name, callback in list(self.gauges.items()):
+            lines.append(f'# TYPE mpris_{name} gauge')
+            lines.extend(f'mpris_{name}{fmt_labels(labels)} {value}' for labels, value in callback().items())
+        for name, series in histograms.items():
+            lines.append(f'# TYPE mpris_{name} histogram')
+            for labels, histogram in series:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'mpris_{name}_bucket{fmt_labels(labels, (("le", str(bound)),))} {cumulative}')
+                lines.append(f'mpris_{name}_bucket{fmt_labels(labels, (("le", "+Inf"),))} {histogram.count}')
+                lines.append(f'mpris_{name}_sum{fmt_labels(labels)} {histogram.sum}')
+                lines.append(f'mpris_{name}_count{fmt_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+async def monitor_event_loop(interval: float = LAG_CHECK_INTERVAL):
+    """Measures how late the event loop wakes up a sleeping task, i.e. how long callbacks block it."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        metrics.observe('event_loop_lag_seconds', max(0.0, loop.time() - expected))
+
+
+class PrometheusServer:
+    """Serves `Metrics.to_prometheus` over HTTP on a local Unix socket."""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.server: asyncio.Server | None = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # Only GET is served, the request itself (path, headers) is irrelevant
+            await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=5)
+            body = metrics.to_prometheus().encode('utf-8')
+            writer.write(
+                b'HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._handle, self.socket_path)
+        log.info('Prometheus metrics endpoint listening at %s', self.socket_path)
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
@@ -6,24 +6,31 @@ from dbus_next import Variant
 from typing import Literal, Callable, Any
 from dbus_next.aio.proxy_object import ProxyObject
 
-from core.constants import log_level
 from core.model.config import Config
-from core.metadata_parser import metadata_process
+from core.model.metrics import metrics
+from core.model.tracing import tracer
+from core.model.journal import recorder, PROPERTIES, SEEKED, POSITION
+from core.model.state import fingerprint, FINGERPRINT_KEYS
+from core.model.lyrics import LyricSync
+from core.model.history import HistoryStore
+from core.model.snapshot import Metadata, EMPTY
+from core.metadata_parser import metadata_process_async, pipeline_digest
+from core.utils.art_kit import art_pinned
 
 CALLBACK_TYPE = Callable[[dict[str, Any], Any], Coroutine[Any, Any, None]] | None
 
 log = logging.getLogger(__name__)
-log.setLevel(log_level)
 
 class Player:
     def __init__(self, config: Config, player_name: str, player_dbus_proxy: ProxyObject, event_callback: CALLBACK_TYPE, seek_callback: CALLBACK_TYPE, metadata_callback: CALLBACK_TYPE, status_callback: CALLBACK_TYPE):
         self.interface = player_dbus_proxy
+        self.player_interface = player_dbus_proxy.get_interface('org.mpris.MediaPlayer2.Player')
         self.name = player_name
         self.active = True
         self.last_active = 0
         self.media_start = 0
         self.existing_time = 0
-        self.metadata: dict[str, str | int] = {}
+        self.metadata: Metadata = EMPTY
         self.status: Literal['Playing', 'Paused', 'Stopped'] = 'Stopped'
         self.lyric = ""
         self.event_callback: CALLBACK_TYPE = event_callback
@@ -33,11 +40,25 @@ class Player:
         self.config: Config = config
         self.metadata_lock = asyncio.Lock()
         self.last_raw_metadata = {}
+        self.raw_fingerprint: str | None = None
+        # `pipeline_digest` of the ruleset and plugins `metadata` was processed with
+        self.pipeline: str | None = None
+        # Entry restored from the state snapshot, consumed by the first metadata signal
+        self.warm_entry: dict[str, Any] | None = None
+        # Set by the listener, follows the position through the track's synced lyrics
+        self.lyric_sync: LyricSync | None = None
+        # Set by the listener when the play history is enabled, also caches processed metadata
+        self.history: HistoryStore | None = None
     
     @property
     def extra_properties(self):
         return {'tracking:startTime': self.media_start, 'tracking:existingTime': self.existing_time, 'tracking:status': self.status}
 
+    @property
+    def published_metadata(self) -> Metadata:
+        """The processed metadata with the tracking fields as an overlay, the snapshot itself is shared."""
+        return self.metadata.evolve(self.extra_properties)
+
     def _pause(self):
         if self.status == 'Paused':
             return
@@ -63,15 +84,17 @@ class Player:
         self.active = False
         self.last_active = cur
         self.existing_time = 0
-        self.metadata: dict[str, str | int] = {}
+        self.metadata = EMPTY
 
     async def on_seek(self, position_usec: int):
-        interface = self.interface.get_interface('org.mpris.MediaPlayer2.Player')
-        position = float(await interface.get_position()) / 1_000_000
+        raw_position = await self.player_interface.get_position()
+        recorder.record(self.name, POSITION, raw_position)
+        position = float(raw_position) / 1_000_000
         self.existing_time = position
         self.media_start = time.time()
-        metadata = self.metadata.copy()
-        metadata.update(self.extra_properties)
+        if self.lyric_sync:
+            self.lyric_sync.reschedule()
+        metadata = self.published_metadata
         if self.seek_callback:
             await self.seek_callback(metadata)
         if self.event_callback:
@@ -79,54 +102,114 @@ class Player:
 
     async def set_metadata(self, metadata: dict[str, Variant]):
         async with self.metadata_lock:
-            metadata = {k: v.value for k, v in metadata.items()}
-            if 'mpris:length' in metadata: metadata['mpris:length'] /= 1_000_000
-            keys_to_compare = ['xesam:title', 'xesam:url', 'mpris:artUrl', 'xesam:artist']
-            if all([metadata.get(key, '1') == self.last_raw_metadata.get(key, '2') for key in keys_to_compare]):
-                log.debug(f"[{self.name}] Redundant metadata signal received. Skipping processing.")
-                if metadata.get('mpris:length', 1) != self.last_raw_metadata.get('mpris:length', 1):
-                    self.metadata['mpris:length'] = metadata['mpris:length']
-                    if self.metadata_callback:
-                        await self.metadata_callback(self.metadata)
-                    if self.event_callback:
-                        await self.event_callback(self.metadata)
+            with tracer.span('set_metadata', player=self.name) as span:
+                await self._set_metadata(metadata, span)
+
+    async def _set_metadata(self, metadata: dict[str, Variant], span):
+        metadata = {k: v.value for k, v in metadata.items()}
+        if 'mpris:length' in metadata: metadata['mpris:length'] /= 1_000_000
+        if self.last_raw_metadata and all(metadata.get(key) == self.last_raw_metadata.get(key) for key in FINGERPRINT_KEYS):
+            metrics.inc('signals_coalesced_total', player=self.name)
+            span.set(coalesced=True)
+            log.debug("[%s] Redundant metadata signal received. Skipping processing.", self.name)
+            if metadata.get('mpris:length', 1) != self.last_raw_metadata.get('mpris:length', 1):
+                self.metadata = self.metadata.evolve({'mpris:length': metadata['mpris:length']})
+                metadata = self.published_metadata
+                if self.metadata_callback:
+                    await self.metadata_callback(metadata)
+                if self.event_callback:
+                    await self.event_callback(metadata)
+            return
+        self.last_raw_metadata = metadata.copy()
+        self.raw_fingerprint = fingerprint(metadata)
+        if self.warm_entry is not None:
+            warm, self.warm_entry = self.warm_entry, None
+            if warm['fingerprint'] == self.raw_fingerprint and warm.get('pipeline') == pipeline_digest(self.config) and art_pinned(warm['metadata']):
+                # Same track as before the restart, processed by the same ruleset and plugins, its art still there
+                metrics.inc('warm_restart_hits_total', player=self.name)
+                span.set(warm=True)
+                await self._publish_metadata(warm['metadata'], warm['pipeline'])
                 return
-            self.last_raw_metadata = metadata.copy()
-            metadata = metadata_process(self.config, metadata)
-            self.metadata = metadata.copy()
-            metadata.update(self.extra_properties)
-            if self.metadata_callback:
-                await self.metadata_callback(metadata)
-            if self.event_callback:
-                await self.event_callback(metadata)
+        if self.history is not None:
+            pipeline = pipeline_digest(self.config)
+            cached = await self.history.cached_metadata(self.raw_fingerprint, pipeline)
+            if cached is not None:
+                # Heard before under the same ruleset and plugins, they would compute the same
+                metrics.inc('history_cache_hits_total', player=self.name)
+                span.set(history=True)
+                await self._publish_metadata(cached, pipeline)
+                return
+        await self._process_metadata(metadata)
+
+    async def _process_metadata(self, metadata: dict[str, Any]):
+        pipeline = pipeline_digest(self.config)
+        processed = await metadata_process_async(self.config, metadata)
+        if self.history is not None and self.raw_fingerprint:
+            self.history.remember(self.raw_fingerprint, processed, pipeline)
+        await self._publish_metadata(processed, pipeline)
+
+    async def _publish_metadata(self, metadata: Metadata | dict[str, Any], pipeline: str | None):
+        self.metadata = Metadata.of(metadata)
+        self.pipeline = pipeline
+        if self.lyric_sync:
+            self.lyric_sync.track_changed()
+        metadata = self.published_metadata
+        if self.metadata_callback:
+            await self.metadata_callback(metadata)
+        if self.event_callback:
+            await self.event_callback(metadata)
+
+    async def reprocess(self):
+        """Runs the last raw metadata through the (reloaded) ruleset again and publishes the result."""
+        async with self.metadata_lock:
+            if not self.last_raw_metadata:
+                return
+            log.debug("[%s] Reprocessing metadata after ruleset reload.", self.name)
+            await self._process_metadata(self.last_raw_metadata)
 
     async def update_status(self, status: Literal['Playing', 'Paused', 'Stopped']):
+        with tracer.span('update_status', player=self.name, status=status):
+            await self._update_status(status)
+
+    async def _update_status(self, status: Literal['Playing', 'Paused', 'Stopped']):
         match status:
             case 'Playing': self._play()
             case 'Paused': self._pause()
             case 'Stopped': self._stop()
             case _: raise ValueError('Unexpected Status')
-        metadata = self.metadata.copy()
-        metadata.update(self.extra_properties)
+        if self.lyric_sync:
+            self.lyric_sync.reschedule()
+        metadata = self.published_metadata
         if self.status_callback:
             await self.status_callback(metadata)
         if self.event_callback:
             await self.event_callback(metadata)
 
+    async def on_seeked(self, position_usec: int):
+        metrics.inc('signals_received_total', player=self.name, signal='Seeked')
+        recorder.record(self.name, SEEKED, position_usec)
+        with tracer.trace('Seeked', player=self.name):
+            await self.on_seek(position_usec)
+
     async def on_update(self, interface_name, changed_properties: dict[str, Variant | Any], invalidated_properties):
+        metrics.inc('signals_received_total', player=self.name, signal='PropertiesChanged')
+        recorder.record(self.name, PROPERTIES, changed_properties)
+        with tracer.trace('PropertiesChanged', player=self.name, properties=list(changed_properties)):
+            await self._on_update(changed_properties)
+
+    async def _on_update(self, changed_properties: dict[str, Variant | Any]):
         changed_properties = {k: (v.value if isinstance(v, Variant) else v) for k, v in changed_properties.items()}
         if 'PlaybackStatus' in changed_properties:
             status = changed_properties['PlaybackStatus']
             await self.update_status(status)
         if 'Metadata' in changed_properties:
-            log.debug(f"[{self.name}] Metadata updated.")
+            log.debug("[%s] Metadata updated.", self.name)
             await self.set_metadata(changed_properties['Metadata'])
             await self.on_seek(1)
 
     async def force_update(self):
-        interface = self.interface.get_interface('org.mpris.MediaPlayer2.Player')
-        metadata = await interface.get_metadata()
-        status = await interface.get_playback_status()
+        metadata = await self.player_interface.get_metadata()
+        status = await self.player_interface.get_playback_status()
         metadata_dict = {'Metadata': metadata, 'PlaybackStatus': status}
         await self.on_update({}, metadata_dict, {})
         await self.on_seek(1)
\ No newline at end of file
@@ -0,0 +1,170 @@
+import json
+import time
+import logging
+import statistics
+from typing import Any, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from dbus_next import Variant
+
+from core.model.config import Config
+from core.model.journal import decode, PROPERTIES
+from core.model.matcher import Matcher, AlwaysTrue
+
+log = logging.getLogger(__name__)
+
+# Records sent to a worker process at once
+CHUNK_SIZE = 2000
+
+
+def normalize(metadata: dict[str, Any]) -> dict[str, Any]:
+    """Raw metadata as `Player` hands it to the rule engine: variants unwrapped, length in seconds."""
+    metadata = {k: v.value if isinstance(v, Variant) else v for k, v in metadata.items()}
+    if isinstance(metadata.get('mpris:length'), int):
+        metadata['mpris:length'] /= 1_000_000
+    return metadata
+
+
+def read_corpus(path: str) -> Iterator[dict[str, Any]]:
+    """
+    Yields raw metadata dicts from a JSONL corpus. Lines may be metadata objects, objects
+    carrying them under `metadata`, or signal journal records (their `Metadata` changes).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                log.warning('%s:%s: skipping malformed line (%s)', path, number, e)
+                continue
+            if isinstance(record, list) and len(record) == 4:
+                _, _, kind, payload = record
+                payload = decode(payload)
+                if kind == PROPERTIES and isinstance(payload.get('Metadata'), Variant):
+                    yield normalize(payload['Metadata'].value)
+            elif isinstance(record, dict):
+                metadata = record['metadata'] if isinstance(record.get('metadata'), dict) else record
+                yield normalize(decode(metadata))
+
+
+def build_matchers(config: Config) -> list[tuple[str, Matcher | AlwaysTrue]]:
+    return [(rule, Matcher(config, rule) if rule != 'always' else AlwaysTrue()) for rule in config.metadata_ruleset]
+
+
+_worker_matchers: list[tuple[str, Matcher | AlwaysTrue]] = []
+
+
+def _init_worker():
+    global _worker_matchers
+    _worker_matchers = build_matchers(Config.from_config())
+
+
+def evaluate(matchers: list[tuple[str, Matcher | AlwaysTrue]], records: list[dict[str, Any]]) -> tuple[list[int], list[int], list[int]]:
+    """
+    Evaluates every matcher against every record, bypassing the metrics the server records.
+
+    Returns:
+        Per rule match counts and nanoseconds spent, and the nanoseconds all rules took per record.
+    """
+    matches = [0] * len(matchers)
+    costs = [0] * len(matchers)
+    per_record = []
+    clock = time.perf_counter_ns
+    for metadata in records:
+        total = 0
+        for i, (_, matcher) in enumerate(matchers):
+            start = clock()
+            matched = matcher._evaluate(metadata) if isinstance(matcher, Matcher) else True
+            elapsed = clock() - start
+            costs[i] += elapsed
+            total += elapsed
+            if matched:
+                matches[i] += 1
+        per_record.append(total)
+    return matches, costs, per_record
+
+
+def _evaluate_chunk(records: list[dict[str, Any]]) -> tuple[list[int], list[int], list[int]]:
+    return evaluate(_worker_matchers, records)
+
+
+def _chunks(records: Iterator[dict[str, Any]]) -> Iterator[list[dict[str, Any]]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bench(config: Config, corpus_path: str, processes: int = 1) -> dict[str, Any]:
+    """Runs the ruleset of `config` over the corpus, in `processes` worker processes when more than one."""
+    rules = list(config.metadata_ruleset)
+    matches = [0] * len(rules)
+    costs = [0] * len(rules)
+    per_record: list[int] = []
+    start = time.perf_counter()
+    if processes > 1:
+        # Workers load the config themselves, compiled matchers hold plugin callables
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+            results = pool.map(_evaluate_chunk, _chunks(read_corpus(corpus_path)))
+            for chunk_matches, chunk_costs, chunk_records in results:
+                matches = [a + b for a, b in zip(matches, chunk_matches)]
+                costs = [a + b for a, b in zip(costs, chunk_costs)]
+                per_record.extend(chunk_records)
+    else:
+        matchers = build_matchers(config)
+        for chunk in _chunks(read_corpus(corpus_path)):
+            chunk_matches, chunk_costs, chunk_records = evaluate(matchers, chunk)
+            matches = [a + b for a, b in zip(matches, chunk_matches)]
+            costs = [a + b for a, b in zip(costs, chunk_costs)]
+            per_record.extend(chunk_records)
+    wall = time.perf_counter() - start
+
+    records = len(per_record)
+    report_rules = [{
+        'rule': rule,
+        'handler': config.metadata_ruleset[rule],
+        'matches': matches[i],
+        'match_ratio': matches[i] / records if records else 0.0,
+        'total_ms': costs[i] / 1e6,
+        'mean_us': costs[i] / records / 1e3 if records else 0.0,
+    } for i, rule in enumerate(rules)]
+    per_record.sort()
+    return {
+        'records': records,
+        'processes': processes,
+        'wall_seconds': wall,
+        'per_record_us': {
+            'mean': statistics.fmean(per_record) / 1e3 if records else 0.0,
+            'p50': per_record[records // 2] / 1e3 if records else 0.0,
+            'p99': per_record[min(records - 1, int(records * 0.99))] / 1e3 if records else 0.0,
+            'max': per_record[-1] / 1e3 if records else 0.0,
+        },
+        'rules': report_rules,
+        'dead': [r['rule'] for r in report_rules if records and r['matches'] == 0],
+        # `always` is meant to match everything, only matchers that do are worth reporting
+        'always_true': [r['rule'] for r in report_rules if records and r['matches'] == records and r['rule'] != 'always'],
+    }
+
+
+def format_report(report: dict[str, Any]) -> str:
+    records = report['records']
+    timing = report['per_record_us']
+    lines = [
+        f"{records} records, {report['processes']} process(es), {report['wall_seconds']:.2f}s",
+        f"rule engine per record: mean {timing['mean']:.1f}us, p50 {timing['p50']:.1f}us, p99 {timing['p99']:.1f}us, max {timing['max']:.1f}us",
+        '',
+        f"{'matches':>9} {'ratio':>7} {'total ms':>10} {'mean us':>9}  rule -> handler",
+    ]
+    for rule in sorted(report['rules'], key=lambda r: r['total_ms'], reverse=True):
+        lines.append(f"{rule['matches']:>9} {rule['match_ratio']:>7.1%} {rule['total_ms']:>10.2f} {rule['mean_us']:>9.2f}  {rule['rule']} -> {rule['handler']}")
+    if report['dead']:
+        lines.extend(['', 'dead rules (never matched):', *(f'  {rule}' for rule in report['dead'])])
+    if report['always_true']:
+        lines.extend(['', 'always true rules (matched every record):', *(f'  {rule}' for rule in report['always_true'])])
+    return '\n'.join(lines)
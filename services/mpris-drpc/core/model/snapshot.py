@@ -0,0 +1,203 @@
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Iterator
+
+# Layers a snapshot may stack before it is flattened, bounds the cost of a lookup
+MAX_DEPTH = 8
+_MISSING = object()
+# Marks a key removed by a layer
+_DELETED = object()
+
+
+class Metadata(Mapping[str, Any]):
+    """
+    Immutable metadata snapshot, what a player publishes once the plugins have run.
+
+    A derived snapshot (`evolve`, a frozen `copy()`) only stores the keys that changed
+    on top of the snapshot it came from, so the tracking fields of a seek or status
+    change cost a small dict instead of a copy of the whole metadata.
+    Lookups walk at most `MAX_DEPTH` layers; iteration works on a flattened dict that is
+    built once per snapshot and shared by every reader.
+    """
+    __slots__ = ('_layer', '_parent', '_depth', '_flat', '_piped')
+
+    def __init__(self, data: Mapping[str, Any] | None = None, /):
+        self._layer = dict(data) if data else {}
+        self._parent: Metadata | None = None
+        self._depth = 0
+        self._flat: dict[str, Any] | None = self._layer
+        self._piped: dict[str, Any] | None = None
+
+    @classmethod
+    def of(cls, data: Mapping[str, Any]) -> 'Metadata':
+        """`data` as a snapshot: snapshots are returned as is, drafts are frozen, anything else is copied once."""
+        if isinstance(data, Metadata):
+            return data
+        if isinstance(data, MetadataDraft):
+            return data.freeze()
+        return cls(data)
+
+    @classmethod
+    def _derive(cls, parent: 'Metadata', changes: dict[str, Any]) -> 'Metadata':
+        if not changes:
+            return parent
+        if parent._depth >= MAX_DEPTH:
+            flat = parent._flatten().copy()
+            for key, value in changes.items():
+                if value is _DELETED:
+                    flat.pop(key, None)
+                else:
+                    flat[key] = value
+            return cls(flat)
+        snapshot = object.__new__(cls)
+        snapshot._layer = changes
+        snapshot._parent = parent
+        snapshot._depth = parent._depth + 1
+        snapshot._flat = None
+        snapshot._piped = None
+        return snapshot
+
+    def evolve(self, changes: Mapping[str, Any] | None = None, /, **kwargs) -> 'Metadata':
+        """A snapshot with `changes` applied, sharing everything else with this one."""
+        layer = dict(changes) if changes else {}
+        layer.update(kwargs)
+        return Metadata._derive(self, layer)
+
+    def without(self, *keys: str) -> 'Metadata':
+        return Metadata._derive(self, {key: _DELETED for key in keys if key in self})
+
+    def copy(self) -> 'MetadataDraft':
+        """A mutable copy on write view over this snapshot."""
+        return MetadataDraft(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        return self._flatten().copy()
+
+    def _lookup(self, key: str) -> Any:
+        node = self
+        while node is not None:
+            value = node._layer.get(key, _MISSING)
+            if value is not _MISSING:
+                return _MISSING if value is _DELETED else value
+            node = node._parent
+        return _MISSING
+
+    def _flatten(self) -> dict[str, Any]:
+        if self._flat is None:
+            layers = []
+            node = self
+            while node._flat is None:
+                layers.append(node._layer)
+                node = node._parent
+            flat = node._flat.copy()
+            for layer in reversed(layers):
+                for key, value in layer.items():
+                    if value is _DELETED:
+                        flat.pop(key, None)
+                    else:
+                        flat[key] = value
+            self._flat = flat
+        return self._flat
+
+    @property
+    def piped(self) -> dict[str, Any]:
+        """The metadata keyed `namespace|name` as clients see it, built once per snapshot. Do not modify."""
+        if self._piped is None:
+            if self._flat is None:
+                # Built from the parent's flattened dict (kept by the player's snapshot for
+                # every later overlay) and this layer, without flattening this one as well
+                piped = {key.replace(':', '|'): value for key, value in self._parent._flatten().items()}
+                for key, value in self._layer.items():
+                    if value is _DELETED:
+                        piped.pop(key.replace(':', '|'), None)
+                    else:
+                        piped[key.replace(':', '|')] = value
+            else:
+                piped = {key.replace(':', '|'): value for key, value in self._flat.items()}
+            self._piped = piped
+        return self._piped
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key: object) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._flatten())
+
+    def __len__(self) -> int:
+        return len(self._flatten())
+
+    def __repr__(self) -> str:
+        return f'Metadata({self._flatten()!r})'
+
+    def __reduce__(self):
+        return Metadata, (self._flatten(),)
+
+
+class MetadataDraft(MutableMapping[str, Any]):
+    """
+    Copy on write view over a `Metadata` snapshot: assignments and deletions are recorded
+    on top of it and `freeze` turns them into a derived snapshot, the base is never copied.
+    """
+    __slots__ = ('_base', '_changes')
+
+    def __init__(self, base: Metadata, changes: dict[str, Any] | None = None):
+        self._base = base
+        self._changes: dict[str, Any] = changes if changes is not None else {}
+
+    def freeze(self) -> Metadata:
+        return Metadata._derive(self._base, self._changes.copy())
+
+    def copy(self) -> 'MetadataDraft':
+        return MetadataDraft(self._base, self._changes.copy())
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._changes.get(key, _MISSING)
+        if value is _MISSING:
+            return self._base[key]
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        value = self._changes.get(key, _MISSING)
+        if value is _MISSING:
+            return key in self._base
+        return value is not _DELETED
+
+    def __setitem__(self, key: str, value: Any):
+        self._changes[key] = value
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        if key in self._base:
+            self._changes[key] = _DELETED
+        else:
+            del self._changes[key]
+
+    def __iter__(self) -> Iterator[str]:
+        changes = self._changes
+        for key in self._base:
+            if changes.get(key, _MISSING) is not _DELETED:
+                yield key
+        for key, value in changes.items():
+            if value is not _DELETED and key not in self._base:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'MetadataDraft({dict(self)!r})'
+
+
+EMPTY = Metadata()
@@ -1,37 +1,69 @@
 import os
-import json
+import time
 import struct
 import logging
 import asyncio
-from typing import Literal, Any
-from collections import defaultdict
+from typing import Literal, Any, Callable, Awaitable
 
-from core.constants import log_level
+from core.model.metrics import metrics
+from core.model.tracing import tracer
+from core.model.snapshot import Metadata, EMPTY
+from core.utils.backend_kit import dumpb, dumps, loads
 
 SOCKET_PATH = '/tmp/mpris.sock'
 log = logging.getLogger(__name__)
-log.setLevel(log_level)
 
 HEADER_SIZE = 4
 HEADER_FORMAT = '!I'
-INTERVAL = Literal['ON_METADATA', 'ON_STATUS', 'ON_SEEK', 'ON_EVENT']
+INTERVAL = Literal['ON_METADATA', 'ON_STATUS', 'ON_SEEK', 'ON_EVENT', 'ON_LYRIC']
 REQUIRED_PARAMS = ['name', 'interval', 'format_type', 'format']
-ALLOWED_PARAMS = ['name', 'interval', 'format_type', 'format']
-VALID_INTERVALS = ('ON_METADATA', 'ON_STATUS', 'ON_SEEK', 'ON_EVENT', 'ON_PLAYER')
+# A `subscriptions` list ([{interval, format_type, format}, ...]) replaces the last three
+REQUIRED_SUBSCRIPTION_PARAMS = ['name', 'subscriptions']
+ALLOWED_PARAMS = ['name', 'interval', 'format_type', 'format', 'player', 'subscriptions']
+VALID_INTERVALS = ('ON_METADATA', 'ON_STATUS', 'ON_SEEK', 'ON_EVENT', 'ON_PLAYER', 'ON_LYRIC')
+# Values of the `player` param besides a player name, '@' never appears in a bus name
+ACTIVE_PLAYER = '@active'
+ALL_PLAYERS = '@all'
+COMMAND_HANDLER = Callable[['Client | None', dict[str, Any]], Awaitable[dict[str, Any] | None]]
+# Commands changing the subscriptions of the connection they arrive on, the control socket has none
+CONNECTION_COMMANDS = ('subscribe', 'unsubscribe')
+# Called with (player, metadata) whenever a player publishes, player None: the active player view changed
+SINK = Callable[[str | None, dict[str, Any]], None]
 
-class Client():
-    name: str
+
+def parse_command(command: str) -> dict[str, Any]:
+    """
+    Commands are either a JSON object with a `command` key, or plain text where the first
+    word is the command and the remaining words are passed as `args`.
+    """
+    if command.startswith('{'):
+        request = loads(command)
+        if not isinstance(request, dict) or 'command' not in request:
+            raise ValueError('JSON commands must be an object with a "command" key')
+        return request
+    name, *args = command.split()
+    return {'command': name, 'args': args}
+
+class _Placeholders:
+    """`str.format_map` values, keys the metadata lacks render as a placeholder (without copying it into a defaultdict)."""
+    __slots__ = ('values',)
+
+    def __init__(self, values: dict[str, Any]):
+        self.values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self.values.get(key, "(╯`Д´)╯︵ ┻━┻")
+
+class Subscription():
     interval: INTERVAL
     format: str | dict[str, str]
     format_type: Literal['str', 'json']
-    reader: asyncio.StreamReader
-    writer: asyncio.StreamWriter
-    listener = None
 
-    def __init__(self, name: str, interval: INTERVAL, output_format_type: Literal['str', 'json'], output_format: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        self.reader = reader
-        self.writer = writer
-        self.name = name
+    def __init__(self, interval: INTERVAL, output_format_type: Literal['str', 'json'], output_format: str):
+        if interval not in VALID_INTERVALS:
+            raise ValueError(f'Invalid Interval: {interval}')
+        if output_format_type not in ('str', 'json'):
+            raise ValueError(f'Invalid format_type: {output_format_type}')
         self.interval = interval
         if output_format != 'all':
             match output_format_type:
@@ -41,32 +73,94 @@ class Client():
             self.format = output_format
         self.format_type = output_format_type
 
-    def _parse_json_format(self, format_str: str):
-        format_dict = json.loads(format_str)
+    def _parse_json_format(self, format_str: str | dict[str, str]):
+        format_dict = loads(format_str) if isinstance(format_str, str) else format_str
         self.format = format_dict
 
     def _parse_str_format(self, format_str: str):
         self.format = format_str
 
-    def fill_format(self, metadata: dict[str, Any], **kwargs):
-        if kwargs: metadata = metadata.copy(); metadata.update(kwargs)
-        metadata = {k.replace(':', '|') : v for k , v in metadata.items()}
+    def render(self, metadata: Metadata) -> dict[str, Any] | str:
+        # Shared by every client and interval rendering this snapshot
+        metadata = metadata.piped
         if self.format == 'all':
-            return json.dumps(metadata)
+            return metadata
         elif self.format_type == 'json':
+            # Template values of the form `|xesam|title|` are replaced by that key's value
             ret = self.format.copy()
-            for k, v in metadata.items():
-                if f'|{k}|' in self.format.values():
-                    k = [k for k in self.format.keys() if self.format[k] == v][0]
-                    ret[k] = v
-
-            ret = json.dumps(ret)
+            for k, template in self.format.items():
+                if isinstance(template, str) and template[1:-1] in metadata and template.startswith('|') and template.endswith('|'):
+                    ret[k] = metadata[template[1:-1]]
         else:
-            metadata = defaultdict(lambda: "(╯`Д´)╯︵ ┻━┻", metadata)
-            ret = self.format.format_map(metadata)
-        
+            ret = self.format.format_map(_Placeholders(metadata))
+
         return ret
 
+class Client():
+    name: str
+    subscriptions: dict[INTERVAL, Subscription]
+    tagged: bool
+    player: str
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    listener = None
+
+    def __init__(self, name: str, subscriptions: list[Subscription], reader: asyncio.StreamReader, writer: asyncio.StreamWriter, player: str = ACTIVE_PLAYER, tagged: bool = False):
+        self.reader = reader
+        self.writer = writer
+        self.name = name
+        self.subscriptions = {subscription.interval: subscription for subscription in subscriptions}
+        # Clients subscribing through `subscriptions` get frames tagged with the interval
+        self.tagged = tagged
+        self.player = player
+        self.bytes_sent = 0
+        self.messages_sent = 0
+
+    @property
+    def intervals(self) -> list[INTERVAL]:
+        return list(self.subscriptions)
+
+    def _fill(self, metadata: Metadata, player: str | None, interval: INTERVAL | None, kwargs: dict[str, Any]) -> dict[str, Any] | str | None:
+        subscription = self.subscriptions.get(interval) if interval else next(iter(self.subscriptions.values()), None)
+        if subscription is None:
+            # Not (or no longer) subscribed to `interval`, nothing to send
+            return None
+        metadata = Metadata.of(metadata)
+        if kwargs: metadata = metadata.evolve(kwargs)
+        ret = subscription.render(metadata)
+        if self.tagged or self.player == ALL_PLAYERS:
+            frame = {}
+            if self.tagged:
+                frame['event'] = subscription.interval
+            # Multiplexed stream, every frame says which player it describes
+            if self.player == ALL_PLAYERS:
+                frame['player'] = player
+            frame['data'] = ret
+            return frame
+        return ret
+
+    def fill_format(self, metadata: Metadata, player: str | None = None, interval: INTERVAL | None = None, **kwargs) -> str | None:
+        """The frame for `interval` rendered as text, None when the client is not subscribed to it."""
+        ret = self._fill(metadata, player, interval, kwargs)
+        if ret is None:
+            return None
+        return ret if isinstance(ret, str) else dumps(ret)
+
+    def fill_frame(self, metadata: Metadata, player: str | None = None, interval: INTERVAL | None = None, **kwargs) -> bytes | None:
+        """`fill_format` as the bytes sent on the socket, JSON is encoded straight to UTF-8."""
+        ret = self._fill(metadata, player, interval, kwargs)
+        if ret is None:
+            return None
+        return ret.encode('utf-8') if isinstance(ret, str) else dumpb(ret)
+
+    def wants(self, player: str | None, active: str | None) -> bool:
+        """Whether an update for `player` (None: the active player changed) concerns this client."""
+        if self.player == ALL_PLAYERS:
+            return player is not None
+        if self.player == ACTIVE_PLAYER:
+            return player is None or player == active
+        return player == self.player
+
 class SocketServer():
     clients_connected: dict[str, Client] = {}
     client_intervals: dict[INTERVAL, list[str]] = {}
@@ -77,6 +171,85 @@ class SocketServer():
         if os.path.exists(socket_path):
             os.unlink(socket_path)
         self.socket_path = socket_path
+        # Last metadata published per player, what a new subscriber starts from
+        self.snapshots: dict[str, Metadata] = {}
+        self.sinks: list[SINK] = []
+        self.commands: dict[str, COMMAND_HANDLER] = {}
+        self.register_command('stats', self._stats_command)
+        self.register_command('trace', self._trace_command)
+        self.register_command('subscribe', self._subscribe_command)
+        self.register_command('unsubscribe', self._unsubscribe_command)
+        metrics.register_gauge('client_queue_bytes', self._client_queue_depths)
+
+    def add_sink(self, sink: SINK):
+        """Registers an observer of published metadata (status files, external notifiers, ...)."""
+        self.sinks.append(sink)
+
+    def _notify_sinks(self, player: str | None, metadata: dict[str, Any]):
+        for sink in self.sinks:
+            try:
+                sink(player, metadata)
+            except Exception:
+                log.exception('Sink %r failed', sink)
+
+    def register_command(self, name: str, handler: COMMAND_HANDLER):
+        """Registers a socket command, the dict returned by `handler` is sent back to the client as JSON."""
+        self.commands[name] = handler
+
+    def _client_queue_depths(self):
+        return {(('client', name),): client.writer.transport.get_write_buffer_size() for name, client in self.clients_connected.items() if client.writer.transport}
+
+    async def _trace_command(self, client: 'Client', request: dict[str, Any]):
+        """`trace [N]` exports the last N traces as Chrome trace events, `trace on|off` toggles tracing."""
+        args = request.get('args', [])
+        last = request.get('last')
+        if args and args[0] in ('on', 'off'):
+            tracer.enabled = args[0] == 'on'
+            return {'tracing': tracer.enabled}
+        if args:
+            last = int(args[0])
+        return tracer.export_chrome(last)
+
+    async def _subscribe_command(self, client: 'Client', request: dict[str, Any]):
+        """
+        `subscribe <interval> [json|str] [format]` or `{"command": "subscribe", "interval": ...,
+        "format_type": ..., "format": ...}` adds (or replaces) one interval on this connection.
+        """
+        args = request.get('args', [])
+        interval = request.get('interval') or args[0]
+        format_type = request.get('format_type') or (args[1] if len(args) > 1 else 'json')
+        output_format = request.get('format') or (' '.join(args[2:]) if len(args) > 2 else 'all')
+        self.subscribe(client, Subscription(interval, format_type, output_format))
+        await self._send_initial_state(client, [interval])
+        return {'subscribed': client.intervals}
+
+    async def _unsubscribe_command(self, client: 'Client', request: dict[str, Any]):
+        args = request.get('args', [])
+        interval = request.get('interval') or args[0]
+        if interval not in client.subscriptions:
+            raise ValueError(f'not subscribed to {interval}')
+        self.unsubscribe(client, interval)
+        return {'subscribed': client.intervals}
+
+    def subscribe(self, client: 'Client', subscription: Subscription):
+        if subscription.interval not in client.subscriptions:
+            self.client_intervals.setdefault(subscription.interval, []).append(client.name)
+        client.subscriptions[subscription.interval] = subscription
+
+    def unsubscribe(self, client: 'Client', interval: INTERVAL):
+        client.subscriptions.pop(interval, None)
+        try:
+            self.client_intervals.get(interval, []).remove(client.name)
+        except ValueError:
+            pass # Already removed
+
+    async def _stats_command(self, client: 'Client', request: dict[str, Any]):
+        stats = metrics.to_dict()
+        stats['clients'] = [
+            {'name': c.name, 'intervals': c.intervals, 'player': c.player, 'bytes_sent': c.bytes_sent, 'messages_sent': c.messages_sent}
+            for c in self.clients_connected.values()
+        ]
+        return {'stats': stats}
 
     async def recv_msg(self, reader: asyncio.StreamReader):
         try:
@@ -101,10 +274,19 @@ class SocketServer():
             writer.write(msg)
             await writer.drain()
         except (BrokenPipeError, ConnectionResetError) as e:
-            log.warning(f"Failed to send message to client: {e}")
+            log.warning("Failed to send message to client: %s", e)
             # Re-raise to be handled by the caller
             raise
 
+    async def send_to_client(self, client: Client, msg: bytes):
+        start = time.perf_counter()
+        with tracer.span('client_write', client=client.name, bytes=len(msg)):
+            await self.send_msg(msg, client.writer)
+        metrics.observe('client_send_seconds', time.perf_counter() - start, client=client.name)
+        client.bytes_sent += len(msg) + HEADER_SIZE
+        client.messages_sent += 1
+        metrics.inc('client_bytes_sent_total', len(msg) + HEADER_SIZE, client=client.name)
+
     async def _setup_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         msg_data = await self.recv_msg(reader)
         if not msg_data:
@@ -113,68 +295,131 @@ class SocketServer():
             await writer.wait_closed()
             return
 
-        client_requested_params = json.loads(msg_data.decode('utf-8'))
+        client_requested_params = loads(msg_data)
+        tagged = 'subscriptions' in client_requested_params
 
-        missing_params = [k for k in REQUIRED_PARAMS if k not in client_requested_params]
+        required_params = REQUIRED_SUBSCRIPTION_PARAMS if tagged else REQUIRED_PARAMS
+        missing_params = [k for k in required_params if k not in client_requested_params]
         if missing_params:
-            err_msg = json.dumps({'Error': f'{missing_params} not found in params'}).encode('utf-8')
-            log.warning(f"Client connection rejected. Missing params: {missing_params}")
+            err_msg = dumpb({'Error': f'{missing_params} not found in params'})
+            log.warning("Client connection rejected. Missing params: %s", missing_params)
             await self.send_msg(err_msg, writer)
             return
 
-        if client_requested_params['interval'] not in VALID_INTERVALS:
-            err_msg = json.dumps({'Error': f'Invalid Interval: {client_requested_params['interval']}'}).encode('utf-8')
-            log.warning(f"Client connection rejected. Invalid interval: {client_requested_params['interval']}")
+        try:
+            if tagged:
+                subscriptions = [Subscription(s['interval'], s.get('format_type', 'json'), s.get('format', 'all')) for s in client_requested_params['subscriptions']]
+            else:
+                subscriptions = [Subscription(client_requested_params['interval'], client_requested_params['format_type'], client_requested_params['format'])]
+        except (ValueError, KeyError, TypeError) as e:
+            err_msg = dumpb({'Error': str(e)})
+            log.warning("Client connection rejected. %s", e)
             await self.send_msg(err_msg, writer)
             return
 
         ignored_params = [k for k in client_requested_params if k not in ALLOWED_PARAMS]
         if ignored_params:
-            warn_msg = json.dumps({'Warning': f'{ignored_params} will be ignored'}).encode('utf-8')
+            warn_msg = dumpb({'Warning': f'{ignored_params} will be ignored'})
             await self.send_msg(warn_msg, writer)
 
         name = client_requested_params['name']
-        interval = client_requested_params['interval']
+        player = client_requested_params.get('player') or ACTIVE_PLAYER
 
-        client = Client(name, interval, client_requested_params['format_type'], client_requested_params['format'], reader, writer)
+        if name in self.clients_connected:
+            # A panel restarted before its old connection was noticed as closed, the new one takes over
+            log.info("Client '%s' reconnected, replacing its previous connection", name)
+            self.remove_client(name)
+        client = Client(name, [], reader, writer, player, tagged)
         self.clients_connected[name] = client
-        
-        if interval not in self.client_intervals:
-            self.client_intervals[interval] = []
-        self.client_intervals[interval].append(name)
-        log.info(f"Client '{name}' connected for interval '{interval}'")
+        for subscription in subscriptions:
+            self.subscribe(client, subscription)
+        log.info("Client '%s' connected for intervals %s, player '%s'", name, client.intervals, player)
 
-        metadata = self.listener.player_metadata
-        msg = client.fill_format(metadata)
-        await self.send_msg(msg.encode('utf-8'), writer)
+        # Untagged clients only ever had one stream, they get a single initial frame
+        await self._send_initial_state(client, client.intervals if tagged else client.intervals[:1])
 
         # Start a background task to listen for commands from the client
         asyncio.create_task(self._listen_for_commands(client))
 
-    async def send_metadata(self, interval: INTERVAL, metadata: dict[str, Any], **kwargs):
-        log.debug(f'Metadata send requested for interval: {interval}')
+    async def _send_initial_state(self, client: Client, intervals: list[INTERVAL]):
+        """Sends the current snapshot(s) of the subscribed player(s) for each of `intervals`."""
+        if client.player == ALL_PLAYERS:
+            snapshots = list(self.snapshots.items())
+        elif client.player == ACTIVE_PLAYER:
+            active = self.listener.active_player_name
+            snapshots = [(active, self.snapshots.get(active, EMPTY))]
+        else:
+            snapshots = [(client.player, self.snapshots.get(client.player, EMPTY))]
+        for interval in intervals:
+            for player, metadata in snapshots:
+                if interval == 'ON_LYRIC':
+                    # Lyric lines are not part of the snapshot, the current one is added for this frame
+                    metadata = metadata.evolve(self.listener.lyric_fields(player))
+                msg = client.fill_frame(metadata, player, interval)
+                if msg is not None:
+                    await self.send_to_client(client, msg)
+
+    def update_snapshot(self, player: str, metadata: dict[str, Any] | None):
+        """Records the latest metadata of `player`, None drops it (the player went away)."""
+        if metadata is None:
+            self.snapshots.pop(player, None)
+        else:
+            self.snapshots[player] = metadata
+
+    async def send_metadata(self, interval: INTERVAL, metadata: dict[str, Any], player: str | None = None, **kwargs):
+        """
+        Sends `metadata` to the clients of `interval` subscribed to `player`. A `player` of
+        None is an update of the active player view only (e.g. after a player disconnected).
+        """
+        # A player publishes the same dict for its interval and ON_EVENT, sinks see it once
+        if player is None or self.snapshots.get(player) is not metadata:
+            if player is not None:
+                self.update_snapshot(player, metadata)
+            self._notify_sinks(player, metadata)
+        with tracer.span('send_metadata', interval=interval):
+            await self._send_metadata(interval, metadata, player, **kwargs)
+
+    async def send_event(self, interval: INTERVAL, metadata: dict[str, Any], player: str, **kwargs):
+        """
+        Sends a frame derived from the player's metadata (a lyric line) to the clients of
+        `interval`, without replacing the player's snapshot or notifying the sinks.
+        """
+        with tracer.span('send_event', interval=interval):
+            await self._send_metadata(interval, metadata, player, **kwargs)
+
+    async def _send_metadata(self, interval: INTERVAL, metadata: dict[str, Any], player: str | None, **kwargs):
+        log.debug('Metadata send requested for interval: %s', interval)
         client_names_to_send_to = self.client_intervals.get(interval, [])
         if not client_names_to_send_to:
             return
         
+        active = self.listener.active_player_name if player is not None else None
         for name in client_names_to_send_to[:]: # Iterate over a copy
             client = self.clients_connected.get(name)
-            if not client:
+            if not client or not client.wants(player, active):
+                continue
+            msg = client.fill_frame(metadata, player, interval, **kwargs)
+            if msg is None:
                 continue
             try:
-                msg = client.fill_format(metadata, **kwargs)
-                await self.send_msg(msg.encode('utf-8'), client.writer)
+                await self.send_to_client(client, msg)
             except (BrokenPipeError, ConnectionResetError):
-                log.warning(f"Client '{name}' disconnected during send. Removing.")
-                self.remove_client(name)
+                log.warning("Client '%s' disconnected during send. Removing.", name)
+                self.remove_client(name, client)
+
+    async def remove_player(self, player: str):
+        """Drops the snapshot of a player that went away and sends an empty update to its subscribers."""
+        self.snapshots.pop(player, None)
+        for interval in list(self.client_intervals):
+            await self._send_metadata(interval, EMPTY, player)
 
     async def broadcast_msg(self, msg: bytes):
         for name, client in list(self.clients_connected.items()):
             try:
-                await self.send_msg(msg, client.writer)
+                await self.send_to_client(client, msg)
             except (BrokenPipeError, ConnectionResetError):
-                log.warning(f"Client '{name}' disconnected during broadcast. Removing.")
-                self.remove_client(name)
+                log.warning("Client '%s' disconnected during broadcast. Removing.", name)
+                self.remove_client(name, client)
 
     async def _listen_for_commands(self, client: Client):
         """Listen for incoming commands from a client in a loop."""
@@ -184,30 +429,54 @@ class SocketServer():
 
                 if data is None:
                     # recv_msg returns None on EOF or connection error
-                    log.info(f"Client '{client.name}' connection closed.")
-                    self.remove_client(client.name)
+                    log.info("Client '%s' connection closed.", client.name)
+                    self.remove_client(client.name, client)
                     break
 
                 command = data.decode('utf-8').strip()
                 if command == 'disconnect':
-                    log.info(f"Client '{client.name}' sent disconnect command. Closing connection.")
-                    self.remove_client(client.name)
+                    log.info("Client '%s' sent disconnect command. Closing connection.", client.name)
+                    self.remove_client(client.name, client)
                     break
-                else:
-                    log.warning(f"Received unknown command from '{client.name}': {command}")
+                await self._run_command(client, command)
             except Exception as e:
-                log.error(f"Error handling client '{client.name}': {e}. Removing client.")
-                self.remove_client(client.name)
+                log.error("Error handling client '%s': %s. Removing client.", client.name, e)
+                self.remove_client(client.name, client)
                 break
 
-    def remove_client(self, name: str):
+    async def execute_command(self, client: Client | None, command: str) -> dict[str, Any] | None:
+        """Runs one command and returns its reply (None: nothing to send). `client` is None for the control socket."""
+        try:
+            request = parse_command(command)
+        except ValueError as e:
+            return {'Error': f'Malformed command: {e}'}
+        handler = self.commands.get(request['command'])
+        if handler is None or (client is None and request['command'] in CONNECTION_COMMANDS):
+            log.warning("Received unknown command from '%s': %s", client.name if client else 'control socket', command)
+            return {'Error': f"Unknown command: {request['command']}"}
+        try:
+            return await handler(client, request)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            return {'Error': f"{request['command']} failed: {e}"}
+
+    async def _run_command(self, client: Client, command: str):
+        response = await self.execute_command(client, command)
+        if response is not None:
+            await self.send_to_client(client, dumpb(response))
+
+    def remove_client(self, name: str, client: Client | None = None):
+        """
+        Drops the client registered as `name` and closes its connection. With `client`, only
+        when it is still the one registered under that name: a connection replaced by a newer
+        one reusing the name is closed without touching the newer one.
+        """
+        if client is not None and self.clients_connected.get(name) is not client:
+            client.writer.close()
+            return
         client = self.clients_connected.pop(name, None)
         if client:
-            if client.interval in self.client_intervals:
-                try:
-                    self.client_intervals[client.interval].remove(name)
-                except ValueError:
-                    pass # Already removed
+            for interval in client.intervals:
+                self.unsubscribe(client, interval)
             client.writer.close()
 
     async def start_server(self, listener):
@@ -217,7 +486,7 @@ class SocketServer():
 
     async def stop_server(self):
         log.info("Unix Domain Socket Server Shutting Down")
-        await self.broadcast_msg(json.dumps({'Warning': 'Server is shutting down'}).encode('utf-8'))
+        await self.broadcast_msg(dumpb({'Warning': 'Server is shutting down'}))
         for client in self.clients_connected.values():
             client.writer.close()
         self.server.close()
@@ -0,0 +1,109 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Any
+
+from core.utils.path_kit import get_runtime_path
+from core.model.snapshot import Metadata
+
+log = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+DEFAULT_SAVE_INTERVAL = 10.0
+# Raw metadata keys identifying a track, the same ones `Player` compares to skip redundant signals
+FINGERPRINT_KEYS = ('xesam:title', 'xesam:url', 'mpris:artUrl', 'xesam:artist')
+
+
+def fingerprint(raw_metadata: dict[str, Any]) -> str:
+    identity = json.dumps([raw_metadata.get(key) for key in FINGERPRINT_KEYS], default=str, ensure_ascii=False)
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+def restored_metadata(entry: dict[str, Any]) -> Metadata:
+    """What the player published before the restart, tracking fields included."""
+    return Metadata(entry['metadata']).evolve({'tracking:startTime': entry['anchor'], 'tracking:existingTime': entry['position'], 'tracking:status': entry['status']})
+
+
+class StateStore:
+    """
+    Persists what clients would need right after a restart: per player the last processed
+    metadata, the raw metadata fingerprint and the pipeline digest (ruleset, plugin sources)
+    it was computed from, and the position anchor.
+
+    The file is rewritten atomically every `interval` seconds when something changed, and
+    once more on shutdown. On startup the entries seed the server snapshots, and players
+    whose live metadata still has the same fingerprint reuse the processed metadata
+    instead of running the plugins again, unless the config or a plugin changed meanwhile.
+    """
+
+    def __init__(self, path: str | None = None, interval: float = DEFAULT_SAVE_INTERVAL):
+        self.path = os.path.expanduser(path) if path else get_runtime_path('state.json')
+        self.interval = interval
+        self.listener = None
+        self.task: asyncio.Task | None = None
+        self.last_written: bytes | None = None
+
+    def load(self) -> dict[str, Any]:
+        """Returns `{'active': name, 'players': {name: entry}}`, empty if there is nothing usable."""
+        try:
+            with open(self.path, 'rb') as f:
+                state = json.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning('Ignoring unreadable state snapshot %s: %s', self.path, e)
+            return {}
+        if state.get('version') != STATE_VERSION:
+            return {}
+        return state
+
+    def collect(self) -> dict[str, Any]:
+        players = {}
+        for name, player in list(self.listener.players_connected.items()):
+            if not player.raw_fingerprint:
+                continue
+            players[name] = {
+                'metadata': player.metadata.to_dict(),
+                'fingerprint': player.raw_fingerprint,
+                # Reused only while the ruleset and the plugins are the same
+                'pipeline': player.pipeline,
+                'status': player.status,
+                'position': player.existing_time,
+                'anchor': player.media_start,
+            }
+        return {'version': STATE_VERSION, 'active': self.listener.active_player[0], 'players': players}
+
+    def save(self):
+        data = json.dumps(self.collect(), separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+        if data == self.last_written:
+            return
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        self.last_written = data
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.save()
+            except OSError as e:
+                log.warning('Could not write state snapshot %s: %s', self.path, e)
+
+    def start(self, listener):
+        self.listener = listener
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.listener is not None:
+            try:
+                self.save()
+            except OSError as e:
+                log.warning('Could not write state snapshot %s: %s', self.path, e)
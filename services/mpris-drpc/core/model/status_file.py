@@ -0,0 +1,154 @@
+import os
+import mmap
+import time
+import struct
+from typing import Any
+
+from core.utils.path_kit import get_runtime_path
+
+# Fixed layout, readers only need this module (or the same three structs):
+#   header: magic, layout version, generation (odd while a write is in progress)
+#   body:   status code, length / existing time / start time (seconds), then NUL padded
+#           UTF-8 strings for the player, title, artist, album and art URL
+MAGIC = b'MPRS'
+VERSION = 1
+HEADER = struct.Struct('<4sIQ')
+GENERATION = struct.Struct('<Q')
+GENERATION_OFFSET = 8
+BODY = struct.Struct('<B7xddd64s512s512s256s1024s')
+FILE_SIZE = 4096
+STATUS_CODES = ('Stopped', 'Playing', 'Paused')
+READ_RETRIES = 10000
+
+
+def _encode(value: str, size: int) -> bytes:
+    data = value.encode('utf-8')
+    if len(data) <= size:
+        return data
+    # Cut on a character boundary so readers always decode valid UTF-8
+    return data[:size].decode('utf-8', errors='ignore').encode('utf-8')
+
+
+def pack_status(player: str | None, metadata: dict[str, Any]) -> bytes:
+    status = metadata.get('tracking:status', 'Stopped') if player else 'Stopped'
+    artist = metadata.get('xesam:artist', '')
+    if isinstance(artist, (list, tuple)):
+        artist = ', '.join(map(str, artist))
+    art = metadata.get('enhancements:localArtUrl') or metadata.get('mpris:artUrl') or ''
+    if art.startswith('data:'):
+        # Inline images do not fit, readers get no art rather than a truncated URI
+        art = ''
+    return BODY.pack(
+        STATUS_CODES.index(status) if status in STATUS_CODES else 0,
+        float(metadata.get('mpris:length') or 0.0),
+        float(metadata.get('tracking:existingTime') or 0.0),
+        float(metadata.get('tracking:startTime') or 0.0),
+        _encode(player or '', 64),
+        _encode(str(metadata.get('xesam:title', '')), 512),
+        _encode(str(artist), 512),
+        _encode(str(metadata.get('xesam:album', '')), 256),
+        _encode(str(art), 1024),
+    )
+
+
+def unpack_status(body: bytes, generation: int) -> dict[str, Any]:
+    code, length, existing_time, start_time, player, title, artist, album, art = BODY.unpack(body)
+    status = STATUS_CODES[code] if code < len(STATUS_CODES) else 'Stopped'
+    position = existing_time + time.time() - start_time if status == 'Playing' else existing_time
+    return {
+        'generation': generation,
+        'player': player.rstrip(b'\0').decode('utf-8'),
+        'status': status,
+        'title': title.rstrip(b'\0').decode('utf-8'),
+        'artist': artist.rstrip(b'\0').decode('utf-8'),
+        'album': album.rstrip(b'\0').decode('utf-8'),
+        'art': art.rstrip(b'\0').decode('utf-8'),
+        'length': length,
+        'position': min(position, length) if length else position,
+    }
+
+
+class StatusReader:
+    """Keeps the status file mapped, `read()` returns a consistent snapshot without any IPC."""
+
+    def __init__(self, path: str | None = None):
+        with open(path or get_runtime_path('status'), 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), FILE_SIZE, access=mmap.ACCESS_READ)
+        magic, version, _ = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not an mpris-drpc status file, or an incompatible layout version')
+
+    def generation(self) -> int:
+        return GENERATION.unpack_from(self.mm, GENERATION_OFFSET)[0]
+
+    def read_raw(self) -> tuple[int, bytes]:
+        for attempt in range(READ_RETRIES):
+            before = GENERATION.unpack_from(self.mm, GENERATION_OFFSET)[0]
+            if not before & 1:
+                body = self.mm[HEADER.size:HEADER.size + BODY.size]
+                if GENERATION.unpack_from(self.mm, GENERATION_OFFSET)[0] == before:
+                    return before, body
+            if attempt >= 3:
+                # The writer may be descheduled halfway through, let it finish
+                os.sched_yield()
+        raise TimeoutError('Status file kept changing while being read')
+
+    def read(self) -> dict[str, Any]:
+        generation, body = self.read_raw()
+        return unpack_status(body, generation)
+
+    def close(self):
+        self.mm.close()
+
+
+class StatusFile:
+    """
+    Server side of the status file, a server sink mirroring the active player.
+
+    Writes follow a seqlock: the generation is bumped to an odd value, the body is written,
+    and the generation is bumped again, readers retry when it was odd or changed under them.
+    """
+
+    def __init__(self, listener, path: str | None = None):
+        self.listener = listener
+        self.path = path or get_runtime_path('status')
+        self.mm: mmap.mmap | None = None
+        self.generation = 0
+        self.last_body: bytes | None = None
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, FILE_SIZE)
+            self.mm = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+        magic, version, generation = HEADER.unpack_from(self.mm)
+        # Keep counting from the previous server's generation so watchers see a change
+        self.generation = generation + (generation & 1) if magic == MAGIC and version == VERSION else 0
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, self.generation)
+
+    def write(self, player: str | None, metadata: dict[str, Any]):
+        body = pack_status(player, metadata)
+        if body == self.last_body or self.mm is None:
+            return
+        self.generation += 1
+        GENERATION.pack_into(self.mm, GENERATION_OFFSET, self.generation)
+        self.mm[HEADER.size:HEADER.size + BODY.size] = body
+        self.generation += 1
+        GENERATION.pack_into(self.mm, GENERATION_OFFSET, self.generation)
+        self.last_body = body
+
+    def __call__(self, player: str | None, metadata: dict[str, Any]):
+        active = self.listener.active_player_name
+        if player is not None and player != active:
+            return
+        self.write(active, metadata)
+
+    def close(self):
+        if self.mm is not None:
+            # Nothing is known to be playing once the server is gone
+            self.write(None, {})
+            self.mm.close()
+            self.mm = None
@@ -0,0 +1,120 @@
+import time
+import itertools
+import contextvars
+from collections import deque
+from typing import Any
+
+DEFAULT_BUFFER_SIZE = 200
+
+
+class _NoopSpan:
+    """Returned by the tracer whenever tracing is off, so a disabled span costs one call."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, trace_id: int, name: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.spans: list[tuple[str, int, int, dict[str, Any]]] = []
+
+
+class Span:
+    def __init__(self, tracer: 'Tracer', trace: Trace, name: str, args: dict[str, Any], root: bool = False):
+        self.tracer = tracer
+        self.trace = trace
+        self.name = name
+        self.args = args
+        self.root = root
+        self.start = 0
+        self.token = None
+
+    def __enter__(self):
+        if self.root:
+            self.token = current_trace.set(self.trace)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = repr(exc)
+        self.trace.spans.append((self.name, self.start, end, self.args))
+        if self.root:
+            current_trace.reset(self.token)
+            self.tracer.finished.append(self.trace)
+        return False
+
+    def set(self, **args: Any):
+        self.args.update(args)
+
+
+current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar('current_trace', default=None)
+
+
+class Tracer:
+    """
+    Follows one incoming D-Bus signal through the pipeline.
+
+    `trace()` opens a root span and gives it a new trace ID, `span()` records a child span
+    on whatever trace is active in the current context (the ID travels with the awaiting
+    task through a context variable). The last `buffer_size` finished traces are kept and
+    can be exported in the Chrome trace event format (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, enabled: bool = False, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.enabled = enabled
+        self.finished: deque[Trace] = deque(maxlen=buffer_size)
+        self.ids = itertools.count(1)
+
+    def configure(self, enabled: bool, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.enabled = enabled
+        if buffer_size != self.finished.maxlen:
+            self.finished = deque(self.finished, maxlen=buffer_size)
+
+    def trace(self, name: str, **args: Any):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, Trace(next(self.ids), name), name, args, root=True)
+
+    def span(self, name: str, **args: Any):
+        if not self.enabled:
+            return NOOP_SPAN
+        trace = current_trace.get()
+        if trace is None:
+            return NOOP_SPAN
+        return Span(self, trace, name, args)
+
+    def export_chrome(self, last: int | None = None) -> dict[str, Any]:
+        traces = list(self.finished)
+        if last:
+            traces = traces[-last:]
+        events = []
+        for trace in traces:
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': trace.trace_id, 'args': {'name': f'#{trace.trace_id} {trace.name}'}})
+            for name, start, end, args in trace.spans:
+                events.append({
+                    'name': name,
+                    'cat': trace.name,
+                    'ph': 'X',
+                    'ts': start / 1000,
+                    'dur': (end - start) / 1000,
+                    'pid': 1,
+                    'tid': trace.trace_id,
+                    'args': {'trace_id': trace.trace_id, **args},
+                })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+tracer = Tracer()
@@ -0,0 +1,197 @@
+import os
+import struct
+import ctypes
+import asyncio
+import logging
+import ctypes.util
+
+from core import metadata_parser
+from core.model.config import Config
+from core.utils.path_kit import get_path
+from core.utils.module_kit import get_registry
+
+log = logging.getLogger(__name__)
+
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+# Editors save in bursts (write, rename, chmod), wait for the burst to settle before rebuilding
+DEBOUNCE_SECONDS = 0.25
+POLL_INTERVAL = 2.0
+
+
+class Inotify:
+    """Minimal non-blocking inotify binding over libc, directories only."""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches: dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self.watches[wd] = path
+
+    def read_events(self) -> list[str]:
+        """Returns the paths touched since the last read."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if wd in self.watches:
+                paths.append(os.path.join(self.watches[wd], name))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    """
+    Watches `config.toml` and the plugin directories, and swaps in a recompiled ruleset
+    when they change without restarting the server.
+
+    Only rules that changed (or reference a plugin that changed) are recompiled, the
+    compilation runs on the plugin thread between two handler calls, and the new ruleset
+    replaces the old one in a single assignment on the event loop, so events see either the
+    old or the new ruleset. Players whose metadata is matched by a changed rule are reprocessed.
+    """
+
+    def __init__(self, config: Config, listener):
+        self.config = config
+        self.listener = listener
+        self.inotify: Inotify | None = None
+        self.pending: set[str] = set()
+        self.reload_handle: asyncio.TimerHandle | None = None
+        self.poll_task: asyncio.Task | None = None
+        self.mtimes: dict[str, int] = {}
+        self.reload_lock = asyncio.Lock()
+
+    @property
+    def watched_directories(self) -> list[str]:
+        directories = [Config.config_home(), *(self.config.plugin_paths or []), get_path('modules')]
+        return list(dict.fromkeys(d for d in directories if d and os.path.isdir(d)))
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        try:
+            self.inotify = Inotify()
+            for directory in self.watched_directories:
+                self.inotify.add_watch(directory)
+            loop.add_reader(self.inotify.fd, self._on_readable)
+            log.info('Watching %s directories for config and plugin changes', len(self.inotify.watches))
+        except (OSError, AttributeError) as e:
+            log.warning('inotify unavailable (%s), polling for config and plugin changes every %ss', e, POLL_INTERVAL)
+            self.inotify = None
+            self.mtimes = self._snapshot_mtimes()
+            self.poll_task = asyncio.create_task(self._poll())
+
+    def stop(self):
+        if self.reload_handle:
+            self.reload_handle.cancel()
+        if self.poll_task:
+            self.poll_task.cancel()
+        if self.inotify:
+            asyncio.get_running_loop().remove_reader(self.inotify.fd)
+            self.inotify.close()
+            self.inotify = None
+
+    def _rewatch(self):
+        if not self.inotify:
+            return
+        watched = set(self.inotify.watches.values())
+        for directory in self.watched_directories:
+            if directory not in watched:
+                self.inotify.add_watch(directory)
+
+    def _on_readable(self):
+        paths = [p for p in self.inotify.read_events() if p.endswith(('.py', '.toml'))]
+        if paths:
+            self._schedule(paths)
+
+    def _schedule(self, paths: list[str]):
+        self.pending.update(paths)
+        if self.reload_handle:
+            self.reload_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self.reload_handle = loop.call_later(DEBOUNCE_SECONDS, lambda: asyncio.create_task(self.reload()))
+
+    def _snapshot_mtimes(self) -> dict[str, int]:
+        mtimes = {}
+        for directory in self.watched_directories:
+            for entry in os.scandir(directory):
+                if entry.name.endswith(('.py', '.toml')):
+                    mtimes[entry.path] = entry.stat().st_mtime_ns
+        return mtimes
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            mtimes = self._snapshot_mtimes()
+            changed = [p for p in mtimes.keys() | self.mtimes.keys() if mtimes.get(p) != self.mtimes.get(p)]
+            self.mtimes = mtimes
+            if changed:
+                self._schedule(changed)
+
+    def _rebuild(self, paths: set[str]):
+        """
+        Runs on the plugin thread, never alongside a handler: reparses the config if needed,
+        re-executes the changed plugins and recompiles the affected rules. On failure the
+        registry keeps the modules it had, matching the ruleset still in use.
+        """
+        config = self.config
+        if any(os.path.realpath(p) == os.path.realpath(Config.config_file()) for p in paths):
+            config = Config.from_config()
+        registry = get_registry(config.plugin_paths)
+        snapshot = registry.snapshot()
+        changed_modules = frozenset(registry.reload_changed())
+        try:
+            ruleset, changed_rules = metadata_parser.compile_ruleset(config, changed_modules)
+        except BaseException:
+            registry.restore(snapshot)
+            raise
+        if config is not self.config:
+            # The next start with this config skips parsing
+            metadata_parser.save_parsed_rules(metadata_parser.compile_cache_path(config), ruleset)
+        return config, ruleset, changed_rules, changed_modules
+
+    async def reload(self):
+        async with self.reload_lock:
+            paths, self.pending = self.pending, set()
+            if not paths:
+                return
+            try:
+                config, ruleset, changed_rules, changed_modules = await asyncio.get_running_loop().run_in_executor(metadata_parser.plugin_executor, self._rebuild, paths)
+            except Exception as e:
+                log.error('Reload failed, keeping the current ruleset: %s', e)
+                return
+
+            if config.socket_path != self.config.socket_path:
+                log.warning('socket_path changed, this only takes effect after a restart')
+            if config.discord_rpc != self.config.discord_rpc:
+                log.warning('discord_rpc changed, this only takes effect after a restart')
+            metadata_parser.swap_matchers(ruleset)
+            self.config = config
+            self.listener.update_config(config)
+            self._rewatch()
+            log.info('Reloaded ruleset: %s rule version(s) changed, plugins changed: %s', len(changed_rules), sorted(changed_modules) or "none")
+            if changed_rules:
+                try:
+                    await self.listener.invalidate(changed_rules)
+                except Exception:
+                    log.exception('Reprocessing metadata after reload failed')
@@ -0,0 +1,257 @@
+import io
+import os
+import math
+import base64
+import binascii
+import hashlib
+import logging
+from typing import Any
+
+from core.utils.module_kit import lazy_import
+from core.utils.path_kit import get_runtime_path
+
+Image = lazy_import('PIL.Image')
+
+log = logging.getLogger(__name__)
+
+LOCAL_ART_KEY = 'enhancements:localArtUrl'
+ART_HASH_KEY = 'enhancements:artHash'
+DATA_URI_PREFIX = 'data:image/'
+# Local art copied into the art cache, named after the hash of its content
+PINNED_PREFIX = 'local-'
+INLINE_MEMORY = 64
+JPEG_QUALITY = 90
+VARIANTS_MEMORY = 512
+# Variants already written, by content hash, so an unchanged image is never decoded again
+_variants: dict[tuple[str, tuple[int, ...]], dict[int, str]] = {}
+# Inline images already decoded, content hash to file
+_inline: dict[str, str] = {}
+# Players resend the same URI with every property change, comparing it is cheaper than hashing it again
+_last_inline: tuple[str, tuple[str, str]] | None = None
+
+
+def variant_key(size: int) -> str:
+    return f'{LOCAL_ART_KEY}@{size}'
+
+
+def art_cache_path(*paths) -> str:
+    return get_runtime_path('art', *paths)
+
+
+def in_art_cache(path: str) -> bool:
+    return os.path.dirname(os.path.abspath(path)) == os.path.abspath(art_cache_path())
+
+
+def pin_local_art(metadata: dict[str, Any]) -> dict[str, Any]:
+    """
+    Copies `enhancements:localArtUrl` into the art cache under the hash of its content when
+    a plugin left it elsewhere, and points the metadata at the copy (`enhancements:artHash`
+    is set as well). Plugins write the art of every track to one fixed path, metadata kept
+    for later (history cache, warm restart) would otherwise show the art of whatever track
+    was processed last. `metadata` is left as is, a copy is returned when something changed.
+    """
+    path = metadata.get(LOCAL_ART_KEY)
+    if not isinstance(path, str) or not path or in_art_cache(path) or not os.path.isfile(path):
+        return metadata
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        log.warning('Could not read album art %s: %s', path, e)
+        return metadata
+    digest = hashlib.sha1(data).hexdigest()[:20]
+    # Copied rather than linked, plugins rewrite their fixed path in place
+    pinned = art_cache_path(f'{PINNED_PREFIX}{digest}{os.path.splitext(path)[1]}')
+    if not os.path.exists(pinned):
+        try:
+            os.makedirs(art_cache_path(), mode=0o700, exist_ok=True)
+            tmp_path = f'{pinned}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, pinned)
+        except OSError as e:
+            log.warning('Could not copy album art %s to the art cache: %s', path, e)
+            return metadata
+    metadata = metadata.copy()
+    metadata[LOCAL_ART_KEY] = pinned
+    metadata[ART_HASH_KEY] = digest
+    return metadata
+
+
+def art_pinned(metadata: dict[str, Any]) -> bool:
+    """Whether every local art path of `metadata` is a file of the art cache that still exists, what kept metadata may point at."""
+    for key, value in metadata.items():
+        if key.startswith(LOCAL_ART_KEY) and isinstance(value, str) and not (in_art_cache(value) and os.path.exists(value)):
+            return False
+    return True
+
+
+def inline_art_path(data_uri: str) -> tuple[str, str] | None:
+    """
+    Decodes a `data:image/...;base64,` URI to the art cache, named after the hash of its
+    payload, and returns (path, hash). A payload already decoded is only hashed.
+    """
+    global _last_inline
+    if _last_inline is not None and _last_inline[0] == data_uri and os.path.exists(_last_inline[1][0]):
+        return _last_inline[1]
+    header, _, payload = data_uri.partition(',')
+    if not payload or not header.endswith(';base64'):
+        return None
+    payload = ''.join(payload.split()).encode('ascii', errors='ignore')
+    digest = hashlib.sha1(payload).hexdigest()[:20]
+    path = _inline.get(digest)
+    if path is not None and os.path.exists(path):
+        _last_inline = (data_uri, (path, digest))
+        return path, digest
+    subtype = header[len(DATA_URI_PREFIX):-len(';base64')].split(';')[0].lower()
+    extension = {'jpeg': 'jpg', 'svg+xml': 'svg'}.get(subtype, subtype) or 'img'
+    path = art_cache_path(f'inline-{digest}.{extension}')
+    if not os.path.exists(path):
+        try:
+            data = base64.b64decode(payload, validate=True)
+            if not data:
+                raise ValueError('empty image')
+            os.makedirs(art_cache_path(), mode=0o700, exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except (binascii.Error, ValueError, OSError) as e:
+            log.warning('Could not decode inline album art: %s', e)
+            return None
+    if len(_inline) >= INLINE_MEMORY:
+        _inline.clear()
+    _inline[digest] = path
+    _last_inline = (data_uri, (path, digest))
+    return path, digest
+
+
+def strip_inline_art(metadata: dict[str, Any]) -> dict[str, Any]:
+    """
+    Replaces inline (data URI) `mpris:artUrl` with a file URL to its decoded copy, so the
+    blob is not carried through the plugins, the snapshots and every client payload.
+    `enhancements:localArtUrl` and `enhancements:artHash` are set as well. `metadata` is
+    left as is, a copy is returned when something changed.
+    """
+    art_url = metadata.get('mpris:artUrl')
+    if not isinstance(art_url, str) or not art_url.startswith(DATA_URI_PREFIX):
+        return metadata
+    metadata = metadata.copy()
+    inline = inline_art_path(art_url)
+    if inline is None:
+        # Undecodable, still not worth sending around
+        del metadata['mpris:artUrl']
+        return metadata
+    path, digest = inline
+    metadata['mpris:artUrl'] = f'file://{path}'
+    metadata[LOCAL_ART_KEY] = path
+    metadata[ART_HASH_KEY] = digest
+    return metadata
+
+
+def _decode_square(data: bytes, largest: int):
+    """
+    The center cropped square of the image in `data`, decoded only as far as `largest` needs:
+    JPEG at a reduced DCT scale (`draft`), other formats box reduced by an integer factor
+    right after decoding. Returns the image (RGB or RGBA) and whether it has alpha.
+    """
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    side = min(width, height)
+    if side > largest:
+        scale = largest / side
+        image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+    width, height = image.size
+    side = min(width, height)
+    left, top = (width - side) // 2, (height - side) // 2
+    image = image.crop((left, top, left + side, top + side))
+    if side // largest >= 2:
+        image = image.reduce(side // largest)
+
+    alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    return image.convert('RGBA' if alpha else 'RGB'), alpha
+
+
+def square_variants(data: bytes, sizes: tuple[int, ...], name: str) -> dict[int, str]:
+    """
+    Writes a center cropped square of the image in `data` at each of `sizes` to the art cache.
+
+    Only as much of the image is decoded as the largest size needs, and every size is then
+    resampled once from that.
+    """
+    image, alpha = _decode_square(data, max(sizes))
+    extension = 'png' if alpha else 'jpg'
+    os.makedirs(art_cache_path(), mode=0o700, exist_ok=True)
+    paths = {}
+    for size in sorted(sizes, reverse=True):
+        path = art_cache_path(f'{name}@{size}.{extension}')
+        variant = image if image.width <= size else image.resize((size, size), Image.LANCZOS)
+        tmp_path = f'{path}.tmp'
+        variant.save(tmp_path, format='PNG' if alpha else 'JPEG', quality=JPEG_QUALITY)
+        os.replace(tmp_path, path)
+        paths[size] = path
+    return paths
+
+
+def square_art(data: bytes, size: int, path: str) -> str:
+    """
+    Writes a center cropped square of the image in `data`, at most `size` wide, to `path`
+    (PNG or JPEG after its extension), for plugins turning downloaded art into local art in
+    a single decode. The art stage derives the display sizes from it.
+    """
+    image, alpha = _decode_square(data, size)
+    if image.width > size:
+        image = image.resize((size, size), Image.LANCZOS)
+    png = alpha or path.lower().endswith('.png')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    image.save(tmp_path, format='PNG' if png else 'JPEG', quality=JPEG_QUALITY, compress_level=1)
+    os.replace(tmp_path, path)
+    return path
+
+
+def local_art_path(metadata: dict[str, Any]) -> str | None:
+    path = metadata.get(LOCAL_ART_KEY)
+    if not path:
+        art_url = metadata.get('mpris:artUrl') or ''
+        path = art_url[len('file://'):] if art_url.startswith('file://') else None
+    return path if path and os.path.isfile(path) else None
+
+
+def add_art_variants(metadata: dict[str, Any], sizes: tuple[int, ...]) -> dict[str, Any]:
+    """Publishes `enhancements:localArtUrl@<size>` for each of `sizes` when the track has local art."""
+    if Image is None or not sizes:
+        return metadata
+    path = local_art_path(metadata)
+    if path is None:
+        return metadata
+    sizes = tuple(sorted(set(sizes)))
+    # Inline and pinned art is already hashed and its file never changes, anything else is read to be hashed
+    digest = metadata.get(ART_HASH_KEY)
+    if digest and os.path.splitext(os.path.basename(path))[0] not in (f'inline-{digest}', f'{PINNED_PREFIX}{digest}'):
+        # A plugin replaced the inline art
+        digest = None
+    paths = _variants.get((digest, sizes)) if digest else None
+    if paths is None or not all(os.path.exists(p) for p in paths.values()):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            log.warning('Could not read album art %s: %s', path, e)
+            return metadata
+        # Plugins reuse one path per player, the content identifies the image
+        digest = digest or hashlib.sha1(data).hexdigest()[:20]
+        paths = _variants.get((digest, sizes))
+    if paths is None or not all(os.path.exists(p) for p in paths.values()):
+        try:
+            paths = square_variants(data, sizes, digest)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            log.warning('Could not produce album art variants of %s: %s', path, e)
+            return metadata
+        if len(_variants) >= VARIANTS_MEMORY:
+            _variants.clear()
+        _variants[(digest, sizes)] = paths
+    metadata = metadata.copy()
+    for size, variant_path in paths.items():
+        metadata[variant_key(size)] = variant_path
+    return metadata
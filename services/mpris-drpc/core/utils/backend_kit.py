@@ -0,0 +1,94 @@
+import json
+import asyncio
+import logging
+import importlib
+import importlib.util
+from typing import Any, Callable
+
+
+log = logging.getLogger(__name__)
+
+# In order of preference for `auto`, stdlib last so something is always available
+JSON_BACKENDS = ('orjson', 'msgspec', 'json')
+EVENT_LOOPS = ('uvloop', 'asyncio')
+
+
+def _stdlib_dumpb(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _build_codec(name: str) -> tuple[Callable[[Any], bytes], Callable[[str | bytes], Any], tuple[type[Exception], ...], tuple[type[Exception], ...]]:
+    """
+    Encoder, decoder, the errors the encoder raises for values the stdlib may still handle and
+    the errors the decoder raises for malformed input that are not already ValueErrors.
+    """
+    if name == 'orjson':
+        import orjson
+        # orjson.JSONDecodeError is a ValueError
+        return orjson.dumps, orjson.loads, (TypeError,), ()
+    if name == 'msgspec':
+        import msgspec
+        encoder, decoder = msgspec.json.Encoder(), msgspec.json.Decoder()
+        return encoder.encode, decoder.decode, (TypeError, msgspec.EncodeError), (msgspec.DecodeError,)
+    return _stdlib_dumpb, json.loads, (), ()
+
+
+def available(name: str) -> bool:
+    return name in ('json', 'asyncio') or importlib.util.find_spec(name) is not None
+
+
+json_backend = 'json'
+_dumpb, _loads, _encode_errors, _decode_errors = _build_codec('json')
+
+
+def use_json_backend(name: str = 'auto') -> str:
+    """Selects the JSON codec, `auto` picks the first installed of `JSON_BACKENDS`. Returns the one in use."""
+    global json_backend, _dumpb, _loads, _encode_errors, _decode_errors
+    if name == 'auto':
+        name = next(backend for backend in JSON_BACKENDS if available(backend))
+    elif name not in JSON_BACKENDS:
+        raise ValueError(f'Unknown JSON backend {name}, expected one of {JSON_BACKENDS} or auto')
+    elif not available(name):
+        log.warning('JSON backend %s is not installed, using the stdlib json module', name)
+        name = 'json'
+    _dumpb, _loads, _encode_errors, _decode_errors = _build_codec(name)
+    json_backend = name
+    return name
+
+
+def dumpb(obj: Any) -> bytes:
+    """`obj` as compact UTF-8 JSON. What the selected backend refuses (e.g. non string keys) goes through the stdlib."""
+    try:
+        return _dumpb(obj)
+    except _encode_errors:
+        return _stdlib_dumpb(obj)
+
+
+def dumps(obj: Any) -> str:
+    return dumpb(obj).decode('utf-8')
+
+
+def loads(data: str | bytes) -> Any:
+    """Parses JSON text, malformed input raises a ValueError whatever the backend."""
+    try:
+        return _loads(data)
+    except _decode_errors as e:
+        raise ValueError(str(e)) from e
+
+
+def event_loop_factory(name: str = 'auto') -> tuple[str, Callable[[], asyncio.AbstractEventLoop] | None]:
+    """
+    The loop to run the application on, for `asyncio.Runner(loop_factory=...)`. `auto` picks
+    uvloop when installed. Returns the name of the loop and its factory (None: asyncio's default).
+    """
+    if name == 'auto':
+        name = next(loop for loop in EVENT_LOOPS if available(loop))
+    elif name not in EVENT_LOOPS:
+        raise ValueError(f'Unknown event loop {name}, expected one of {EVENT_LOOPS} or auto')
+    elif not available(name):
+        log.warning('Event loop %s is not installed, using the asyncio loop', name)
+        name = 'asyncio'
+    if name == 'uvloop':
+        uvloop = importlib.import_module('uvloop')
+        return name, uvloop.new_event_loop
+    return name, None
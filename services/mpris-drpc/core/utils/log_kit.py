@@ -0,0 +1,118 @@
+import sys
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+from core.utils.backend_kit import dumps
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Warnings and errors allowed per call site and window, the rest are counted and summarized
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_WINDOW = 60.0
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets `burst` records of WARNING and above through per call site (file, line) and
+    `window` seconds. Once the window is over, the next record from that site carries the
+    number of records dropped in between. Lower levels are never limited.
+    """
+
+    def __init__(self, burst: int = RATE_LIMIT_BURST, window: float = RATE_LIMIT_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        # call site -> [window start, records let through, records dropped]
+        self.sites: dict[tuple[str, int], list] = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        now = record.created
+        with self.lock:
+            state = self.sites.get(site)
+            if state is None or now - state[0] >= self.window:
+                dropped = state[2] if state else 0
+                self.sites[site] = [now, 1, 0]
+                if dropped:
+                    record.suppressed = dropped
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f'{text} ({suppressed} similar messages suppressed)' if suppressed else text
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, thread, message, and the traceback when there is one."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return dumps(entry)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in process, the record is formatted by the listener thread rather
+        # than here on the caller's (the event loop's) thread
+        return record
+
+
+def setup_logging(level: int, json_lines: bool = False):
+    """
+    Routes every record through a queue to a listener thread that formats and writes them
+    to stderr, so logging never blocks the event loop on a slow terminal or journal.
+    Call once at startup, the listener is flushed and stopped at exit.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonLinesFormatter() if json_lines else TextFormatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    # Dropped before they are queued
+    queue_handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Writes what is still queued and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,27 +1,195 @@
 import os
 import sys
-import importlib
+import time
+import hashlib
 import importlib.util
-from typing import Callable, Any
+from types import ModuleType
+from typing import Callable, Any, NamedTuple
 
-def get_callable_by_id(identification: str, module_directoies: list[str] | None = None) -> Callable[..., dict[str, Any]]:
-    module_name, method_name = identification.split('.')
-    found = False
-    if module_directoies:
-        for module_directory in module_directoies:
-            if module_directory and f'{module_name}.py' in os.listdir(module_directory) and os.path.exists(module_directory):
-                spec = importlib.util.spec_from_file_location('module', os.path.join(module_directory, module_name))
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                found = True
-                break
-    
-    if not found:
+from core.utils.path_kit import get_path
+
+# Time spent executing each plugin module, keyed by the plugin identifier, used by the import report
+plugin_import_times: dict[str, tuple[float, int]] = {}
+
+
+def lazy_import(name: str) -> ModuleType | None:
+    """
+    Returns a module whose body only executes on first attribute access.
+
+    Heavy optional dependencies (yt_dlp, PIL, requests) are imported this way so that
+    loading a plugin only costs a spec lookup, the real import happens the first time
+    the plugin actually uses the dependency.
+
+    Returns:
+        The (lazy) module, or None if the module is not installed.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.loader is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LoadedModule(NamedTuple):
+    module: ModuleType
+    mtime: int
+    name: str
+    # sha1 of the source the module was executed from, identifies the plugin version
+    digest: str
+
+
+class ModuleRegistry:
+    """
+    Loads plugin modules once per resolved path and hands out shared callables.
+
+    The plugin directories are scanned once into an index of module name -> file, the
+    leftmost directory wins and the distribution `modules` directory is searched last.
+    Each file is executed once under a unique module name, so every rule that references
+    a plugin shares the same module globals (and caches).
+    """
+
+    def __init__(self, module_directories: list[str] | None = None):
+        self.module_directories = [d for d in (module_directories or []) if d] + [get_path('modules')]
+        self.index: dict[str, str] = {}
+        self.modules: dict[str, LoadedModule] = {}
+        self.scan()
+
+    def scan(self):
+        """Rebuilds the module name -> resolved path index from the plugin directories."""
+        index = {}
+        for module_directory in self.module_directories:
+            try:
+                entries = list(os.scandir(module_directory))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            for entry in entries:
+                name, ext = os.path.splitext(entry.name)
+                if ext == '.py' and name not in index and entry.is_file():
+                    index[name] = os.path.realpath(entry.path)
+        self.index = index
+
+    def _exec(self, module_name: str, path: str) -> LoadedModule:
+        """Executes the plugin file under its unique module name, without registering it."""
+        unique_name = f'mpris_plugin_{module_name}_{hashlib.sha1(path.encode()).hexdigest()[:8]}'
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        loaded_before = len(sys.modules)
+        start = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(unique_name, path)
+        module = importlib.util.module_from_spec(spec)
+        previous = sys.modules.get(unique_name)
+        sys.modules[unique_name] = module
         try:
-            module = importlib.import_module(f'modules.{module_name}')
-        except (ImportError, ModuleNotFoundError):
-            raise ValueError(f'Module {module_name} not found in module directories {module_directory} nor project module location')
-    
-    if not hasattr(module, method_name):
-        raise ValueError(f'The requested method {method_name} was not found in the specified module {module_name}.')
-    return getattr(module, method_name)
\ No newline at end of file
+            spec.loader.exec_module(module)
+        except BaseException:
+            if previous is not None:
+                sys.modules[unique_name] = previous
+            else:
+                del sys.modules[unique_name]
+            raise
+        plugin_import_times[module_name] = (time.perf_counter() - start, len(sys.modules) - loaded_before)
+        return LoadedModule(module, mtime, module_name, digest)
+
+    def load(self, module_name: str) -> ModuleType:
+        path = self.index.get(module_name)
+        if path is None:
+            raise ValueError(f'Module {module_name} not found in module directories {self.module_directories}')
+        if path not in self.modules:
+            self.modules[path] = self._exec(module_name, path)
+        return self.modules[path].module
+
+    def get_callable(self, identification: str) -> Callable[..., dict[str, Any]]:
+        module_name, method_name = identification.split('.')
+        module = self.load(module_name)
+        if not hasattr(module, method_name):
+            raise ValueError(f'The requested method {method_name} was not found in the specified module {module_name}.')
+        return getattr(module, method_name)
+
+    def source_digest(self, module_name: str) -> str | None:
+        """The digest of the loaded version of a plugin, None when it is not loaded."""
+        loaded = self.modules.get(self.index.get(module_name, ''))
+        return loaded.digest if loaded else None
+
+    def snapshot(self) -> tuple[dict[str, str], dict[str, LoadedModule]]:
+        """The index and the loaded modules, `restore` brings the registry back to them."""
+        return self.index, dict(self.modules)
+
+    def restore(self, snapshot: tuple[dict[str, str], dict[str, LoadedModule]]):
+        index, modules = snapshot
+        for path, loaded in self.modules.items():
+            if path not in modules:
+                sys.modules.pop(loaded.module.__name__, None)
+        self.index, self.modules = index, dict(modules)
+        for loaded in modules.values():
+            sys.modules[loaded.module.__name__] = loaded.module
+
+    def reload_changed(self) -> list[str]:
+        """
+        Re-executes only the loaded modules whose file changed (or now resolves to a
+        different file) since they were loaded. All or nothing: if one of them fails to
+        execute, the registry keeps every module it had loaded before and the error is raised.
+
+        Returns:
+            The names of the modules that were reloaded, callables previously handed out
+            for them are stale and need to be fetched again.
+        """
+        snapshot = self.snapshot()
+        self.scan()
+        changed = []
+        reloaded = {}
+        removed = []
+        try:
+            for path, (module, mtime, name, _) in self.modules.items():
+                try:
+                    current = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    current = None
+                if current is None or self.index.get(name) != path:
+                    # Removed or shadowed by a plugin in a directory with higher priority
+                    removed.append(path)
+                    changed.append(name)
+                elif current != mtime:
+                    reloaded[path] = self._exec(name, path)
+                    changed.append(name)
+        except BaseException:
+            self.restore(snapshot)
+            raise
+        for path in removed:
+            sys.modules.pop(self.modules.pop(path).module.__name__, None)
+        self.modules.update(reloaded)
+        return changed
+
+
+_registries: dict[tuple[str, ...], ModuleRegistry] = {}
+
+
+def get_registry(module_directories: list[str] | None = None) -> ModuleRegistry:
+    key = tuple(module_directories or ())
+    if key not in _registries:
+        _registries[key] = ModuleRegistry(module_directories)
+    return _registries[key]
+
+
+def get_callable_by_id(identification: str, module_directoies: list[str] | None = None) -> Callable[..., dict[str, Any]]:
+    return get_registry(module_directoies).get_callable(identification)
+
+
+def format_import_report() -> str:
+    """
+    Renders the recorded plugin import costs in the same shape as `python -X importtime`,
+    slowest plugin first.
+    """
+    lines = ['plugin import time: self [us] | new modules | plugin']
+    for name, (elapsed, new_modules) in sorted(plugin_import_times.items(), key=lambda item: item[1][0], reverse=True):
+        lines.append(f'plugin import time: {int(elapsed * 1_000_000):>10} | {new_modules:>11} | {name}')
+    return '\n'.join(lines)
@@ -4,4 +4,22 @@ PROJECT_ROOT = os.path.abspath(os.path.join(__file__, os.path.pardir, os.path.pa
 
 
 def get_path(*paths):
-    return os.path.join(PROJECT_ROOT, *paths)
\ No newline at end of file
+    return os.path.join(PROJECT_ROOT, *paths)
+
+
+def get_runtime_path(*paths):
+    """Path under $XDG_RUNTIME_DIR/mpris-drpc (or a per user directory in /tmp without one)."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or os.path.join('/tmp', f'mpris-drpc-{os.getuid()}')
+    return os.path.join(runtime_dir, 'mpris-drpc', *paths)
+
+
+def get_cache_path(*paths):
+    """Path under $XDG_CACHE_HOME/mpris-drpc (~/.cache/mpris-drpc)."""
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'mpris-drpc', *paths)
+
+
+def get_data_path(*paths):
+    """Path under $XDG_DATA_HOME/mpris-drpc (~/.local/share/mpris-drpc), for what should survive reboots."""
+    data_dir = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(data_dir, 'mpris-drpc', *paths)
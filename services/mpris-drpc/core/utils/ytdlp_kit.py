@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import queue
+import signal
+import hashlib
+import logging
+import threading
+import importlib.util
+import multiprocessing
+from typing import Any
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from core.utils.path_kit import get_cache_path
+
+log = logging.getLogger(__name__)
+
+ytdl_available = importlib.util.find_spec('yt_dlp') is not None
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_TTL = 7 * 24 * 3600
+# Failed extractions are not retried for this long (kept in memory only)
+FAILURE_TTL = 600
+YDL_PARAMS = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True}
+# What plugins use from the info dict, the rest (formats, subtitles, ...) is dropped before caching
+INFO_KEYS = ('id', 'title', 'uploader', 'uploader_id', 'channel', 'artist', 'album', 'track', 'duration', 'thumbnail', 'thumbnails', 'webpage_url', 'extractor')
+TRACKING_PARAMS = {'ref', 'ref_src', 'from', 'si', 'feature', 't', 'start', 'list', 'index', 'pp', 'cp', 'spm_id_from', 'vd_source', 'share_source'}
+HOST_PREFIXES = ('www.', 'sp.', 'm.', 'music.')
+
+
+def canonical_url(url: str) -> str:
+    """Drops what does not change the video (host aliases, tracking params, fragments) so every variant shares a cache entry."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in TRACKING_PARAMS and not k.startswith('utm_'))
+    return urlunsplit(('https', host, parts.path.rstrip('/') or '/', urlencode(query), ''))
+
+
+def _worker_main(requests: multiprocessing.Queue, responses: multiprocessing.Queue):
+    """Worker process: imports yt_dlp and builds the extractor once, then serves requests until told to stop."""
+    # Ctrl+C reaches the whole process group, the server decides when the worker goes away
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import yt_dlp
+    with yt_dlp.YoutubeDL(YDL_PARAMS) as ydl:
+        while True:
+            request = requests.get()
+            if request is None:
+                return
+            request_id, url = request
+            try:
+                info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+                responses.put((request_id, True, {k: info[k] for k in INFO_KEYS if k in info}))
+            except Exception as e:
+                responses.put((request_id, False, f'{type(e).__name__}: {e}'))
+
+
+class ExtractorWorker:
+    """
+    Client side of the extraction worker. The process is spawned on first use (spawned rather
+    than forked, the server has an event loop and threads) and kept alive; a request that times
+    out gets the worker restarted, so one stuck extraction cannot block the ones after it.
+    """
+
+    def __init__(self):
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.requests = None
+        self.responses = None
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        self.requests = self.context.Queue()
+        self.responses = self.context.Queue()
+        self.process = self.context.Process(target=_worker_main, args=(self.requests, self.responses), name='yt-dlp-worker', daemon=True)
+        self.process.start()
+        log.debug('Started yt-dlp worker (pid %s)', self.process.pid)
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+
+    def _stop(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(1)
+        self.process = None
+
+    def extract(self, url: str, timeout: float = DEFAULT_TIMEOUT) -> dict[str, Any]:
+        """Returns the (trimmed) info dict, raises TimeoutError or RuntimeError when extraction fails."""
+        with self.lock:
+            self._ensure_started()
+            self.next_id += 1
+            request_id = self.next_id
+            self.requests.put((request_id, url))
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stop()
+                    raise TimeoutError(f'yt-dlp extraction of {url} took longer than {timeout}s')
+                try:
+                    # Woken up every second to notice a worker that died (e.g. a broken yt_dlp install)
+                    response_id, ok, payload = self.responses.get(timeout=min(remaining, 1.0))
+                except queue.Empty:
+                    if not self.process.is_alive():
+                        self._stop()
+                        raise RuntimeError(f'yt-dlp worker exited while extracting {url}')
+                    continue
+                if response_id != request_id:
+                    continue
+                if not ok:
+                    raise RuntimeError(payload)
+                return payload
+
+
+class ExtractionService:
+    """Info dicts by canonical URL: memory, then the on-disk cache, then the worker."""
+
+    def __init__(self, cache_dir: str | None = None):
+        self.cache_dir = cache_dir or get_cache_path('ytdlp')
+        self.worker = ExtractorWorker()
+        self.memory: dict[str, tuple[float, dict[str, Any] | None]] = {}
+        # Set by `request_prewarm`, otherwise the worker starts on the first extraction
+        self.prewarm_requested = False
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json")
+
+    def _read_cache(self, key: str, ttl: float) -> dict[str, Any] | None:
+        try:
+            with open(self._cache_path(key), 'rb') as f:
+                entry = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning('Ignoring unreadable yt-dlp cache entry for %s: %s', key, e)
+            return None
+        if time.time() - entry['fetched'] > ttl:
+            return None
+        return entry['info']
+
+    def _write_cache(self, key: str, info: dict[str, Any]):
+        path = self._cache_path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'url': key, 'fetched': time.time(), 'info': info}, f, ensure_ascii=False)
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            log.warning('Could not write yt-dlp cache entry for %s: %s', key, e)
+
+    def extract_info(self, url: str, timeout: float = DEFAULT_TIMEOUT, ttl: float = DEFAULT_TTL) -> dict[str, Any] | None:
+        key = canonical_url(url)
+        now = time.time()
+        if key in self.memory:
+            fetched, info = self.memory[key]
+            if now - fetched < (ttl if info is not None else FAILURE_TTL):
+                return info
+        info = self._read_cache(key, ttl)
+        if info is not None:
+            self.memory[key] = (now, info)
+            return info
+        if not ytdl_available:
+            return None
+        start = time.perf_counter()
+        try:
+            info = self.worker.extract(url, timeout)
+        except (TimeoutError, RuntimeError, OSError) as e:
+            log.warning('yt-dlp extraction failed for %s: %s', url, e)
+            self.memory[key] = (now, None)
+            return None
+        log.debug('Extracted %s in %.2fs', key, time.perf_counter() - start)
+        self.memory[key] = (now, info)
+        self._write_cache(key, info)
+        return info
+
+
+service = ExtractionService()
+
+
+def extract_info(url: str, timeout: float = DEFAULT_TIMEOUT, ttl: float = DEFAULT_TTL) -> dict[str, Any] | None:
+    """
+    Cached `YoutubeDL.extract_info(url, download=False)` for plugins, trimmed to `INFO_KEYS`.
+
+    Returns None when yt-dlp is not installed or the extraction failed / timed out.
+    """
+    return service.extract_info(url, timeout, ttl)
+
+
+def request_prewarm():
+    """
+    Asks for the worker to be started once the server is up, for plugins to call at import.
+    Starts nothing itself: importing a plugin (import reports, rule benches, hot reloads) must
+    not spawn a process.
+    """
+    service.prewarm_requested = True
+
+
+def prewarm():
+    """Starts the worker (and its yt_dlp import) ahead of the first extraction if a plugin asked for it."""
+    if ytdl_available and service.prewarm_requested:
+        service.worker.start()
@@ -1,13 +1,31 @@
+import os
+import sys
+import json
 import signal
 import asyncio
 import logging
+import argparse
 from dbus_next import BusType
 from dbus_next.aio.message_bus import MessageBus
 
-from core.constants import log_level
+from core.constants import log_level, log_format
 from core.model.config import Config
 from core.model.dbus import DbusListener
+from core.model.watcher import ConfigWatcher
+from core.model.metrics import PrometheusServer, monitor_event_loop
+from core.model.control import ControlServer
+from core.model.tracing import tracer
+from core.model.journal import recorder, replay
+from core.model.state import StateStore
+from core.model.history import HistoryStore
+from core.model.status_file import StatusFile
+from core.model.discord import DiscordPresence
 from core.model.socket_server import SocketServer
+from core.model.rule_bench import bench, format_report
+from core.metadata_parser import initialize_matchers
+from core.utils.module_kit import format_import_report
+from core.utils.backend_kit import use_json_backend, event_loop_factory
+from core.utils.log_kit import setup_logging
 
 log = logging.getLogger(__name__)
 
@@ -22,22 +40,53 @@ async def discover_initial_players(interface, listener):
     ]
 
     if mpris_names:
-        log.info(f"Found existing media players: {mpris_names}")
+        log.info("Found existing media players: %s", mpris_names)
         await listener.connect_bulk(mpris_names)
 
 
-async def run_application():
-    config = Config.from_config()
+async def run_application(record_path: str | None = None, config: Config | None = None):
+    config = config or Config.from_config()
+    tracer.configure(config.tracing, config.trace_buffer)
+    # Parse the rules and load the plugins now rather than on the first track change
+    initialize_matchers(config)
+    if record_path or config.journal_path:
+        recorder.start(os.path.expanduser(record_path or config.journal_path), config.journal_max_bytes, config.journal_backups)
     stop_event = asyncio.Event()
+    watcher = None
+    prometheus = None
+    control = None
+    state = StateStore(config.state_path, config.state_interval) if config.warm_restart else None
+    status = None
+    presence = None
+    history = None
+    lag_monitor = asyncio.create_task(monitor_event_loop())
 
     # 1. Setup D-Bus
     bus = await MessageBus(bus_type=BusType.SESSION).connect()
 
     try:
         # 2. Setup Server and Listener
-        server = SocketServer()
+        server = SocketServer(config.socket_path)
         listener = DbusListener(config, bus, server)
+        if state:
+            # Clients connecting before the players attach get the state from before the restart
+            listener.restore(state.load())
         await server.start_server(listener)
+        if config.status_file:
+            status = StatusFile(listener, os.path.expanduser(config.status_path) if config.status_path else None)
+            status.open()
+            server.add_sink(status)
+        if config.history:
+            history = HistoryStore(listener, config.history_path, config.history_flush_interval)
+            history.open()
+            history.register(server)
+            listener.history = history
+            server.add_sink(history)
+        if config.discord_rpc:
+            presence = DiscordPresence(listener, config)
+            presence.start()
+            listener.presence = presence
+            server.add_sink(presence)
 
         # 3. Setup MPRIS Monitoring
         introspection = await bus.introspect(
@@ -50,13 +99,32 @@ async def run_application():
 
         # Connect to existing players
         await discover_initial_players(dbus_interface, listener)
+        await listener.prune_restored()
+        if state:
+            state.start(listener)
 
         # Listen for new players
         dbus_interface.on_name_owner_changed(
             lambda name, old, new: listener.handle_connection(name, old, new, False)
         )
 
+        if config.metrics_socket_path:
+            prometheus = PrometheusServer(config.metrics_socket_path)
+            await prometheus.start()
+
+        if config.control_socket_path:
+            control = ControlServer(server, config.control_socket_path)
+            await control.start()
+
+        if config.hot_reload:
+            watcher = ConfigWatcher(config, listener)
+            watcher.start()
+
         log.info("Application started. Global listener active.")
+        # Plugins using yt-dlp only ask for its worker while loading, it is spawned now that the server
+        # is up (imported here, the kit is not needed to start the server)
+        from core.utils import ytdlp_kit
+        await asyncio.to_thread(ytdlp_kit.prewarm)
 
         # 4. Handle Termination Signals gracefully
         loop = asyncio.get_running_loop()
@@ -71,22 +139,120 @@ async def run_application():
         raise
     finally:
         log.info("Shutting down...")
-        # Order matters: Stop server -> Disconnect Listeners -> Disconnect Bus
+        # Order matters: Stop watcher -> Stop server -> Disconnect Listeners -> Disconnect Bus
+        lag_monitor.cancel()
+        if state:
+            state.stop()
+        if status:
+            status.close()
+        if history:
+            history.close()
+        if presence:
+            await presence.stop()
+        if prometheus:
+            await prometheus.stop()
+        if control:
+            await control.stop()
+        if watcher:
+            watcher.stop()
         if server:
             await server.stop_server()
         if listener:
             listener.disconnect_all()
         if bus:
             bus.disconnect()
+        recorder.stop()
         log.info("Shutdown complete.")
 
 
+async def run_replay(journal_path: str, speed: float | None, delay: float, hold: bool, config: Config | None = None):
+    """Serves clients from a recorded journal instead of the session bus."""
+    config = config or Config.from_config()
+    tracer.configure(config.tracing, config.trace_buffer)
+    initialize_matchers(config)
+    server = SocketServer(config.socket_path)
+    listener = DbusListener(config, None, server)
+    await server.start_server(listener)
+    try:
+        # Give clients (benchmarks, panels) time to attach before the first signal
+        await asyncio.sleep(delay)
+        count, elapsed = await replay(journal_path, listener, speed)
+        log.info("Replayed %s records in %.3fs (%.0f records/s)", count, elapsed, count / elapsed if elapsed else 0)
+        if hold:
+            stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop_event.set)
+            await stop_event.wait()
+    finally:
+        await server.stop_server()
+        listener.disconnect_all()
+
+
+def run_with_backends(main, config: Config):
+    """Runs the `main` coroutine on the event loop and with the JSON codec selected in the config."""
+    json_backend = use_json_backend(config.json_backend)
+    loop_name, loop_factory = event_loop_factory(config.event_loop)
+    log.info("Event loop: %s, JSON backend: %s", loop_name, json_backend)
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        return runner.run(main)
+
+
+def import_report():
+    """Loads every plugin referenced by the ruleset and prints what each one cost to import."""
+    config = Config.from_config()
+    initialize_matchers(config)
+    print(format_import_report())
+
+
+def rules_bench(corpus: str, processes: int, as_json: bool):
+    """Evaluates the configured ruleset against every record of a metadata corpus and prints the report."""
+    config = Config.from_config()
+    report = bench(config, corpus, processes)
+    print(json.dumps(report, indent=2) if as_json else format_report(report))
+
+
 if __name__ == "__main__":
-    logging.basicConfig(
-        level=log_level, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    parser = argparse.ArgumentParser(description="MPRIS metadata preprocessor server")
+    parser.add_argument(
+        "--import-report",
+        action="store_true",
+        help="load all plugins referenced by the ruleset, report their import cost and exit",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="JOURNAL",
+        help="append every MPRIS signal received to JOURNAL (overrides journal_path)",
     )
+    subparsers = parser.add_subparsers(dest="command")
+    replay_parser = subparsers.add_parser("replay", help="replay a signal journal without a D-Bus session")
+    replay_parser.add_argument("journal", help="journal file written with --record / journal_path")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (default: recorded speed)")
+    replay_parser.add_argument("--fast", action="store_true", help="replay as fast as possible")
+    replay_parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait for clients before replaying")
+    replay_parser.add_argument("--hold", action="store_true", help="keep serving clients after the replay finished")
+    rules_parser = subparsers.add_parser("rules", help="ruleset tools")
+    rules_subparsers = rules_parser.add_subparsers(dest="rules_command", required=True)
+    bench_parser = rules_subparsers.add_parser("bench", help="dry run the ruleset over a JSONL corpus of raw metadata and report per rule matches and cost")
+    bench_parser.add_argument("corpus", help="JSONL file of raw metadata dicts (or a signal journal)")
+    bench_parser.add_argument("--processes", type=int, default=1, help="evaluate the corpus in this many worker processes")
+    bench_parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    setup_logging(log_level, json_lines=log_format == "json")
+
+    if args.import_report:
+        import_report()
+        sys.exit(0)
 
     try:
-        asyncio.run(run_application())
+        if args.command == "rules":
+            rules_bench(args.corpus, args.processes, args.json)
+        elif args.command == "replay":
+            config = Config.from_config()
+            run_with_backends(run_replay(args.journal, None if args.fast else args.speed, args.delay, args.hold, config), config)
+        else:
+            config = Config.from_config()
+            run_with_backends(run_application(args.record, config), config)
     except (asyncio.CancelledError, KeyboardInterrupt):
         pass
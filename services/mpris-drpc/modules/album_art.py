@@ -1,16 +1,12 @@
 import os
 import re
 import time
-import base64
-import requests
 from logging import Logger
 
-try:
-    import yt_dlp
-    ytdl_avalaible = True
-except (ImportError, ModuleNotFoundError):
-    print('yt-dlp not installed, cannot perform HQ image retrival for certain sites')
-    ytdl_avalaible = False
+from core.utils.module_kit import lazy_import
+from core.utils.art_kit import strip_inline_art
+
+requests = lazy_import('requests')
 
 last_art_url = ""
 
@@ -52,23 +48,17 @@ def art_fetcher(url, save_path, logger: Logger, dl_attempts: int = 3, retry_cool
 
         time.sleep(retry_cooldown)
 
-def decode_base64(base64_str: str, save_path: str, logger: Logger):
-    clean_base64 = base64_str.split('base64,')[-1].strip()
-    image_bytes = base64.b64decode(clean_base64)
-    with open(save_path, 'wb') as f:
-        f.write(image_bytes)
-    logger.debug('Image Saved')
-
 def localize(metadata: dict, logger: Logger, art_download_location: str = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'general_thumb'), album_art_dl_attempts: int = 3, retry_cooldown: float = 0.1):
     global last_art_url
     metadata = metadata.copy()
     art_url = metadata.get('mpris:artUrl')
     if not art_url: return metadata
     if 'enhancements:localArtUrl' in metadata: return metadata
+    # Normally already done before the ruleset runs, decoded once into the art cache
+    if art_url.startswith('data:image/'): return strip_inline_art(metadata)
 
     if art_url != last_art_url:
-        if art_url.startswith('data:image/'): decode_base64(art_url, art_download_location, logger)
-        elif art_url.startswith('http'): art_fetcher(art_url, art_download_location, logger, album_art_dl_attempts, retry_cooldown)
+        if art_url.startswith('http'): art_fetcher(art_url, art_download_location, logger, album_art_dl_attempts, retry_cooldown)
         elif art_url.startswith('file:///'): art_download_location = art_url.replace('file://', '')
         elif os.path.exists(art_url): art_download_location = art_url
         metadata['enhancements:localArtUrl'] = art_download_location
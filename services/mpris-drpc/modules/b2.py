@@ -1,14 +1,16 @@
 import os
 import time
-import requests
 from logging import Logger
 
-try:
-    import yt_dlp
-    ytdl_avalaible = True
-except (ImportError, ModuleNotFoundError):
+from core.utils.module_kit import lazy_import
+from core.utils import ytdlp_kit
+
+requests = lazy_import('requests')
+ytdl_avalaible = ytdlp_kit.ytdl_available
+if not ytdl_avalaible:
     print('yt-dlp not installed, cannot fill in artist information, resorting to using lower resolutin album art')
-    ytdl_avalaible = False
+else:
+    ytdlp_kit.request_prewarm()
 
 last_art_url = ""
 last_title = ""
@@ -53,7 +55,7 @@ def art_fetcher(url, save_path, logger: Logger, dl_attempts: int = 3, retry_cool
 
         time.sleep(retry_cooldown)
 
-def b2_handler(metadata: dict, logger: Logger, art_download_location: str = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'nnd_thumb'), album_art_dl_attempts: int = 3, retry_cooldown: float = 0.1):
+def b2_handler(metadata: dict, logger: Logger, art_download_location: str = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'nnd_thumb'), album_art_dl_attempts: int = 3, retry_cooldown: float = 0.1, extract_timeout: float = ytdlp_kit.DEFAULT_TIMEOUT, cache_ttl: float = ytdlp_kit.DEFAULT_TTL):
     global last_title, last_art_url, last_artist
     if not ytdl_avalaible: 
         logger.error('yt-dlp not installed in this environment, if it is installed globally please disable all virtualenvs, this plugin will not execute unless yt-dlp is avalaible')
@@ -61,13 +63,14 @@ def b2_handler(metadata: dict, logger: Logger, art_download_location: str = os.p
     metadata = metadata.copy()
     metadata['xesam:title'] = metadata['xesam:title'].strip()
     if metadata['xesam:title'] != last_title:
-        with yt_dlp.YoutubeDL() as ydl:
-            info = ydl.sanitize_info(ydl.extract_info(metadata['xesam:url'], download=False))
-            metadata['xesam:artist'] = [info['uploader']]
-            ogp_format = info['thumbnails'][0]
-            ogp_url = ogp_format['url']
-            art_fetcher(ogp_url, art_download_location, logger, album_art_dl_attempts, retry_cooldown)
-            metadata['mpris:artUrl'] = ogp_url
+        info = ytdlp_kit.extract_info(metadata['xesam:url'], extract_timeout, cache_ttl)
+        if not info or not info.get('thumbnails'):
+            return metadata
+        metadata['xesam:artist'] = [info['uploader']]
+        ogp_format = info['thumbnails'][0]
+        ogp_url = ogp_format['url']
+        art_fetcher(ogp_url, art_download_location, logger, album_art_dl_attempts, retry_cooldown)
+        metadata['mpris:artUrl'] = ogp_url
         last_art_url = ogp_url
         last_artist = [info['uploader']]
         last_title = metadata['xesam:title']
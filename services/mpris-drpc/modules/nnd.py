@@ -1,14 +1,16 @@
 import os
 import time
-import requests
 from logging import Logger
 
-try:
-    import yt_dlp
-    ytdl_avalaible = True
-except (ImportError, ModuleNotFoundError):
+from core.utils.module_kit import lazy_import
+from core.utils import ytdlp_kit
+
+requests = lazy_import('requests')
+ytdl_avalaible = ytdlp_kit.ytdl_available
+if not ytdl_avalaible:
     print('yt-dlp not installed, cannot fill in artist information, resorting to using lower resolutin album art')
-    ytdl_avalaible = False
+else:
+    ytdlp_kit.request_prewarm()
 
 last_art_url = ""
 last_title = ""
@@ -53,25 +55,24 @@ def art_fetcher(url, save_path, logger: Logger, dl_attempts: int = 3, retry_cool
 
         time.sleep(retry_cooldown)
 
-def nnd_handler(metadata: dict, logger: Logger, art_download_location: str = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'nnd_thumb'), album_art_dl_attempts: int = 3, retry_cooldown: float = 0.1):
+def nnd_handler(metadata: dict, logger: Logger, art_download_location: str = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'nnd_thumb'), album_art_dl_attempts: int = 3, retry_cooldown: float = 0.1, extract_timeout: float = ytdlp_kit.DEFAULT_TIMEOUT, cache_ttl: float = ytdlp_kit.DEFAULT_TTL):
     global last_title, last_art_url, last_artist
     metadata = metadata.copy()
     metadata['xesam:title'] = metadata['xesam:title'].replace(' - ニコニコ動画', '')
     if metadata['xesam:title'] != last_title:
-        if ytdl_avalaible:
-            with yt_dlp.YoutubeDL() as ydl:
-                info = ydl.sanitize_info(ydl.extract_info(metadata['xesam:url'], download=False))
-                metadata['xesam:artist'] = [info.get('uploader', 'Unknown Uploader')]
-                ogp_format = [f for f in info['thumbnails'] if f['id'] == 'ogp'][0]
-                ogp_url = ogp_format['url']
-                art_fetcher(ogp_url, art_download_location, logger, album_art_dl_attempts, retry_cooldown)
-                metadata['mpris:artUrl'] = ogp_url
+        info = ytdlp_kit.extract_info(metadata['xesam:url'], extract_timeout, cache_ttl) if ytdl_avalaible else None
+        ogp_formats = [f for f in info.get('thumbnails', []) if f.get('id') == 'ogp'] if info else []
+        if ogp_formats:
+            metadata['xesam:artist'] = [info.get('uploader', 'Unknown Uploader')]
+            ogp_url = ogp_formats[0]['url']
+            art_fetcher(ogp_url, art_download_location, logger, album_art_dl_attempts, retry_cooldown)
+            metadata['mpris:artUrl'] = ogp_url
             last_art_url = ogp_url
             last_artist = [info.get('uploader', 'Unknown Uploader')]
         else:
-            watch_id = metadata['xesam:url'].split('/')[-1][2:]
-            art_fetcher(f'https://nicovideo.cdn.nimg.jp/thumbnails/{watch_id/watch_id}', art_download_location, logger, album_art_dl_attempts, retry_cooldown)
-            last_art_url = f'https://nicovideo.cdn.nimg.jp/thumbnails/{watch_id/watch_id}'
+            watch_id = metadata['xesam:url'].split('?')[0].rstrip('/').split('/')[-1][2:]
+            last_art_url = f'https://nicovideo.cdn.nimg.jp/thumbnails/{watch_id}/{watch_id}'
+            art_fetcher(last_art_url, art_download_location, logger, album_art_dl_attempts, retry_cooldown)
             metadata['xesam:artUrl'] = last_art_url
             last_artist = [""]
         last_title = metadata['xesam:title']
@@ -1,17 +1,17 @@
 import os
 import re
-import io
 import time
 import logging
-import requests
 from logging import Logger
 
-try:
-    from PIL import Image
-    pillow_avalaible = True
-except (ImportError, ModuleNotFoundError):
+from core.utils import art_kit
+from core.utils.module_kit import lazy_import
+
+requests = lazy_import('requests')
+Image = lazy_import('PIL.Image')
+pillow_avalaible = Image is not None
+if not pillow_avalaible:
     print('python-pillow / PIL not installed, cannot process album art, proceeding with limited functionality')
-    pillow_avalaible = False
 
 last_url = ""
 last_title = ""
@@ -54,7 +54,7 @@ def get_youtube_video_id(url):
         return match.group(1)
     return None
 
-def topic_handler(metadata: dict, logger: Logger, art_download_location: str = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'square_thumb.png'), album_art_dl_attempts: int = 3, retry_cooldown: float = 0.1):
+def topic_handler(metadata: dict, logger: Logger, art_download_location: str = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'square_thumb.jpg'), album_art_dl_attempts: int = 3, retry_cooldown: float = 0.1, art_size: int = 512):
     global last_url, last_title, last_artist
     metadata = metadata.copy()
     if metadata['xesam:url'] != last_url:
@@ -63,12 +63,13 @@ def topic_handler(metadata: dict, logger: Logger, art_download_location: str = o
             image_url = f'https://i.ytimg.com/vi_webp/{video_id}/maxresdefault.webp'
             image_bytes = art_fetcher(image_url, logger, album_art_dl_attempts, retry_cooldown)
             if image_bytes is not None:
-                image = Image.open(io.BytesIO(image_bytes))
-                l_offset = int(round((image.width - image.height) / 2, 0))
-                r_offset = l_offset + image.height
-                image = image.crop((l_offset, 0, r_offset, image.height))
-                image.save(art_download_location)
-                metadata['enhancements:localArtUrl'] = art_download_location
+                # Cropped and scaled from the downloaded bytes in one decode, the art stage derives
+                # the display sizes from this file, art_size should be the largest of art_sizes
+                try:
+                    art_kit.square_art(image_bytes, art_size, art_download_location)
+                    metadata['enhancements:localArtUrl'] = art_download_location
+                except (OSError, ValueError, Image.DecompressionBombError) as e:
+                    logger.warning(f"Could not crop album art of {metadata['xesam:url']}: {e}")
         if 'feat.' in metadata['xesam:title']:
             featured_artists = [i.strip() for i in metadata['xesam:title'].replace('(', '').replace(')', '').split('feat.')[1].split('&')]
             metadata['xesam:artist'] = [*[i.replace('- Topic', '').strip() for i in metadata['xesam:artist']], *featured_artists]
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from core.model.status_file import StatusReader
+
+DEFAULT_FORMAT = '{title} - {artist}'
+
+
+def hms(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f'{hours:02}:{rest // 60:02}:{rest % 60:02}' if hours else f'{rest // 60:02}:{rest % 60:02}'
+
+
+def render(status: dict, output_format: str, as_json: bool) -> str:
+    if as_json:
+        import json
+        return json.dumps(status)
+    return output_format.format_map({**status, 'position_hms': hms(status['position']), 'length_hms': hms(status['length'])})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print what is playing from the server's memory mapped status file, without connecting to it")
+    parser.add_argument('--path', help='status file (default: $XDG_RUNTIME_DIR/mpris-drpc/status)')
+    parser.add_argument('--format', default=DEFAULT_FORMAT, help='str.format template over player, status, title, artist, album, art, length, position, position_hms, length_hms')
+    parser.add_argument('--json', action='store_true', help='print the whole status as JSON')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='keep checking every SECONDS and print a line whenever the status changes')
+    parser.add_argument('--check', action='store_true', help='print nothing, exit 0 if a player is known and 1 otherwise')
+    args = parser.parse_args()
+
+    try:
+        reader = StatusReader(args.path)
+    except (OSError, ValueError) as e:
+        print(f'No status available: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    if args.check:
+        sys.exit(0 if reader.read()['player'] else 1)
+
+    if args.watch is None:
+        print(render(reader.read(), args.format, args.json))
+        sys.exit(0)
+
+    last_generation = None
+    try:
+        while True:
+            # Only the 8 byte generation counter is read while nothing changes
+            if reader.generation() != last_generation:
+                status = reader.read()
+                last_generation = status['generation']
+                print(render(status, args.format, args.json), flush=True)
+            time.sleep(args.watch)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass